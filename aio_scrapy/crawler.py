@@ -1,14 +1,25 @@
 import asyncio
 import logging
+import multiprocessing
 from asyncio import Future
-from typing import Any, Optional, Set, Type
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any, Dict, List, Optional, Set, Tuple, Type
+
+from aiohttp.abc import AbstractResolver
 
 from aio_scrapy.engine import ExecutionEngine
+from aio_scrapy.extension import ExtensionManager
+from aio_scrapy.resolver import CachingResolver
 from aio_scrapy.settings import Settings
 from aio_scrapy.signal_manager import SignalManager
 from aio_scrapy.spiders import BaseSpider
+from aio_scrapy.statscollectors import merge_stats
+from aio_scrapy.utils import load_object
+from aio_scrapy.utils.shard import ShardChannels, ShardRouter
 
 logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 
 class Crawler:
@@ -17,10 +28,19 @@ class Crawler:
             self,
             spider_cls: Type[BaseSpider],
             settings: Optional[Settings] = None,
-            loop: Optional[asyncio.AbstractEventLoop] = None
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+            resolver: Optional[AbstractResolver] = None
     ):
+        """
+        :param spider_cls:
+        :param settings:
+        :param loop:
+        :param resolver: DNS resolver shared with other crawlers, which closes it. The downloader creates its own
+            by DNS settings if it is None.
+        """
         self.loop = loop or asyncio.get_event_loop()
         self.spider_cls = spider_cls
+        self.resolver = resolver
 
         if isinstance(settings, dict) or settings is None:
             settings = Settings(settings)
@@ -29,8 +49,10 @@ class Crawler:
         self.spider_cls.update_settings(self.settings)
 
         self.signals = SignalManager(self)
+        self.stats = load_object(self.settings.get('STATS_CLASS'))(self)
         self.spider = None
         self.engine = ExecutionEngine(self)
+        self.extensions = ExtensionManager.from_crawler(self)
 
         self.future = self.loop.create_future()
 
@@ -44,7 +66,14 @@ class Crawler:
         await self.engine.start()
 
     async def stop(self) -> None:
-        await self.engine.stop()
+        """
+        Close spider with reason `shutdown` if it is running, so its state can be persisted.
+        :return:
+        """
+        if self.spider and self.engine.running and not self.engine.closing:
+            await self.engine.close_spider(self.spider, reason='shutdown')
+        else:
+            await self.engine.stop()
 
 
 class CrawlerRunner:
@@ -52,31 +81,163 @@ class CrawlerRunner:
     def __init__(
             self,
             settings: Optional[Settings] = None,
-            loop: Optional[asyncio.AbstractEventLoop] = None
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+            workers: int = 1
     ) -> None:
+        """
+        :param settings:
+        :param loop:
+        :param workers: If greater than 1, every crawl runs in `workers` processes, each with its own event
+            loop, crawler and engine. Requests are sharded to workers by a consistent hash of their host, a worker
+            sends requests of other hosts to their worker. Spider classes must be importable, workers are started
+            by a fork server or spawned. Stats of all workers are merged into `stats` when they finish, and
+            `join` raises RuntimeError if a worker failed.
+        """
         self.settings = settings
         self.loop = loop or asyncio.get_event_loop()
+        self.workers = workers
         self._tasks: Set[Future] = set()
         self.crawlers: Set[Crawler] = set()
+        self._worker_crawls: List[Tuple[Type[BaseSpider], Dict[str, Any]]] = []
+        self._processes: List[BaseProcess] = []
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        # Shared by crawlers, so each host is looked up once for all of them.
+        self.resolver: Optional[CachingResolver] = None
 
     def crawl(
             self,
             spider_cls: Type[BaseSpider],
             **kwargs: Any
     ) -> None:
+        if self.workers > 1:
+            self._worker_crawls.append((spider_cls, kwargs))
+            return
         crawler = self.create_crawler(spider_cls)
         self.crawlers.add(crawler)
         task = self.loop.create_task(crawler.crawl(**kwargs))
         self._tasks.add(task)
 
     def create_crawler(self, spider_cls: Type[BaseSpider]):
-        return Crawler(spider_cls, self.settings, self.loop)
+        settings = self.settings if isinstance(self.settings, Settings) else Settings(self.settings)
+        if self.resolver is None and settings.get('DNSCACHE_ENABLED'):
+            self.resolver = CachingResolver.from_settings(settings)
+        return Crawler(spider_cls, settings, self.loop, self.resolver)
 
     async def join(self) -> None:
+        if self._worker_crawls:
+            await self._join_workers()
         await asyncio.gather(*self._tasks)
+        for crawler in self.crawlers:
+            if crawler.spider:
+                self.stats[crawler.spider.name] = crawler.stats.get_stats()
+        if self.resolver is not None:
+            await self.resolver.close()
+            self.resolver = None
+
+    async def _join_workers(self) -> None:
+        """
+        Start worker processes and wait them finished without blocking event loop,
+        then merge stats of every spider. Workers are never forked from this process, whose threads may hold
+        locks a forked child would inherit held.
+        If a worker fails, the others are terminated, as they would wait for it forever.
+        :return:
+        """
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        ctx = multiprocessing.get_context(method)
+        channels = [ShardChannels(ctx, self.workers) for _ in self._worker_crawls]
+        connections = []
+        for index in range(self.workers):
+            reader, writer = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=_run_worker,
+                args=(self._worker_crawls, channels, self.settings, index, self.workers, writer),
+                name=f'aio_scrapy-worker-{index}',
+            )
+            process.start()
+            writer.close()
+            self._processes.append(process)
+            connections.append(reader)
+        self._worker_crawls = []
+
+        results = await asyncio.gather(*[
+            self._wait_worker(index, process, reader)
+            for index, (process, reader) in enumerate(zip(self._processes, connections))
+        ])
+        self._processes = []
+
+        worker_stats = [stats for stats in results if stats is not None]
+        names = {name for stats in worker_stats for name in stats}
+        for name in names:
+            self.stats[name] = merge_stats(stats.get(name) for stats in worker_stats)
+        failed = [index for index, stats in enumerate(results) if stats is None]
+        if failed:
+            raise RuntimeError(f'Workers {failed} of {self.workers} failed')
+
+    async def _wait_worker(self, index: int, process: BaseProcess, reader: Connection) -> Optional[Dict[str, Any]]:
+        """
+        :return: stats of spiders of the worker, None if it failed.
+        """
+        try:
+            stats = await self.loop.run_in_executor(None, reader.recv)
+        except EOFError:
+            stats = None
+        finally:
+            reader.close()
+        await self.loop.run_in_executor(None, process.join)
+        if stats is None or process.exitcode != 0:
+            logger.error(f'Worker {index} failed, exitcode: {process.exitcode}')
+            for other in self._processes:
+                if other.exitcode is None:
+                    other.terminate()
+            return None
+        return stats
 
     async def stop(self) -> None:
-        await asyncio.gather(*[crawler.stop for crawler in self.crawlers])
+        for process in self._processes:
+            process.terminate()
+        await asyncio.gather(*[crawler.stop() for crawler in self.crawlers])
 
     def run_until_complete(self) -> None:
         self.loop.run_until_complete(self.join())
+
+
+def _run_worker(
+        crawls: List[Tuple[Type[BaseSpider], Dict[str, Any]]],
+        channels: List[ShardChannels],
+        settings: Optional[Settings],
+        index: int,
+        workers: int,
+        connection: Connection
+) -> None:
+    """
+    Entry of a worker process, run all crawls on a new event loop with shard settings and a router of requests
+    to other workers, and send stats of each spider back to parent.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    if isinstance(settings, dict) or settings is None:
+        settings = Settings(settings)
+    settings = settings.copy()
+    settings.set('SHARD_INDEX', index, 'cmdline')
+    settings.set('SHARD_COUNT', workers, 'cmdline')
+
+    crawlers: List[Crawler] = []
+
+    async def _crawl():
+        # Crawler must be created in running loop, aiohttp connector binds to it.
+        resolver = CachingResolver.from_settings(settings) if settings.get('DNSCACHE_ENABLED') else None
+        for (spider_cls, kwargs), crawl_channels in zip(crawls, channels):
+            crawler = Crawler(spider_cls, settings, loop, resolver)
+            crawler.engine.router = ShardRouter(crawler, crawl_channels, index)
+            crawlers.append(crawler)
+        await asyncio.gather(*[crawler.crawl(**kwargs) for crawler, (_, kwargs) in zip(crawlers, crawls)])
+        if resolver is not None:
+            await resolver.close()
+
+    try:
+        loop.run_until_complete(_crawl())
+    finally:
+        connection.send({crawler.spider.name: crawler.stats.get_stats() for crawler in crawlers if crawler.spider})
+        connection.close()
+        loop.close()
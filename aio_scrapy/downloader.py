@@ -1,140 +1,677 @@
-import asyncio
+import hashlib
 import logging
-import uuid
-from asyncio import Future, Task
+import mmap
+import random
+import socket
+import tempfile
+from asyncio import CancelledError, Future, Task, TimerHandle
 from collections import deque
+from functools import partial
 from time import time
-from typing import TYPE_CHECKING, Deque, Optional, Set
+from typing import (IO, TYPE_CHECKING, Deque, Dict, List, Optional, Set, Tuple,
+                    Union)
 
-from aiohttp import BasicAuth, ClientSession, TCPConnector
-from aiohttp.client_reqrep import ConnectionKey
-from yarl import URL
+from aiohttp import ClientResponse, ClientSession, ClientTimeout, TCPConnector
+from aiohttp.abc import AbstractResolver
+from multidict import CIMultiDict
 
 from aio_scrapy import signals
+from aio_scrapy.downloadermiddlewares import DownloaderMiddlewareManager
+from aio_scrapy.exceptions import DownloadSizeExceeded
+from aio_scrapy.http import Request, Response
+from aio_scrapy.resolver import CachingResolver
+from aio_scrapy.utils import load_object, run_in_thread_pool
+from aio_scrapy.utils.request import request_fingerprint
 
 if TYPE_CHECKING:
     from aio_scrapy.crawler import Crawler
+    from aio_scrapy.spiders import BaseSpider
 
 logger = logging.getLogger(__name__)
 
+# Seconds a slot is kept after it went idle, so delay between requests to a host survives short pauses.
+SLOT_GC_INTERVAL = 60
+# Bytes of a streamed body buffered in memory before they are written to its temporary file.
+STREAM_WRITE_SIZE = 1024 * 1024
+
+
+class CircuitBreaker:
+    """
+    Failure rate of a slot over a sliding window of `window` seconds.
+
+    * closed: transfers go on, the circuit opens if at least `min_requests` transfers were recorded in the
+      window and at least `threshold` of them failed.
+    * open: no transfer starts until `cooldown` seconds passed, then the circuit is half-open.
+    * half-open: a single probe is transferred, the circuit closes if it succeeds and opens again otherwise.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window: float, threshold: float, min_requests: int, cooldown: float):
+        self.window = window
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+
+        self.state = self.CLOSED
+        # Finish time of recent transfers and whether they failed.
+        self.outcomes: Deque[Tuple[float, bool]] = deque()
+        self.failures = 0
+        self.opened_at: float = 0
+        self.probe: Optional[Task] = None
+
+    @property
+    def retry_at(self) -> float:
+        return self.opened_at + self.cooldown
+
+    def can_transfer(self, now: float) -> bool:
+        """
+        Whether a transfer can start, an open circuit turns half-open once its cooldown passed.
+        :param now:
+        :return:
+        """
+        if self.state == self.OPEN and now >= self.retry_at:
+            self.state = self.HALF_OPEN
+            self.probe = None
+        if self.state == self.HALF_OPEN:
+            return self.probe is None
+        return self.state == self.CLOSED
+
+    def record(self, task: Task, failed: bool, now: float):
+        """
+        Record the outcome of a finished transfer.
+        :param task: the transfer, only the probe counts while half-open.
+        :param failed:
+        :param now:
+        :return:
+        """
+        if self.state == self.HALF_OPEN:
+            if task is self.probe:
+                self.probe = None
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = self.CLOSED
+        elif self.state == self.CLOSED:
+            self.outcomes.append((now, failed))
+            self.failures += failed
+            outcomes = self.outcomes
+            while outcomes and now - outcomes[0][0] > self.window:
+                self.failures -= outcomes.popleft()[1]
+            if len(outcomes) >= self.min_requests and self.failures >= self.threshold * len(outcomes):
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.outcomes.clear()
+        self.failures = 0
+
+
+class Slot:
+    """
+    Download slot of a host, or of an IP if CONCURRENT_REQUESTS_PER_IP is set.
+    Each slot has its own queue, concurrency and delay, so a slow or rate-limited host only holds
+    up requests to itself.
+    """
+
+    def __init__(
+            self,
+            concurrency: int,
+            delay: float,
+            randomize_delay: bool,
+            breaker: Optional[CircuitBreaker] = None
+    ):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.randomize_delay = randomize_delay
+        self.breaker = breaker
+
+        self.queue: Deque[Tuple[Request, Future]] = deque()
+        self.transferring: Set[Task] = set()
+        self.lastseen: float = 0
+        # Earliest time the next transfer can start, a randomized delay is sampled once per transfer.
+        self.next_transfer: float = 0
+
+    def free_transfer_slots(self) -> int:
+        return self.concurrency - len(self.transferring)
+
+    def download_delay(self) -> float:
+        """
+        Delay between two transfers, in `[0.5, 1.5] * delay` if RANDOMIZE_DOWNLOAD_DELAY is set.
+        :return:
+        """
+        if self.randomize_delay:
+            return random.uniform(0.5 * self.delay, 1.5 * self.delay)
+        return self.delay
+
+    def is_idle(self) -> bool:
+        # A slot with an open circuit is kept, so the host is not retried before its cooldown.
+        return (
+            not self.queue and not self.transferring
+            and (self.breaker is None or self.breaker.state == CircuitBreaker.CLOSED)
+        )
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}(concurrency={self.concurrency}, delay={self.delay:.2f}, '
+            f'randomize_delay={self.randomize_delay}, queue={len(self.queue)}, transferring={len(self.transferring)})'
+        )
+
+
+class SharedDownload:
+    """
+    Download of coalesced requests. No requester owns it, each one waits on a future of its own, so a requester
+    giving up does not cancel it for the others. It is cancelled when every requester gave up.
+    """
+
+    def __init__(self, download: Future):
+        self.download = download
+        self.waiters: Set[Future] = set()
+
+    def wait(self, request: Request) -> Future:
+        """
+        :param request:
+        :return: a future of the response of the download for the request.
+        """
+        waiter = self.download.get_loop().create_future()
+        self.waiters.add(waiter)
+        waiter.add_done_callback(self._waiter_done)
+        self.download.add_done_callback(partial(_copy_outcome, waiter, request))
+        return waiter
+
+    def _waiter_done(self, waiter: Future):
+        self.waiters.discard(waiter)
+        if not self.waiters and not self.download.done():
+            self.download.cancel()
+
+
+def _copy_outcome(waiter: Future, request: Request, download: Future):
+    if waiter.done():
+        return
+    if download.cancelled():
+        waiter.cancel()
+    elif download.exception() is not None:
+        waiter.set_exception(download.exception())
+    else:
+        response = download.result()
+        # Body and headers are shared, the response only differs by its request.
+        waiter.set_result(Response(response.url, response.status, response.headers, response.body, request))
+
 
 class Downloader:
 
     def __init__(self, crawler: 'Crawler'):
         self.session: Optional[ClientSession] = None
         self.crawler = crawler
-        self.max_limit: int = crawler.settings.get('CONCURRENT_REQUESTS')
-        self.connector = TCPConnector(limit=self.max_limit)
+        settings = crawler.settings
+        self.max_limit: int = settings.get('CONCURRENT_REQUESTS')
+        self.domain_concurrency: int = settings.get('CONCURRENT_REQUESTS_PER_DOMAIN')
+        self.ip_concurrency: int = settings.get('CONCURRENT_REQUESTS_PER_IP')
+        # A resolver shared by crawlers is closed by its owner.
+        self.resolver: AbstractResolver = crawler.resolver
+        self._own_resolver = self.resolver is None
+        if self._own_resolver:
+            if settings.get('DNSCACHE_ENABLED'):
+                self.resolver = CachingResolver.from_settings(settings)
+            else:
+                self.resolver = load_object(settings.get('DNS_RESOLVER'))()
+        cached = isinstance(self.resolver, CachingResolver)
+        self.dns_prefetch: bool = cached and settings.get('DNS_PREFETCH')
+        # Concurrency to each host is limited by its slot. Without CachingResolver, the connector caches lookups.
+        self._use_dns_cache = not cached
+        self.connector = self._create_connector()
+        # Session of each proxy of request meta `proxy`, so connections to a proxy are reused by its requests only.
+        self.proxy_sessions: Dict[str, ClientSession] = {}
+
+        self.download_delay: float = settings.get('DOWNLOAD_DELAY')
+        self.randomize_delay: bool = settings.get('RANDOMIZE_DOWNLOAD_DELAY')
+        self.slot_settings: Dict[str, dict] = settings.get('DOWNLOAD_SLOTS')
 
-        self.download_delay: bool = crawler.settings.get('DOWNLOAD_DELAY')
+        self.breaker_enabled: bool = settings.get('CIRCUIT_BREAKER_ENABLED')
+        self.breaker_window: float = settings.get('CIRCUIT_BREAKER_WINDOW')
+        self.breaker_threshold: float = settings.get('CIRCUIT_BREAKER_THRESHOLD')
+        self.breaker_min_requests: int = settings.get('CIRCUIT_BREAKER_MIN_REQUESTS')
+        self.breaker_cooldown: float = settings.get('CIRCUIT_BREAKER_COOLDOWN')
+        self.breaker_http_codes = frozenset(int(code) for code in settings.get('CIRCUIT_BREAKER_HTTP_CODES'))
 
-        self.default_user_agent = crawler.settings.get('DEFAULT_USERAGENT')
+        self.default_user_agent = settings.get('DEFAULT_USERAGENT')
+        self.default_headers = {'User-Agent': self.default_user_agent}
+        self.timeout = ClientTimeout(total=settings.get('DOWNLOAD_TIMEOUT'))
+        self.maxsize: int = settings.get('DOWNLOAD_MAXSIZE')
+        self.warnsize: int = settings.get('DOWNLOAD_WARNSIZE')
+        self.stream_threshold: int = settings.get('DOWNLOAD_STREAM_THRESHOLD')
+        self.coalesce: bool = settings.get('DOWNLOAD_COALESCE')
+        # GET and HEAD downloads in flight by `coalesce_key` of their request. They are of this crawler only,
+        # a download is cancelled when its crawler closes, so requesters of another crawler must not wait on it.
+        self.inflight: Dict[bytes, SharedDownload] = {}
 
-        self.last_seen: int = 0
+        self.slots: Dict[str, Slot] = {}
+        # Keys of slots with queued requests. Dispatch rotates it and starts at most one transfer
+        # per slot on each turn, so a host with a long queue can not starve others.
+        self._rotation: Deque[str] = deque()
+        self._ip_cache: Dict[str, str] = {}
+        # Keys of slots whose circuit is not closed, their queued requests are parked.
+        self._broken: Set[str] = set()
+        self._timer: Optional[TimerHandle] = None
+        self._last_gc: float = time()
 
-        self.active: Set = set()
-        self.queue: Deque = deque()
-        self.process_queue_task: Optional[Task] = None
+        # Requests are hashed by identity, the same url requested twice is tracked twice.
+        self.active: Set[Request] = set()
+        self.middleware = DownloaderMiddlewareManager.from_crawler(crawler)
         self.crawler.signals.connect(self.engine_started, signal=signals.engine_started)
 
     def engine_started(self):
         self.init_session()
 
-    def available_connections(self):
-        """获取实际可用连接数量"""
-        key = ConnectionKey(
-            host='',
-            port=0,
-            is_ssl=True,
-            ssl=None,
-            proxy=URL(),
-            proxy_auth=BasicAuth(login=''),
-            proxy_headers_hash=0
-        )
-        return self.connector._available_connections(key)
-
     def should_revocation(self) -> bool:
         """
-        如果可用连接数为 0 则返回 True
+        Requests queued in slots or transferring reach CONCURRENT_REQUESTS. Requests parked in a slot whose
+        circuit is open do not count up to the slot's concurrency, so a failing host does not hold up the others,
+        and its further requests stay in the scheduler instead of piling up in memory.
         :return:
         """
-        return self.available_connections() <= 0
+        return len(self.active) - self.parked() >= self.max_limit
 
-    def fetch(self, url: URL):
-        response = self.enqueue_request(url)
-        logger.info(f'Download: {url}')
-        return response
+    def parked(self) -> int:
+        """
+        Requests queued in slots whose circuit is open, at most the concurrency of each slot.
+        :return:
+        """
+        return sum(min(len(self.slots[key].queue), self.slots[key].concurrency) for key in self._broken)
+
+    async def open_spider(self, spider: 'BaseSpider'):
+        await self.middleware.open_spider(spider)
+
+    async def close_spider(self, spider: 'BaseSpider'):
+        await self.middleware.close_spider(spider)
+
+    async def fetch(self, request: Request, spider: 'BaseSpider') -> Union[Response, Request]:
+        """
+        Download request through downloader middlewares.
+        :param request:
+        :param spider:
+        :return: a Response, or a Request which a middleware wants to schedule instead.
+        """
+        self.active.add(request)
+        self.crawler.stats.inc_value('downloader/request_count')
+        logger.info(f'Download: {request}')
+        try:
+            return await self.middleware.download(self.enqueue_request, request, spider)
+        finally:
+            self.active.remove(request)
+            self.crawler.engine.wakeup()
 
-    def enqueue_request(self, url: URL):
+    def enqueue_request(self, request: Request, spider: Optional['BaseSpider'] = None) -> Future:
         """
-        这里之所以使用一个 _id ，是因为 URL 类覆盖了 __eq__ 和 __hash__ 方法
-        如果两个 url 字符串一样则这两个　URL 对象是同一个，放入 set() 集合中会
-        被去重。
-        :param url:
+        Queue request in its slot.
+        If DOWNLOAD_COALESCE is set, a GET or HEAD request whose `coalesce_key` matches a download in flight is not
+        queued, it gets the response of that download instead.
+        :param request:
+        :param spider:
+        :return: a future of the Response.
+        """
+        if self.coalesce and (request.method == 'GET' or request.method == 'HEAD'):
+            return self._coalesce(request)
+        return self._enqueue_new(request)
+
+    def coalesce_key(self, request: Request) -> bytes:
+        """
+        Fingerprint of the request, and of what it is sent with which may change the response: its headers,
+        User-Agent, proxy and the cookies of the session.
+        :param request:
         :return:
         """
-        _id = uuid.uuid1()
+        digest = hashlib.blake2b(request_fingerprint(request), digest_size=16)
+        digest.update(self.default_user_agent.encode('utf-8'))
+        if request._headers:
+            for name, value in sorted((str(name).lower(), str(value)) for name, value in request._headers.items()):
+                digest.update(f'\0{name}: {value}'.encode('utf-8'))
+        meta = request._meta
+        proxy = meta.get('proxy') if meta else None
+        if proxy:
+            digest.update(b'\0proxy ' + proxy.encode('utf-8'))
+        session = self.proxy_sessions.get(proxy) if proxy else self.session
+        if session is not None:
+            cookies = session.cookie_jar.filter_cookies(request.url)
+            for name, morsel in sorted(cookies.items()):
+                digest.update(f'\0cookie {name}={morsel.value}'.encode('utf-8'))
+        return digest.digest()
 
-        def _deactivate(response: Future):
-            self.active.remove(_id)
+    def _coalesce(self, request: Request) -> Future:
+        key = self.coalesce_key(request)
+        shared = self.inflight.get(key)
+        if shared is not None:
+            self.crawler.stats.inc_value('downloader/coalesced')
+            return shared.wait(request)
 
-        self.active.add(_id)
-        future = self.crawler.loop.create_future()
-        self.queue.append((url, future))
-        self.crawler.loop.create_task(self.process_queue())
+        shared = self.inflight[key] = SharedDownload(self._enqueue_new(request))
+
+        def _done(_download: Future):
+            if self.inflight.get(key) is shared:
+                del self.inflight[key]
+
+        shared.download.add_done_callback(_done)
+        return shared.wait(request)
 
-        future.add_done_callback(_deactivate)
+    def _enqueue_new(self, request: Request) -> Future:
+        future = self.crawler.loop.create_future()
+        if self.ip_concurrency and request.url.host not in self._ip_cache:
+            self.crawler.loop.create_task(self._resolve_and_enqueue(request, future))
+        else:
+            self._enqueue(request, future)
         return future
 
-    async def process_queue(self, delay: Optional[float] = 0):
+    def get_slot_key(self, request: Request) -> str:
+        host = request.url.host or ''
+        if self.ip_concurrency:
+            return self._ip_cache.get(host, host)
+        return host
+
+    def get_slot(self, key: str) -> Slot:
+        slot = self.slots.get(key)
+        if slot is None:
+            concurrency = self.ip_concurrency or self.domain_concurrency
+            options = dict(self.slot_settings.get(key) or {})
+            breaker = None
+            if self.breaker_enabled:
+                breaker = CircuitBreaker(
+                    self.breaker_window, self.breaker_threshold, self.breaker_min_requests, self.breaker_cooldown
+                )
+            slot = self.slots[key] = Slot(
+                options.get('concurrency', concurrency),
+                options.get('delay', self.download_delay),
+                options.get('randomize_delay', self.randomize_delay),
+                breaker,
+            )
+        return slot
+
+    async def _resolve_and_enqueue(self, request: Request, future: Future):
+        url = request.url
+        try:
+            ip = (await self.resolver.resolve(url.host, url.port, socket.AF_UNSPEC))[0]['host']
+        except OSError:
+            # The transfer fails with the same error, the host name is used as slot key meanwhile.
+            pass
+        except CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # The request fails, instead of waiting forever for a slot.
+            if not future.done():
+                future.set_exception(e)
+            return
+        else:
+            self._ip_cache[url.host] = ip
+        self._enqueue(request, future)
+
+    def _enqueue(self, request: Request, future: Future):
+        key = self.get_slot_key(request)
+        slot = self.get_slot(key)
+        if not slot.queue:
+            self._rotation.append(key)
+        slot.queue.append((request, future))
+        if self.dns_prefetch:
+            # The connector looks hosts up with AF_UNSPEC, the prefetched result is what it finds in cache.
+            self.resolver.prefetch(request.url.host, request.url.port, socket.AF_UNSPEC)
+        self._process_queue()
+
+    def _process_queue(self):
         """
-        处理队列中数据
-        :param delay:
+        Start transfers round-robin across ready slots, until every slot with queued requests is either
+        full, waiting for its delay or its circuit is open. A timer is set for the earliest slot waiting
+        for its delay or cooldown.
         :return:
         """
-        # 如果需要延时，延迟调用
-        if delay:
-            await asyncio.sleep(delay)
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        now = time()
+        wait: Optional[float] = None
+        started = True
+        while started:
+            started = False
+            for _ in range(len(self._rotation)):
+                key = self._rotation.popleft()
+                slot = self.slots[key]
+                breaker = slot.breaker
+                if breaker is not None and not self._can_transfer(key, breaker, now):
+                    penalty = breaker.retry_at - now
+                    # A half-open slot waits for its probe to finish instead.
+                    if penalty > 0:
+                        wait = penalty if wait is None else min(wait, penalty)
+                elif slot.free_transfer_slots() > 0:
+                    penalty = slot.next_transfer - now
+                    if penalty > 0:
+                        wait = penalty if wait is None else min(wait, penalty)
+                    else:
+                        self._start_transfer(key, slot, now)
+                        started = True
+                if slot.queue:
+                    self._rotation.append(key)
+        if wait is not None:
+            self._timer = self.crawler.loop.call_later(wait, self._process_queue)
 
-        # 如果任务正在执行，直接返回
-        if self.process_queue_task and not self.process_queue_task.done():
+    def _start_transfer(self, key: str, slot: Slot, now: float):
+        request, future = slot.queue.popleft()
+        # Cancelled while queued, e.g. the engine is closing.
+        if future.done():
             return
+        slot.lastseen = now
+        slot.next_transfer = now + slot.download_delay()
+        task = self.crawler.loop.create_task(self._transfer(slot, request))
+        slot.transferring.add(task)
+        if slot.breaker is not None and slot.breaker.state == CircuitBreaker.HALF_OPEN:
+            slot.breaker.probe = task
+        task.add_done_callback(partial(self._finish_transfer, key, slot, future))
+
+    def _can_transfer(self, key: str, breaker: CircuitBreaker, now: float) -> bool:
+        state = breaker.state
+        allowed = breaker.can_transfer(now)
+        if breaker.state != state:
+            self._circuit_changed(key, breaker)
+        return allowed
+
+    def _record_transfer(self, key: str, slot: Slot, task: Task):
+        breaker = slot.breaker
+        if task.exception() is not None:
+            # A body too large is no failure of the host.
+            failed = not isinstance(task.exception(), DownloadSizeExceeded)
+        else:
+            failed = task.result().status in self.breaker_http_codes
+        state = breaker.state
+        breaker.record(task, failed, time())
+        if breaker.state != state:
+            self._circuit_changed(key, breaker)
+
+    def _circuit_changed(self, key: str, breaker: CircuitBreaker):
+        state = breaker.state
+        if state == CircuitBreaker.CLOSED:
+            self._broken.discard(key)
+            logger.info(f'Circuit of {key} closed')
+        elif state == CircuitBreaker.OPEN:
+            self._broken.add(key)
+            logger.warning(f'Circuit of {key} opened, requests to it are parked for {breaker.cooldown}s')
+        else:
+            logger.info(f'Circuit of {key} half-open, probing')
+        self.crawler.stats.inc_value(f'circuit_breaker/{state}')
+        self.crawler.stats.set_value('circuit_breaker/open_slots', len(self._broken))
+        self.crawler.loop.create_task(self.crawler.signals.send(
+            signal=signals.circuit_state_changed,
+            key=key,
+            state=state,
+            slot=self.slots[key],
+            spider=self.crawler.spider,
+        ))
+
+    def _finish_transfer(self, key: str, slot: Slot, future: Future, task: Task):
+        slot.transferring.discard(task)
+        if slot.breaker is not None and not task.cancelled():
+            self._record_transfer(key, slot, task)
+        if task.cancelled():
+            future.cancel()
+        elif future.done():
+            # The caller gave up waiting, e.g. the engine is closing.
+            pass
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+        self._gc_slots()
+        self._process_queue()
 
+    def _gc_slots(self):
         now = time()
-        # 下载延时，如果两次之间间隔小于设置的延时时间，则在下次调用会延长时间间隔和设置延时时间的差值
-        if self.download_delay:
-            interval = now - self.last_seen
-            if interval < self.download_delay:
-                # 满足延时条件，计算需要延时的实际时间
-                _delay = self.download_delay - interval
-                self.process_queue_task = self.crawler.loop.create_task(self.process_queue(_delay))
-                return
-
-        # 如果队列中有数据，且有可用连接，则持续调用
-        while self.queue and self.available_connections() > 0:
-            url, future = self.queue.popleft()
-            response = await self.download(url)
-            self.last_seen = now
-            future.set_result(response)
-
-            if self.download_delay:
-                await self.process_queue()
-                break
-
-    async def download(self, url: URL):
-        headers = {'user-agent': self.default_user_agent}
-        response = await self.session.get(url, headers=headers)
-        logger.info(f'Session download {url}')
+        if now - self._last_gc < SLOT_GC_INTERVAL:
+            return
+        self._last_gc = now
+        for key, slot in list(self.slots.items()):
+            if slot.is_idle() and now - slot.lastseen > SLOT_GC_INTERVAL:
+                del self.slots[key]
+
+    async def _transfer(self, slot: Slot, request: Request):
+        """
+        Download request and send `response_downloaded` with latency of the response, which is the time
+        until its body was read.
+        :param slot:
+        :param request:
+        :return:
+        """
+        started = time()
+        response = await self.download(request)
+        await self.crawler.signals.send(
+            signal=signals.response_downloaded,
+            response=response,
+            request=request,
+            slot=slot,
+            latency=time() - started,
+            spider=self.crawler.spider,
+        )
         return response
 
+    async def download(self, request: Request) -> Response:
+        """
+        Read the whole body, so the connection goes back to the pool as soon as the transfer is done.
+        :param request:
+        :return:
+        """
+        headers = self.default_headers
+        if request._headers:
+            headers = CIMultiDict(request._headers)
+            headers.setdefault('User-Agent', self.default_user_agent)
+        timeout = self.timeout
+        session, proxy = self.session, None
+        meta = request._meta
+        if meta:
+            if 'download_timeout' in meta:
+                timeout = ClientTimeout(total=meta['download_timeout'])
+            proxy = meta.get('proxy')
+            if proxy:
+                session = self.get_proxy_session(proxy)
+        async with session.request(
+                request.method, request.url, headers=headers, data=request.body or None, timeout=timeout, proxy=proxy
+        ) as response:
+            body = await self.read_body(request, response)
+        logger.info(f'Session download {request}')
+        return Response(response.url, response.status, response.headers, body, request)
+
+    async def read_body(self, request: Request, response: ClientResponse) -> Union[bytes, memoryview]:
+        """
+        Read body chunk by chunk, enforcing DOWNLOAD_MAXSIZE and DOWNLOAD_WARNSIZE. A download whose
+        Content-Length is too large is aborted before its body is read.
+        If request meta `download_stream` is set, a body larger than DOWNLOAD_STREAM_THRESHOLD is written to
+        a temporary file as it arrives, and a memoryview of the file mapped in memory is returned, so only
+        pages which are read take memory, and the OS can drop them again.
+        :param request:
+        :param response:
+        :return:
+        """
+        meta = request._meta or {}
+        maxsize = meta.get('download_maxsize', self.maxsize)
+        warnsize = meta.get('download_warnsize', self.warnsize)
+        stream = meta.get('download_stream', False)
+
+        expected = response.content_length
+        if maxsize and expected is not None and expected > maxsize:
+            raise DownloadSizeExceeded(f'Expected size {expected} of {request} is larger than {maxsize}')
+        warned = False
+        if warnsize and expected is not None and expected > warnsize:
+            logger.warning(f'Expected size {expected} of {request} is larger than {warnsize}')
+            warned = True
+
+        chunks: List[bytes] = []
+        buffered = size = 0
+        file: Optional[IO[bytes]] = None
+        try:
+            async for chunk in response.content.iter_any():
+                size += len(chunk)
+                if maxsize and size > maxsize:
+                    raise DownloadSizeExceeded(f'Received {size} bytes of {request}, larger than {maxsize}')
+                if warnsize and size > warnsize and not warned:
+                    logger.warning(f'Received {size} bytes of {request}, larger than {warnsize}')
+                    warned = True
+                chunks.append(chunk)
+                buffered += len(chunk)
+                if stream and size > self.stream_threshold and buffered >= STREAM_WRITE_SIZE:
+                    if file is None:
+                        file = tempfile.TemporaryFile()
+                    await run_in_thread_pool(file.write, b''.join(chunks))
+                    chunks.clear()
+                    buffered = 0
+            if file is None:
+                return b''.join(chunks)
+            if chunks:
+                await run_in_thread_pool(file.write, b''.join(chunks))
+            await run_in_thread_pool(file.flush)
+            # The mapping keeps the file, which is already unlinked, until the body is garbage collected.
+            return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        finally:
+            if file is not None:
+                file.close()
+
     def init_session(self):
         if self.session is None:
             logger.debug('Init session')
             self.session = ClientSession(connector=self.connector)
 
+    def _create_connector(self) -> TCPConnector:
+        return TCPConnector(limit=self.max_limit, resolver=self.resolver, use_dns_cache=self._use_dns_cache)
+
+    def get_proxy_session(self, proxy: str) -> ClientSession:
+        session = self.proxy_sessions.get(proxy)
+        if session is None:
+            session = self.proxy_sessions[proxy] = ClientSession(connector=self._create_connector())
+        return session
+
+    async def close_proxy_session(self, proxy: str):
+        """
+        Close the connections to a proxy removed from use, a request sent through it later gets a new session.
+        :param proxy:
+        :return:
+        """
+        session = self.proxy_sessions.pop(proxy, None)
+        if session is not None:
+            await session.close()
+
     async def close(self):
         logger.debug('Close downloader.')
-        if self.process_queue_task:
-            self.process_queue_task.cancel()
-        await self.session.close()
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        for slot in self.slots.values():
+            for task in slot.transferring:
+                task.cancel()
+            for _, future in slot.queue:
+                future.cancel()
+            slot.queue.clear()
+        self._rotation.clear()
+        if self.session:
+            await self.session.close()
+        for session in self.proxy_sessions.values():
+            await session.close()
+        self.proxy_sessions.clear()
         await self.connector.close()
+        if self._own_resolver:
+            await self.resolver.close()
@@ -0,0 +1,116 @@
+import asyncio
+from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Iterable, List,
+                    Tuple, Union)
+
+from aio_scrapy.http import Request, Response
+from aio_scrapy.middlewares import BaseMiddlewareManager
+from aio_scrapy.utils.conf import build_component_list
+
+if TYPE_CHECKING:
+    from aio_scrapy.spiders import BaseSpider
+
+# A hook and whether it is a coroutine function.
+_Chain = Tuple[Tuple[Callable, bool], ...]
+
+
+def _compile(methods: Iterable[Callable]) -> _Chain:
+    return tuple((method, asyncio.iscoroutinefunction(method)) for method in methods)
+
+
+class DownloaderMiddlewareManager(BaseMiddlewareManager):
+    """
+    Run `process_request`, `process_response` and `process_exception` of downloader middlewares around
+    a download, `process_request` in order of DOWNLOADER_MIDDLEWARES and the others in reverse order.
+
+    Hooks can be sync or async, sync hooks run inline on the loop, so they must not block.
+    Chains are compiled once, a middleware only costs something per request for the hooks it defines,
+    and the download is called directly if no middleware defines any hook.
+
+    * `process_request(request, spider)` returns None to go on, a Response to skip the download, or a
+      Request to schedule it instead.
+    * `process_response(request, response, spider)` returns a Response to go on, or a Request to schedule
+      it instead.
+    * `process_exception(request, exception, spider)` returns None to let the next one handle it, a Response
+      which goes through `process_response`, or a Request to schedule it instead. If no middleware handles
+      the exception, it is raised.
+    """
+
+    component_name = 'downloader middleware'
+
+    def __init__(self, *middlewares):
+        super().__init__(*middlewares)
+        self._process_request: _Chain = _compile(self.methods['process_request'])
+        self._process_response: _Chain = _compile(self.methods['process_response'])
+        self._process_exception: _Chain = _compile(self.methods['process_exception'])
+        self._hooked = bool(self._process_request or self._process_response or self._process_exception)
+
+    @classmethod
+    def _get_mw_list_from_settings(cls, settings) -> List[str]:
+        return build_component_list(settings.get('DOWNLOADER_MIDDLEWARES_BASE'), settings.get('DOWNLOADER_MIDDLEWARES'))
+
+    def _add_middleware(self, mw: Any):
+        super()._add_middleware(mw)
+        if hasattr(mw, 'process_request'):
+            self.methods['process_request'].append(mw.process_request)
+        if hasattr(mw, 'process_response'):
+            self.methods['process_response'].appendleft(mw.process_response)
+        if hasattr(mw, 'process_exception'):
+            self.methods['process_exception'].appendleft(mw.process_exception)
+
+    async def download(
+            self,
+            download_func: Callable[[Request, 'BaseSpider'], Awaitable[Response]],
+            request: Request,
+            spider: 'BaseSpider'
+    ) -> Union[Response, Request]:
+        """
+        Download request by `download_func` through the hooks of middlewares.
+        :param download_func:
+        :param request:
+        :param spider:
+        :return: a Response, or a Request to schedule instead.
+        """
+        if not self._hooked:
+            return await download_func(request, spider)
+
+        try:
+            response = None
+            for method, is_async in self._process_request:
+                response = method(request, spider)
+                if is_async:
+                    response = await response
+                if response is not None:
+                    _check_result(method, response)
+                    break
+            if response is None:
+                response = await download_func(request, spider)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            response = await self._handle_exception(request, e, spider)
+
+        if isinstance(response, Request):
+            return response
+        for method, is_async in self._process_response:
+            response = method(request, response, spider)
+            if is_async:
+                response = await response
+            _check_result(method, response)
+            if isinstance(response, Request):
+                break
+        return response
+
+    async def _handle_exception(self, request: Request, exception: Exception, spider: 'BaseSpider'):
+        for method, is_async in self._process_exception:
+            result = method(request, exception, spider)
+            if is_async:
+                result = await result
+            if result is not None:
+                _check_result(method, result)
+                return result
+        raise exception
+
+
+def _check_result(method: Callable, result: Any):
+    if not isinstance(result, (Response, Request)):
+        raise TypeError(f'{method.__qualname__} must return Response or Request, got {type(result).__name__}')
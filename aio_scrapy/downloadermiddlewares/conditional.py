@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from typing import TYPE_CHECKING, Dict, NamedTuple, Optional
+
+from aio_scrapy.exceptions import NotConfigured
+from aio_scrapy.extensions.httpcache import http_date_to_epoch
+from aio_scrapy.http import Request, Response
+from aio_scrapy.utils.request import request_fingerprint
+
+if TYPE_CHECKING:
+    from aio_scrapy.crawler import Crawler
+    from aio_scrapy.spiders import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+
+class Validators(NamedTuple):
+    etag: Optional[str]
+    # Epoch seconds of Last-Modified.
+    last_modified: Optional[int]
+    # Digest of the body, and its size.
+    digest: bytes
+    size: int
+
+
+def _key(request: Request) -> int:
+    # 64 bits of the fingerprint as rowid, the table needs no index besides itself.
+    return int.from_bytes(request_fingerprint(request)[:8], 'big', signed=True)
+
+
+def _digest(body) -> bytes:
+    return hashlib.blake2b(body, digest_size=8).digest()
+
+
+class ValidatorStore:
+    """
+    Validators of responses in a SQLite database, a row of about 50 bytes per url keyed by 64 bits of the
+    request fingerprint. Writes are buffered and written `flush_size` at a time by a thread which owns
+    the connection, reads of buffered validators do not touch the database.
+    """
+
+    def __init__(self, path: str, flush_size: int = 1000):
+        self.path = path
+        self.flush_size = flush_size
+        self.db: Optional[sqlite3.Connection] = None
+        self.pending: Dict[int, Validators] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='conditional')
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    async def open(self):
+        await self._run(self._open)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS validators '
+            '(key INTEGER PRIMARY KEY, etag TEXT, last_modified INTEGER, digest BLOB, size INTEGER)'
+        )
+        self.db.commit()
+
+    async def close(self):
+        await self.flush()
+        await self._run(self.db.close)
+        self._executor.shutdown()
+
+    async def get(self, key: int) -> Optional[Validators]:
+        validators = self.pending.get(key)
+        if validators is None:
+            validators = await self._run(self._get, key)
+        return validators
+
+    def _get(self, key: int) -> Optional[Validators]:
+        row = self.db.execute(
+            'SELECT etag, last_modified, digest, size FROM validators WHERE key = ?', (key,)
+        ).fetchone()
+        return None if row is None else Validators(*row)
+
+    async def set(self, key: int, validators: Validators):
+        self.pending[key] = validators
+        if len(self.pending) >= self.flush_size:
+            await self.flush()
+
+    async def flush(self):
+        if self.pending:
+            pending, self.pending = self.pending, {}
+            await self._run(self._write, pending)
+
+    def _write(self, pending: Dict[int, Validators]):
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO validators (key, etag, last_modified, digest, size) VALUES (?, ?, ?, ?, ?)',
+                [(key, *validators) for key, validators in pending.items()],
+            )
+
+
+class ConditionalRequestMiddleware:
+    """
+    Re-crawl only what changed. ETag, Last-Modified and a digest of the body of every GET response are kept in
+    CONDITIONAL_DIR/<spider name>.sqlite, and sent as If-None-Match and If-Modified-Since when the url is
+    requested again. A 304 answer is dropped, and its size counted in `conditional/bytes_saved`.
+    If CONDITIONAL_SKIP_UNCHANGED is set, a response whose body did not change is dropped too, for servers
+    which do not support conditional requests.
+
+    Responses are dropped by request meta `drop_response` rather than by IgnoreRequest, so `process_response`
+    of the middlewares after it in the chain still see them.
+
+    Request meta `dont_conditional` skips it for a request. A response served by the http cache, with request meta
+    `from_cache`, is handed on as it is, it tells nothing about the page now.
+    """
+
+    def __init__(self, crawler: 'Crawler'):
+        settings = crawler.settings
+        if not settings.get('CONDITIONAL_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.dir: str = settings.get('CONDITIONAL_DIR')
+        self.skip_unchanged: bool = settings.get('CONDITIONAL_SKIP_UNCHANGED')
+        self.flush_size: int = settings.get('CONDITIONAL_FLUSH_SIZE')
+        self.store: Optional[ValidatorStore] = None
+
+    @classmethod
+    def from_crawler(cls, crawler: 'Crawler'):
+        return cls(crawler)
+
+    async def open_spider(self, spider: 'BaseSpider'):
+        self.store = ValidatorStore(os.path.join(self.dir, f'{spider.name}.sqlite'), self.flush_size)
+        await self.store.open()
+
+    async def close_spider(self, spider: 'BaseSpider'):
+        await self.store.close()
+
+    async def process_request(self, request: Request, spider: 'BaseSpider') -> None:
+        # Copied from a response dropped before, e.g. by a retry of it.
+        request.meta.pop('drop_response', None)
+        if request.method != 'GET' or request.meta.get('dont_conditional'):
+            return None
+        key = _key(request)
+        validators = await self.store.get(key)
+        request.meta['_conditional'] = (key, validators)
+        if validators is None:
+            return None
+        headers = request.headers
+        if validators.etag and 'If-None-Match' not in headers:
+            headers['If-None-Match'] = validators.etag
+        if validators.last_modified is not None and 'If-Modified-Since' not in headers:
+            headers['If-Modified-Since'] = formatdate(validators.last_modified, usegmt=True)
+        return None
+
+    async def process_response(self, request: Request, response: Response, spider: 'BaseSpider') -> Response:
+        conditional = request.meta.pop('_conditional', None)
+        if conditional is None:
+            return response
+        if request.meta.get('from_cache'):
+            return response
+        key, validators = conditional
+        stats = self.crawler.stats
+
+        if response.status == 304 and validators is not None:
+            stats.inc_value('conditional/not_modified')
+            stats.inc_value('conditional/bytes_saved', validators.size)
+            request.meta['drop_response'] = 'not modified'
+            return response
+        if response.status != 200:
+            return response
+
+        digest = _digest(response.body)
+        last_modified = http_date_to_epoch(response.headers.get('Last-Modified'))
+        await self.store.set(key, Validators(
+            response.headers.get('ETag'),
+            None if last_modified is None else int(last_modified),
+            digest,
+            len(response.body),
+        ))
+        if validators is not None and validators.digest == digest:
+            stats.inc_value('conditional/unchanged')
+            if self.skip_unchanged:
+                request.meta['drop_response'] = 'body unchanged'
+        return response
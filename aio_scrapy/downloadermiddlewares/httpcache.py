@@ -0,0 +1,110 @@
+import logging
+from typing import TYPE_CHECKING, Dict, Optional, Union
+
+from aio_scrapy.downloadermiddlewares.retry import EXCEPTIONS_TO_RETRY
+from aio_scrapy.exceptions import NotConfigured
+from aio_scrapy.http import Request, Response
+from aio_scrapy.utils import load_object
+
+if TYPE_CHECKING:
+    from aio_scrapy.crawler import Crawler
+    from aio_scrapy.spiders import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+
+class HttpCacheMiddleware:
+    """
+    Cache responses by request fingerprint in HTTPCACHE_STORAGE, HTTPCACHE_POLICY decides what is cached
+    and whether a cached response is fresh. A fresh cached response is returned without downloading,
+    a stale one is revalidated by the download, and used instead of a failed download.
+
+    A 304 response is never stored, whatever the policy.
+
+    Request meta `dont_cache` skips the cache for a request. Request meta `from_cache` is set when its
+    response is a cached one handed on without a download, a fresh one or one used instead of a failed download.
+    For the latter, request meta `cache_recovered` is the name of the exception of the download, which middlewares
+    before it in the chain, e.g. ProxyPoolMiddleware, do not see otherwise.
+
+    Cached responses of requests in the downloader are kept by the middleware, not in request meta, so meta of
+    a request stays serializable when it is stored in the queue or in JOBDIR.
+    """
+
+    def __init__(self, crawler: 'Crawler'):
+        settings = crawler.settings
+        if not settings.get('HTTPCACHE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.policy = load_object(settings.get('HTTPCACHE_POLICY'))(settings)
+        self.storage = load_object(settings.get('HTTPCACHE_STORAGE'))(settings)
+        # Cached response of a request, from `process_request` until its download is done.
+        self.cached: Dict[Request, Response] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler: 'Crawler'):
+        return cls(crawler)
+
+    async def open_spider(self, spider: 'BaseSpider'):
+        await self.storage.open_spider(spider)
+
+    async def close_spider(self, spider: 'BaseSpider'):
+        self.cached.clear()
+        await self.storage.close_spider(spider)
+
+    async def process_request(self, request: Request, spider: 'BaseSpider') -> Optional[Response]:
+        meta = request.meta
+        meta.pop('from_cache', None)
+        meta.pop('cache_recovered', None)
+        if meta.get('dont_cache') or not self.policy.should_cache_request(request):
+            meta['_dont_cache'] = True
+            return None
+
+        cachedresponse = await self.storage.retrieve_response(spider, request)
+        if cachedresponse is None:
+            self.crawler.stats.inc_value('httpcache/miss')
+            return None
+        # Kept to tell it from a downloaded response, or to fall back to if the download fails.
+        self.cached[request] = cachedresponse
+        if self.policy.is_cached_response_fresh(cachedresponse, request):
+            self.crawler.stats.inc_value('httpcache/hit')
+            meta['from_cache'] = True
+            return cachedresponse
+        return None
+
+    async def process_response(
+            self,
+            request: Request,
+            response: Response,
+            spider: 'BaseSpider'
+    ) -> Union[Response, Request]:
+        meta = request.meta
+        if meta.pop('_dont_cache', False):
+            return response
+
+        cachedresponse: Optional[Response] = self.cached.pop(request, None)
+        if response is cachedresponse:
+            return response
+        if cachedresponse is None:
+            self.crawler.stats.inc_value('httpcache/firsthand')
+        elif self.policy.is_cached_response_valid(cachedresponse, response, request):
+            self.crawler.stats.inc_value('httpcache/revalidate')
+            return cachedresponse
+        else:
+            self.crawler.stats.inc_value('httpcache/invalidate')
+
+        # A 304 answers validators of another middleware, e.g. conditional requests, it has no body to cache.
+        if response.status != 304 and self.policy.should_cache_response(response, request):
+            self.crawler.stats.inc_value('httpcache/store')
+            await self.storage.store_response(spider, request, response)
+        else:
+            self.crawler.stats.inc_value('httpcache/uncacheable')
+        return response
+
+    def process_exception(self, request: Request, exception: Exception, spider: 'BaseSpider') -> Optional[Response]:
+        cachedresponse = self.cached.pop(request, None)
+        if cachedresponse is not None and isinstance(exception, EXCEPTIONS_TO_RETRY):
+            self.crawler.stats.inc_value('httpcache/errorrecovery')
+            request.meta['from_cache'] = True
+            request.meta['cache_recovered'] = type(exception).__name__
+            return cachedresponse
+        return None
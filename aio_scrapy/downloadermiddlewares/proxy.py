@@ -0,0 +1,199 @@
+import logging
+import random
+from time import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from yarl import URL
+
+from aio_scrapy import signals
+from aio_scrapy.downloadermiddlewares.retry import EXCEPTIONS_TO_RETRY
+from aio_scrapy.exceptions import IgnoreRequest, NotConfigured
+from aio_scrapy.http import Request, Response
+
+if TYPE_CHECKING:
+    from aio_scrapy.crawler import Crawler
+    from aio_scrapy.spiders import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+
+def load_proxies(proxies: Optional[List[str]], path: Optional[str]) -> List[str]:
+    """
+    Proxies of a list and of a file with one proxy url per line, `#` starts a comment.
+    :param proxies:
+    :param path:
+    :return:
+    """
+    result = list(proxies or [])
+    if path:
+        with open(path) as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    result.append(line)
+    # Keep order, drop duplicates.
+    return list(dict.fromkeys(result))
+
+
+class Proxy:
+    """
+    A proxy of the pool and its health, latency and error rate are moving averages over its recent requests.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        parsed = URL(url)
+        # Credentials never go to logs or stats.
+        self.name = f'{parsed.host}:{parsed.port}'
+        self.latency: float = 0
+        self.error_rate: float = 0
+        self.requests = 0
+        self.quarantined_until: float = 0
+        self.quarantines = 0
+
+    def score(self) -> float:
+        """
+        Lower is better, the latency a request can expect, counting failed attempts.
+        :return:
+        """
+        return self.latency / max(0.05, 1 - self.error_rate)
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}({self.name}, latency={self.latency:.3f}, error_rate={self.error_rate:.2f}, '
+            f'requests={self.requests})'
+        )
+
+
+class ProxyPoolMiddleware:
+    """
+    Send requests through proxies of PROXY_LIST and PROXY_LIST_FILE.
+
+    Each request gets the better of two random healthy proxies, scored by their latency and error rate,
+    or with PROXY_STICKY the proxy its host got before while that one stays healthy. A proxy whose error
+    rate reaches PROXY_MAX_ERROR_RATE after PROXY_MIN_REQUESTS requests is quarantined for PROXY_QUARANTINE
+    seconds, twice as long every time, and evicted after PROXY_MAX_QUARANTINES quarantines. Download
+    exceptions and statuses in PROXY_ERROR_HTTP_CODES count as errors of a proxy.
+
+    The downloader keeps a connection pool per proxy, it is closed when the proxy is quarantined or evicted.
+    A request whose meta has `proxy` set already keeps it. A response of HttpCacheMiddleware which was not
+    downloaded, see its `from_cache` meta, does not count, unless it replaces a failed download, which counts
+    as the error of its `cache_recovered` meta.
+    """
+
+    def __init__(self, crawler: 'Crawler'):
+        settings = crawler.settings
+        if not settings.get('PROXY_POOL_ENABLED'):
+            raise NotConfigured
+        urls = load_proxies(settings.get('PROXY_LIST'), settings.get('PROXY_LIST_FILE'))
+        if not urls:
+            raise NotConfigured('PROXY_LIST and PROXY_LIST_FILE have no proxy')
+        self.crawler = crawler
+        self.proxies: Dict[str, Proxy] = {url: Proxy(url) for url in urls}
+        self.sticky: bool = settings.get('PROXY_STICKY')
+        self.alpha: float = settings.get('PROXY_EWMA_ALPHA')
+        self.min_requests: int = settings.get('PROXY_MIN_REQUESTS')
+        self.max_error_rate: float = settings.get('PROXY_MAX_ERROR_RATE')
+        self.quarantine: float = settings.get('PROXY_QUARANTINE')
+        self.max_quarantines: int = settings.get('PROXY_MAX_QUARANTINES')
+        self.error_http_codes = frozenset(int(code) for code in settings.get('PROXY_ERROR_HTTP_CODES'))
+        # Proxy url each host is stuck to.
+        self.hosts: Dict[str, str] = {}
+
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+
+    @classmethod
+    def from_crawler(cls, crawler: 'Crawler'):
+        return cls(crawler)
+
+    def get_proxy(self, host: str) -> Optional[Proxy]:
+        now = time()
+        if self.sticky:
+            proxy = self.proxies.get(self.hosts.get(host))
+            if proxy is not None and proxy.quarantined_until <= now:
+                return proxy
+        healthy = [proxy for proxy in self.proxies.values() if proxy.quarantined_until <= now]
+        if healthy:
+            proxy = min(random.sample(healthy, min(2, len(healthy))), key=Proxy.score)
+        elif self.proxies:
+            # All are quarantined, the one released first is the best bet.
+            proxy = min(self.proxies.values(), key=lambda p: p.quarantined_until)
+        else:
+            return None
+        if self.sticky:
+            self.hosts[host] = proxy.url
+        return proxy
+
+    def process_request(self, request: Request, spider: 'BaseSpider'):
+        meta = request.meta
+        # Proxy of a request set by the spider is kept, one set here is chosen again, e.g. for a retry.
+        if 'proxy' in meta and not meta.get('_proxy_pool'):
+            return None
+        proxy = self.get_proxy(request.url.host)
+        if proxy is None:
+            self.crawler.stats.inc_value('proxy/unavailable')
+            raise IgnoreRequest('all proxies are evicted')
+        meta['proxy'] = proxy.url
+        meta['_proxy_pool'] = True
+        proxy.requests += 1
+        self.crawler.stats.inc_value(f'proxy/{proxy.name}/request_count')
+        return None
+
+    async def response_downloaded(self, response: Response, request: Request, latency: float):
+        proxy = self._proxy_of(request)
+        if proxy is not None:
+            proxy.latency = latency if not proxy.latency else proxy.latency + self.alpha * (latency - proxy.latency)
+
+    async def process_response(self, request: Request, response: Response, spider: 'BaseSpider'):
+        proxy = self._proxy_of(request)
+        if proxy is None:
+            return response
+        meta = request.meta
+        if not meta.get('from_cache'):
+            await self._record(proxy, response.status in self.error_http_codes, f'status_{response.status}')
+        elif meta.get('cache_recovered'):
+            # The cache recovered a failed download before process_exception of this middleware ran.
+            await self._record(proxy, True, meta['cache_recovered'])
+        return response
+
+    async def process_exception(self, request: Request, exception: Exception, spider: 'BaseSpider'):
+        proxy = self._proxy_of(request)
+        if proxy is not None and isinstance(exception, EXCEPTIONS_TO_RETRY):
+            await self._record(proxy, True, type(exception).__name__)
+        return None
+
+    def _proxy_of(self, request: Request) -> Optional[Proxy]:
+        meta = request._meta
+        if not meta or not meta.get('_proxy_pool'):
+            return None
+        return self.proxies.get(meta['proxy'])
+
+    async def _record(self, proxy: Proxy, failed: bool, reason: str):
+        proxy.error_rate += self.alpha * (failed - proxy.error_rate)
+        if not failed:
+            return
+        stats = self.crawler.stats
+        stats.inc_value(f'proxy/{proxy.name}/error_count')
+        stats.inc_value(f'proxy/{proxy.name}/error_count/{reason}')
+        if (
+                proxy.requests < self.min_requests or proxy.error_rate < self.max_error_rate
+                or proxy.quarantined_until > time()
+        ):
+            return
+
+        proxy.quarantines += 1
+        # Its idle connections are of no use any more, transfers through it still going on are aborted.
+        await self.crawler.engine.downloader.close_proxy_session(proxy.url)
+        if proxy.quarantines > self.max_quarantines:
+            logger.warning(f'Evicted proxy {proxy.name}: {proxy!r}')
+            del self.proxies[proxy.url]
+            stats.inc_value('proxy/evicted')
+            return
+        duration = self.quarantine * 2 ** (proxy.quarantines - 1)
+        logger.warning(f'Quarantined proxy {proxy.name} for {duration}s: {proxy!r}')
+        proxy.quarantined_until = time() + duration
+        # It starts afresh when it is released.
+        proxy.requests = 0
+        proxy.error_rate = 0
+        stats.inc_value('proxy/quarantined')
+        stats.inc_value(f'proxy/{proxy.name}/quarantined')
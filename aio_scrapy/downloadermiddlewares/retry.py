@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import time
+from typing import TYPE_CHECKING, Optional, Union
+
+from aiohttp import ClientConnectionError, ClientPayloadError
+
+from aio_scrapy.exceptions import NotConfigured
+from aio_scrapy.http import Request, Response
+
+if TYPE_CHECKING:
+    from aio_scrapy.crawler import Crawler
+    from aio_scrapy.spiders import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+# Timeouts, connection errors including resets and refused connections, and truncated bodies.
+EXCEPTIONS_TO_RETRY = (asyncio.TimeoutError, ClientConnectionError, ClientPayloadError, ConnectionError)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait by `Retry-After` header, which is either seconds or a HTTP date.
+    :param value:
+    :return: None if it is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryMiddleware:
+    """
+    Retry requests which failed with a temporary error, an exception in EXCEPTIONS_TO_RETRY or a response
+    whose status is in RETRY_HTTP_CODES, up to RETRY_TIMES.
+
+    A retry waits an exponential backoff, `RETRY_BACKOFF_BASE * 2 ** (retries - 1)` seconds capped by
+    RETRY_BACKOFF_MAX, of which a fraction RETRY_BACKOFF_JITTER is random. `Retry-After` of a response is
+    honoured if it is longer. The retry waits on a timer of the engine, so it holds no download slot.
+    If RETRY_DEADLINE is set, a request is given up when its retry would start later than that many seconds
+    after its first download. A deadline of request meta only counts from its first failure, so no hook runs
+    on every request when RETRY_DEADLINE is not set.
+
+    Request meta `dont_retry`, `max_retry_times` and `retry_deadline` override settings for a request.
+    """
+
+    def __init__(self, crawler: 'Crawler'):
+        settings = crawler.settings
+        if not settings.get('RETRY_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.max_retry_times: int = settings.get('RETRY_TIMES')
+        self.retry_http_codes = frozenset(int(code) for code in settings.get('RETRY_HTTP_CODES'))
+        self.priority_adjust: int = settings.get('RETRY_PRIORITY_ADJUST')
+        self.backoff_base: float = settings.get('RETRY_BACKOFF_BASE')
+        self.backoff_max: float = settings.get('RETRY_BACKOFF_MAX')
+        self.jitter: float = settings.get('RETRY_BACKOFF_JITTER')
+        self.deadline: Optional[float] = settings.get('RETRY_DEADLINE')
+        if self.deadline:
+            # Every request has a deadline, stamp it without looking at meta.
+            self.process_request = self._stamp_start
+
+    @classmethod
+    def from_crawler(cls, crawler: 'Crawler'):
+        return cls(crawler)
+
+    def _stamp_start(self, request: Request, spider: 'BaseSpider'):
+        request.meta.setdefault('retry_start', time())
+
+    def process_response(self, request: Request, response: Response, spider: 'BaseSpider'):
+        if response.status not in self.retry_http_codes or request.meta.get('dont_retry'):
+            return response
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        return self._retry(request, str(response.status), spider, retry_after) or response
+
+    def process_exception(self, request: Request, exception: Exception, spider: 'BaseSpider'):
+        if isinstance(exception, EXCEPTIONS_TO_RETRY) and not request.meta.get('dont_retry'):
+            return self._retry(request, type(exception).__name__, spider)
+
+    def backoff(self, retries: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (retries - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def _retry(
+            self,
+            request: Request,
+            reason: str,
+            spider: 'BaseSpider',
+            retry_after: Optional[float] = None
+    ) -> Union[Request, None]:
+        stats = self.crawler.stats
+        meta = request.meta
+        retries = meta.get('retry_times', 0) + 1
+        max_retry_times = meta.get('max_retry_times', self.max_retry_times)
+        if retries > max_retry_times:
+            logger.error(f'Gave up retrying {request} (failed {retries} times): {reason}')
+            stats.inc_value('retry/max_reached')
+            return None
+
+        delay = self.backoff(retries)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        now = time()
+        # Only stamped on download with RETRY_DEADLINE, a deadline of meta alone counts from the first failure.
+        start = meta.setdefault('retry_start', now)
+        deadline = meta.get('retry_deadline', self.deadline)
+        if deadline and now + delay - start > deadline:
+            logger.error(f'Gave up retrying {request} (failed {retries} times), deadline {deadline}s reached: {reason}')
+            stats.inc_value('retry/deadline_reached')
+            return None
+
+        logger.debug(f'Retrying {request} (failed {retries} times) in {delay:.2f}s: {reason}')
+        stats.inc_value('retry/count')
+        stats.inc_value(f'retry/reason_count/{reason}')
+        new_meta = dict(meta)
+        new_meta.update(retry_times=retries, retry_start=start, schedule_delay=delay)
+        return request.replace(meta=new_meta, priority=request.priority + self.priority_adjust, dont_filter=True)
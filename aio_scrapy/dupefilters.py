@@ -0,0 +1,271 @@
+import logging
+import math
+import os
+from array import array
+from typing import TYPE_CHECKING, Optional
+
+from aio_scrapy.http import Request
+from aio_scrapy.settings import Settings
+from aio_scrapy.utils import run_in_thread_pool
+from aio_scrapy.utils.job import job_dir, read_pickle, write_pickle
+from aio_scrapy.utils.request import request_fingerprint
+
+if TYPE_CHECKING:
+    from aio_scrapy.crawler import Crawler
+    from aio_scrapy.spiders import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+
+class BaseDupeFilter:
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        return cls()
+
+    @classmethod
+    def from_crawler(cls, crawler: 'Crawler'):
+        return cls.from_settings(crawler.settings)
+
+    def request_seen(self, request: Request) -> bool:
+        return False
+
+    async def open(self):
+        pass
+
+    async def close(self, reason: str):
+        pass
+
+    async def checkpoint(self):
+        pass
+
+    def log(self, request: Request, spider: 'BaseSpider'):
+        pass
+
+
+class FingerprintSet:
+    """
+    Open addressing hash set of 64 or 128 bits fingerprints, stored in a flat `array('Q')`.
+    A fingerprint takes 8 or 16 bytes (plus free slots) instead of a Python object in a `set`.
+    Fingerprints are already uniform hashes, so their low bits are used as slot index directly,
+    collisions are resolved by linear probing. 0 marks a free slot, so fingerprint 0 is stored as 1.
+    """
+
+    max_load = 2 / 3
+
+    def __init__(self, bits: int = 64, capacity: int = 1024):
+        if bits not in (64, 128):
+            raise ValueError(f'Fingerprint bits must be 64 or 128, got {bits}')
+        self.words = bits // 64
+        self._size = 0
+        self._slots = 1 << max(int(capacity / self.max_load), 8).bit_length()
+        self._table = array('Q', bytes(8 * self.words * self._slots))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _split(self, fingerprint: int):
+        low = fingerprint & 0xFFFFFFFFFFFFFFFF
+        high = fingerprint >> 64 if self.words == 2 else 0
+        if not low and not high:
+            low = 1
+        return low, high
+
+    def _insert(self, low: int, high: int) -> bool:
+        table = self._table
+        mask = self._slots - 1
+        index = low & mask
+        if self.words == 1:
+            while True:
+                current = table[index]
+                if not current:
+                    table[index] = low
+                    return True
+                if current == low:
+                    return False
+                index = (index + 1) & mask
+        while True:
+            current_low = table[2 * index]
+            current_high = table[2 * index + 1]
+            if not current_low and not current_high:
+                table[2 * index] = low
+                table[2 * index + 1] = high
+                return True
+            if current_low == low and current_high == high:
+                return False
+            index = (index + 1) & mask
+
+    def add(self, fingerprint: int) -> bool:
+        """
+        :param fingerprint:
+        :return: True if fingerprint is new, False if it was already in set.
+        """
+        added = self._insert(*self._split(fingerprint))
+        if added:
+            self._size += 1
+            if self._size > self._slots * self.max_load:
+                self._grow()
+        return added
+
+    def __contains__(self, fingerprint: int) -> bool:
+        low, high = self._split(fingerprint)
+        table = self._table
+        mask = self._slots - 1
+        index = low & mask
+        while True:
+            if self.words == 1:
+                current = (table[index], 0)
+            else:
+                current = (table[2 * index], table[2 * index + 1])
+            if current == (0, 0):
+                return False
+            if current == (low, high):
+                return True
+            index = (index + 1) & mask
+
+    def _grow(self):
+        old, words = self._table, self.words
+        self._slots *= 2
+        self._table = array('Q', bytes(8 * words * self._slots))
+        for i in range(0, len(old), words):
+            low = old[i]
+            high = old[i + 1] if words == 2 else 0
+            if low or high:
+                self._insert(low, high)
+
+    def copy(self) -> 'FingerprintSet':
+        fingerprint_set = FingerprintSet.__new__(FingerprintSet)
+        fingerprint_set.__dict__.update(self.__dict__)
+        fingerprint_set._table = self._table[:]
+        return fingerprint_set
+
+    def __iter__(self):
+        table, words = self._table, self.words
+        for i in range(0, len(table), words):
+            low = table[i]
+            high = table[i + 1] if words == 2 else 0
+            if low or high:
+                yield low | high << 64
+
+
+class BloomFilter:
+    """
+    Bloom filter sized for `capacity` elements with `error_rate` false positive probability.
+    Bit positions are derived from a 128 bits fingerprint by double hashing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        if not 0 < error_rate < 1:
+            raise ValueError(f'Bloom filter error rate must be in (0, 1), got {error_rate}')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.bits / capacity * math.log(2))), 1)
+        self.array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, fingerprint: int):
+        h1 = fingerprint & 0xFFFFFFFFFFFFFFFF
+        h2 = (fingerprint >> 64) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, fingerprint: int) -> bool:
+        """
+        :param fingerprint:
+        :return: True if fingerprint was (probably) not in filter.
+        """
+        added = False
+        array_ = self.array
+        for position in self._positions(fingerprint):
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not array_[byte] & bit:
+                array_[byte] |= bit
+                added = True
+        return added
+
+    def copy(self) -> 'BloomFilter':
+        bloom = BloomFilter.__new__(BloomFilter)
+        bloom.__dict__.update(self.__dict__)
+        bloom.array = bytearray(self.array)
+        return bloom
+
+    def __contains__(self, fingerprint: int) -> bool:
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self._positions(fingerprint))
+
+
+class RFPDupeFilter(BaseDupeFilter):
+    """
+    Request fingerprint dupe filter, exact mode.
+    Keeps DUPEFILTER_FINGERPRINT_BITS (64 or 128) bits of every fingerprint in a `FingerprintSet`.
+    If JOBDIR is set, seen fingerprints are persisted to `JOBDIR/requests.seen`.
+    """
+
+    def __init__(self, bits: int = 64, debug: bool = False, path: Optional[str] = None):
+        self.bits = bits
+        self.debug = debug
+        self.fingerprints = FingerprintSet(bits)
+        self.log_dupes = True
+        self.path = path
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        return cls(settings.get('DUPEFILTER_FINGERPRINT_BITS'), settings.get('DUPEFILTER_DEBUG'), job_dir(settings))
+
+    @property
+    def seen_path(self) -> str:
+        return os.path.join(self.path, 'requests.seen')
+
+    async def open(self):
+        if not self.path:
+            return
+        fingerprints = await run_in_thread_pool(read_pickle, self.seen_path)
+        if fingerprints is None:
+            return
+        # Fingerprints must have been saved by the same mode, and with the same width in exact mode.
+        if type(fingerprints) is type(self.fingerprints) and getattr(fingerprints, 'words', 2) * 64 == self.bits:
+            self.fingerprints = fingerprints
+        else:
+            logger.warning(f'Ignore seen requests in {self.seen_path}, they were saved by another dupe filter mode')
+
+    async def close(self, reason: str):
+        await self.checkpoint()
+
+    async def checkpoint(self):
+        if self.path:
+            # Copy of the flat array is a memcpy on loop, pickling and writing run in thread pool.
+            await run_in_thread_pool(write_pickle, self.seen_path, self.fingerprints.copy())
+
+    def request_fingerprint(self, request: Request) -> int:
+        return int.from_bytes(request_fingerprint(request)[:self.bits // 8], 'little')
+
+    def request_seen(self, request: Request) -> bool:
+        return not self.fingerprints.add(self.request_fingerprint(request))
+
+    def log(self, request: Request, spider: 'BaseSpider'):
+        if self.debug:
+            logger.debug(f'Filtered duplicate request: {request}')
+        elif self.log_dupes:
+            logger.debug(f'Filtered duplicate request: {request} - no more duplicates will be shown '
+                         f'(see DUPEFILTER_DEBUG to show all duplicates)')
+            self.log_dupes = False
+
+
+class BloomDupeFilter(RFPDupeFilter):
+    """
+    Request fingerprint dupe filter backed by a Bloom filter, for very large crawls.
+    Memory is fixed by DUPEFILTER_BLOOM_CAPACITY and DUPEFILTER_BLOOM_ERROR_RATE, the price is that
+    a new request is wrongly dropped with probability about the error rate once capacity is reached.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, debug: bool = False, path: Optional[str] = None):
+        super().__init__(128, debug, path)
+        self.fingerprints = BloomFilter(capacity, error_rate)
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        return cls(
+            settings.get('DUPEFILTER_BLOOM_CAPACITY'),
+            settings.get('DUPEFILTER_BLOOM_ERROR_RATE'),
+            settings.get('DUPEFILTER_DEBUG'),
+            job_dir(settings),
+        )
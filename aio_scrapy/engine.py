@@ -1,54 +1,95 @@
+import asyncio
 import logging
+import os
+from asyncio import Task
 from asyncio.futures import Future
-from typing import TYPE_CHECKING, Any, Optional
+from datetime import datetime
+from typing import (TYPE_CHECKING, Any, AsyncIterable, Awaitable, Dict,
+                    Iterable, Optional, Type, Union)
 
+from aiohttp.typedefs import StrOrURL
 from periodic import Periodic
-from yarl import URL
 
 from aio_scrapy import signals
 from aio_scrapy.downloader import Downloader
-from aio_scrapy.exceptions import DontCloseSpider
-from aio_scrapy.scheduler import SimpleScheduler
+from aio_scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from aio_scrapy.http import Request, Response
+from aio_scrapy.scheduler import BaseScheduler
 from aio_scrapy.scraper import Scraper
-from aio_scrapy.utils import CallLateOnce
+from aio_scrapy.utils import (CallLateOnce, as_async_generator, load_object,
+                              run_in_thread_pool)
+from aio_scrapy.utils.job import job_dir, read_pickle, write_pickle
+from aio_scrapy.utils.shard import host_shard
 
 if TYPE_CHECKING:
     from aio_scrapy.crawler import Crawler
     from aio_scrapy.spiders import BaseSpider
+    from aio_scrapy.utils.shard import ShardRouter
 logger = logging.getLogger(__name__)
 
 
 class Slot:
 
-    def __init__(self):
-        self.in_progress = set()
+    def __init__(self, max_in_progress: int):
+        # Download task and its request
+        self.in_progress: Dict[Future, Request] = {}
+        self.max_in_progress = max_in_progress
+        self.closing = False
 
-    def add_in_progress(self, task: Future):
-        self.in_progress.add(task)
+    def add_in_progress(self, task: Future, request: Request):
+        self.in_progress[task] = request
 
     def remove_in_progress(self, task: Future):
-        self.in_progress.remove(task)
+        del self.in_progress[task]
+
+    def is_full(self, parked: int = 0) -> bool:
+        """
+        :param parked: requests in progress which do not count, e.g. parked by an open circuit breaker.
+        :return:
+        """
+        return len(self.in_progress) - parked >= self.max_in_progress
 
 
 class ExecutionEngine:
 
     def __init__(self, crawler: 'Crawler') -> None:
         self.downloader = Downloader(crawler)
-        self.scheduler = SimpleScheduler.from_crawler(crawler)
+        scheduler_cls: Type[BaseScheduler] = load_object(crawler.settings.get('SCHEDULER'))
+        self.scheduler = scheduler_cls.from_crawler(crawler)
+        self.dupefilter = load_object(crawler.settings.get('DUPEFILTER_CLASS')).from_crawler(crawler)
         self.crawler = crawler
         self.running = False
         self._close_wait: Future = self.crawler.loop.create_future()
 
-        self.slot = Slot()
+        self.slot = Slot(crawler.settings.get('CONCURRENT_REQUESTS'))
+        # Tasks waiting to schedule a request later, e.g. a retry after backoff.
+        self.delayed: Dict[Task, Request] = {}
 
         self.spider: Optional['BaseSpider'] = None
 
         self.request_periodic_task: Optional[Periodic] = None
+        self.heartbeat_interval: float = crawler.settings.get('ENGINE_HEARTBEAT_INTERVAL')
 
         self.scraper = Scraper(self.crawler)
 
         self.next_call: Optional[CallLateOnce] = None
 
+        self.start_requests = None
+        self.start_requests_task: Optional[Task] = None
+        self.start_requests_high_watermark: int = crawler.settings.get('START_REQUESTS_HIGH_WATERMARK')
+        self.start_requests_low_watermark: int = crawler.settings.get('START_REQUESTS_LOW_WATERMARK')
+        self._start_requests_resume: Optional[asyncio.Event] = None
+        self.shard_index: int = crawler.settings.get('SHARD_INDEX')
+        self.shard_count: int = crawler.settings.get('SHARD_COUNT')
+        # Set by CrawlerRunner in a worker process, it sends requests of hosts of other workers to them.
+        self.router: Optional['ShardRouter'] = None
+
+        self.jobdir: Optional[str] = job_dir(crawler.settings)
+        self.checkpoint_interval: float = crawler.settings.get('JOBDIR_CHECKPOINT_INTERVAL')
+        self.checkpoint_periodic_task: Optional[Periodic] = None
+        # Checkpoint being written, it is not cancelled with the periodic task.
+        self._checkpoint_task: Optional[Task] = None
+
         self.is_idle = False
         self.close_if_idle = True
         self.closing = False
@@ -57,8 +98,15 @@ class ExecutionEngine:
         logger.info('Engine start')
         await self.crawler.signals.send(signal=signals.engine_started)
         self.running = True
+        if self.start_requests is not None:
+            self.start_requests_task = self.crawler.loop.create_task(
+                self._process_start_requests(self.start_requests)
+            )
+        self.wakeup()
         if self.request_periodic_task:
             await self.request_periodic_task.start()
+        if self.checkpoint_periodic_task:
+            await self.checkpoint_periodic_task.start()
         return await self._close_wait
 
     async def stop(self) -> None:
@@ -69,70 +117,245 @@ class ExecutionEngine:
         if self.request_periodic_task:
             await self.request_periodic_task.stop()
 
-        self._close_wait.set_result('stop')
+        if not self._close_wait.done():
+            self._close_wait.set_result('stop')
 
-    async def open_spider(self, spider: 'BaseSpider', start_urls, close_if_idle: bool = True) -> None:
+    async def open_spider(
+            self,
+            spider: 'BaseSpider',
+            start_requests: Optional[Union[Iterable, AsyncIterable]] = None,
+            close_if_idle: bool = True
+    ) -> None:
         self.close_if_idle = close_if_idle
         self.spider = spider
+        self.start_requests = start_requests
+        self._start_requests_resume = asyncio.Event()
+        await self.scheduler.open(spider)
+        await self.dupefilter.open()
+        await self.downloader.open_spider(spider)
+        await self.scraper.open_spider(spider)
+        if self.jobdir:
+            spider.state = await run_in_thread_pool(read_pickle, self.spider_state_path, {})
+            self.checkpoint_periodic_task = Periodic(self.checkpoint_interval, self.checkpoint)
+        self.crawler.stats.open_spider(spider)
+        self.crawler.stats.set_value('start_time', datetime.now())
         await self.crawler.signals.send(signal=signals.spider_opened, spider=spider)
-        self.next_call = CallLateOnce(self._next_request, start_urls)
-        self.request_periodic_task = Periodic(5, self.next_call.scheduler)
+        self.next_call = CallLateOnce(self._next_request)
+        self.request_periodic_task = Periodic(self.heartbeat_interval, self.next_call.scheduler)
+
+    @property
+    def spider_state_path(self) -> str:
+        return os.path.join(self.jobdir, 'spider.state')
+
+    async def checkpoint(self) -> None:
+        """
+        Persist scheduler, dupe filter and `spider.state` to JOBDIR. Each component takes a cheap
+        snapshot on loop and writes it in thread pool, so downloading is not stalled.
+        :return:
+        """
+        if not self.jobdir:
+            return
+        if self._checkpoint_task is None:
+            self._checkpoint_task = self.crawler.loop.create_task(self._checkpoint())
+        # Writes go on in thread pool if the caller is cancelled, the task finishes them before the next checkpoint.
+        await asyncio.shield(self._checkpoint_task)
+
+    async def _checkpoint(self) -> None:
+        try:
+            await asyncio.gather(
+                self.scheduler.checkpoint(),
+                self.dupefilter.checkpoint(),
+                run_in_thread_pool(write_pickle, self.spider_state_path, dict(getattr(self.spider, 'state', {}))),
+            )
+            logger.debug(f'Checkpoint saved to {self.jobdir}')
+        except Exception:
+            # A failed checkpoint must not stop the crawl, the next one retries.
+            logger.error(f'Error while saving checkpoint to {self.jobdir}', exc_info=True)
+        finally:
+            self._checkpoint_task = None
+
+    def wakeup(self) -> None:
+        """
+        Schedule `_next_request` immediately.
+        It is called whenever a download or scrape slot is freed, a request is enqueued
+        or an item leaves the pipelines, the periodic heartbeat is only a safety net.
+        :return:
+        """
+        if self.next_call and not self.closing:
+            self.next_call.schedule()
 
     def should_revocation(self):
 
         if any([
             self.downloader.should_revocation(),
             self.scraper.should_revocation(),
+            # Requests parked behind an open circuit, up to the slot's concurrency, do not hold up other hosts.
+            self.slot.is_full(self.downloader.parked()),
             self.closing
         ]):
             return True
 
-    async def _next_request(self, start_requests) -> None:
+    async def _next_request(self) -> None:
         """
         Schedule next request. If should revocation, it will not schedule url to queue.
         And check spider is idle, will close or idle.
-        :param start_requests:
         :return:
         """
         while not self.should_revocation():
             if not await self._next_request_from_scheduler(self.spider):
                 break
 
-        if start_requests and not self.should_revocation():
-            try:
-                url = next(start_requests)
-                url = URL(url)
-            except StopIteration:
-                pass
-            else:
-                await self.crawl(url, self.spider)
-
         if self.spider_is_idle(self.spider) and self.close_if_idle:
             await self._spider_idle(self.spider)
 
-    async def crawl(self, url: URL, spider):
+    async def _process_start_requests(self, start_requests: Union[Iterable, AsyncIterable]) -> None:
+        """
+        Consume start requests lazily, they can be a sync or an async generator.
+        Consumption pauses when scheduler holds START_REQUESTS_HIGH_WATERMARK requests and resumes
+        when it drains down to START_REQUESTS_LOW_WATERMARK, so seeds are never fully materialized.
+        In a sharded crawl, urls whose host belongs to another shard are skipped.
+        :param start_requests:
+        :return:
         """
-        Add url to scheduler queue.
-        :param url:
+        try:
+            async for request in as_async_generator(start_requests):
+                if not isinstance(request, Request):
+                    request = Request(request)
+                if self._is_foreign(request):
+                    continue
+                await self.crawl(request, self.spider)
+                if len(self.scheduler) >= self.start_requests_high_watermark:
+                    self._start_requests_resume.clear()
+                    await self._start_requests_resume.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.error('Error while obtaining start requests', exc_info=True)
+        finally:
+            self.start_requests = None
+            self.wakeup()
+
+    def _shard(self, request: Request) -> int:
+        return host_shard(request.url, self.shard_count) if self.shard_count > 1 else self.shard_index
+
+    def _is_foreign(self, request: Request) -> bool:
+        return self._shard(request) != self.shard_index
+
+    def crawl_later(self, request: Request, spider, delay: float) -> None:
+        """
+        Crawl request after `delay` seconds. It waits on a timer, not in scheduler or a download slot,
+        and the spider is not idle meanwhile.
+        :param request:
         :param spider:
+        :param delay:
         :return:
         """
-        self.scheduler.enqueue_request(url)
-        await self.next_call.scheduler()
+        task = self.crawler.loop.create_task(self._crawl_later(request, spider, delay))
+        self.delayed[task] = request
+
+        def _finish(_task: Task):
+            del self.delayed[_task]
+            self.wakeup()
+
+        task.add_done_callback(_finish)
+
+    async def _crawl_later(self, request: Request, spider, delay: float):
+        await asyncio.sleep(delay)
+        await self.crawl(request, spider)
+
+    async def crawl(self, request: Union[Request, StrOrURL], spider, priority: Optional[int] = None):
+        """
+        Add request to scheduler queue. A request seen before is dropped by dupe filter and
+        `request_dropped` signal is sent, unless its `dont_filter` is set.
+        In a sharded crawl, a request whose host belongs to another shard is sent to the worker of that shard,
+        which has the dupe filter and slot of the host. It is crawled here if it can not be serialized.
+        :param request: a Request, or a url which will be wrapped as a Request.
+        :param spider:
+        :param priority: override priority of request, higher is crawled earlier by PriorityScheduler.
+        :return:
+        """
+        if not isinstance(request, Request):
+            request = Request(request)
+        if priority is not None:
+            request.priority = priority
+        if self.router is not None:
+            shard = self._shard(request)
+            if shard != self.shard_index and self.router.send(request, shard):
+                return
+        if not request.dont_filter and self.dupefilter.request_seen(request):
+            self.dupefilter.log(request, spider)
+            self.crawler.stats.inc_value('dupefilter/filtered')
+            await self.crawler.signals.send(signal=signals.request_dropped, request=request, spider=spider)
+            return
+        self.scheduler.enqueue_request(request)
+        self.wakeup()
 
     async def _next_request_from_scheduler(self, spider) -> bool:
-        url = self.scheduler.next_request()
-        if url:
-            await self.next_call.scheduler()
-            response = await self.downloading(url)
-            await self.scraper.enqueue_scrape(url, response, spider)
-            return True
-        else:
+        """
+        Pop a request from scheduler and download it in a background task tracked by `slot.in_progress`,
+        so the scheduling loop never waits on the network.
+        :param spider:
+        :return: False if scheduler has no pending request.
+        """
+        request = self.scheduler.next_request()
+        if not request:
             return False
 
-    async def downloading(self, url: URL):
-        response = await self.downloader.fetch(url)
-        await self.next_call.scheduler()
+        if len(self.scheduler) <= self.start_requests_low_watermark:
+            self._start_requests_resume.set()
+
+        task = self.crawler.loop.create_task(self._download(request, spider))
+        self.slot.add_in_progress(task, request)
+
+        def _finish(_task: Task):
+            self.slot.remove_in_progress(_task)
+            self.wakeup()
+
+        task.add_done_callback(_finish)
+        return True
+
+    async def _download(self, request: Request, spider: 'BaseSpider'):
+        """
+        Download request and hand the response over to scraper without waiting the scrape finished.
+        Scraper will apply its own backpressure by `should_revocation`. If download failed, the exception
+        is handed over instead when the request has an errback. A Request returned by a downloader middleware
+        is scheduled, after `schedule_delay` seconds of its meta if it is set. A request dropped by a downloader
+        middleware raising IgnoreRequest is not handed over, nor is a response whose request meta has
+        `drop_response` set by a middleware, which lets later middlewares process it first.
+        :param request:
+        :param spider:
+        :return:
+        """
+        try:
+            result = await self.downloading(request, spider)
+        except asyncio.CancelledError:
+            raise
+        except IgnoreRequest as e:
+            logger.debug(f'Ignored {request}: {e}')
+            return
+        except Exception as e:
+            if request.errback is None:
+                logger.error(f'Error downloading {request}', exc_info=True)
+                return
+            result = e
+        if isinstance(result, Request):
+            delay = result.meta.pop('schedule_delay', None)
+            if delay:
+                self.crawl_later(result, spider, delay)
+            else:
+                await self.crawl(result, spider)
+            return
+        reason = request.meta.pop('drop_response', None) if request._meta else None
+        if reason:
+            logger.debug(f'Dropped {result} of {request}: {reason}')
+            return
+        self.scraper.enqueue_scrape(request, result, spider)
+
+    async def downloading(self, request: Request, spider: 'BaseSpider') -> Union[Response, Request]:
+        response = await self.downloader.fetch(request, spider)
+        if isinstance(response, Response):
+            self.crawler.stats.inc_value('response_received_count')
+        self.wakeup()
         return response
 
     async def _spider_idle(self, spider: 'BaseSpider'):
@@ -144,12 +367,21 @@ class ExecutionEngine:
             await self.close_spider(spider, reason='finished')
 
     def spider_is_idle(self, spider):
+        if self.start_requests is not None:
+            return False
+
         if not self.scraper.is_idle():
             return False
 
         if self.downloader.active:
             return False
 
+        if self.slot.in_progress:
+            return False
+
+        if self.delayed:
+            return False
+
         if self.scheduler.has_pending_requests():
             return False
 
@@ -158,8 +390,41 @@ class ExecutionEngine:
     async def close_spider(self, spider, reason='finished'):
         if not self.closing:
             self.closing = True
-            await self.downloader.close()
-            await self.scraper.close_spider(spider)
-            await self.scheduler.close(reason)
-            await self.crawler.signals.send(signals.spider_closed, spider=spider, reason=reason)
-            await self.stop()
+            if self.start_requests_task:
+                self.start_requests_task.cancel()
+            if self.checkpoint_periodic_task:
+                await self.checkpoint_periodic_task.stop()
+            if self._checkpoint_task:
+                # A periodic checkpoint still writing would race the final one.
+                await asyncio.wait([self._checkpoint_task])
+            for task, request in list(self.slot.in_progress.items()):
+                task.cancel()
+                # Give back unfinished requests, so a persisted scheduler resumes them.
+                self.scheduler.enqueue_request(request)
+            for task, request in list(self.delayed.items()):
+                task.cancel()
+                self.scheduler.enqueue_request(request)
+            try:
+                # A failing step is logged, the following ones still run and the engine always stops.
+                await self._close_step('closing downloader', self.downloader.close_spider(spider))
+                await self._close_step('closing downloader', self.downloader.close())
+                await self._close_step('closing scraper', self.scraper.close_spider(spider))
+                await self._close_step('closing scheduler', self.scheduler.close(reason))
+                await self._close_step('closing dupefilter', self.dupefilter.close(reason))
+                if self.jobdir:
+                    await self._close_step('saving spider state', run_in_thread_pool(
+                        write_pickle, self.spider_state_path, dict(getattr(spider, 'state', {}))
+                    ))
+                await self.crawler.signals.send(signals.spider_closed, spider=spider, reason=reason)
+                self.crawler.stats.set_value('finish_time', datetime.now())
+                self.crawler.stats.set_value('finish_reason', reason)
+                self.crawler.stats.close_spider(spider, reason=reason)
+            finally:
+                await self.stop()
+
+    @staticmethod
+    async def _close_step(description: str, step: Awaitable) -> None:
+        try:
+            await step
+        except Exception:
+            logger.error(f'Error while {description}', exc_info=True)
@@ -4,3 +4,21 @@ class DontCloseSpider(Exception):
 
 class DropItem(Exception):
     pass
+
+
+class DownloadSizeExceeded(Exception):
+    """
+    Raised by the downloader when a response body is larger than DOWNLOAD_MAXSIZE.
+    """
+
+
+class IgnoreRequest(Exception):
+    """
+    Raised by a downloader middleware to drop a request, nothing is handed to the spider.
+    """
+
+
+class NotConfigured(Exception):
+    """
+    Raised by a component on creation to tell it is disabled by settings.
+    """
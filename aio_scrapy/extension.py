@@ -0,0 +1,16 @@
+from typing import List
+
+from aio_scrapy.middlewares import BaseMiddlewareManager
+from aio_scrapy.utils.conf import build_component_list
+
+
+class ExtensionManager(BaseMiddlewareManager):
+    """
+    Extensions are created with the crawler and hook into it by signals.
+    """
+
+    component_name = 'extension'
+
+    @classmethod
+    def _get_mw_list_from_settings(cls, settings) -> List[str]:
+        return build_component_list(settings.get('EXTENSIONS_BASE'), settings.get('EXTENSIONS'))
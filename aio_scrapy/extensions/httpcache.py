@@ -0,0 +1,302 @@
+"""
+Policies deciding what HttpCacheMiddleware caches and when a cached response is fresh, and storages
+keeping cached responses. Storages do their file IO in threads, so cache reads never block the loop.
+"""
+import asyncio
+import os
+import pickle
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import mktime_tz, parsedate_tz
+from time import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from aio_scrapy.http import Request, Response
+from aio_scrapy.settings import Settings
+from aio_scrapy.utils import run_in_thread_pool
+from aio_scrapy.utils.request import request_fingerprint
+
+if TYPE_CHECKING:
+    from aio_scrapy.spiders import BaseSpider
+
+
+class DummyPolicy:
+    """
+    Cache every response, and a cached response is always fresh. Useful to re-run a crawl offline.
+    """
+
+    def __init__(self, settings: Settings):
+        self.ignore_schemes = frozenset(settings.get('HTTPCACHE_IGNORE_SCHEMES'))
+        self.ignore_http_codes = frozenset(int(code) for code in settings.get('HTTPCACHE_IGNORE_HTTP_CODES'))
+
+    def should_cache_request(self, request: Request) -> bool:
+        return request.url.scheme not in self.ignore_schemes
+
+    def should_cache_response(self, response: Response, request: Request) -> bool:
+        return response.status not in self.ignore_http_codes
+
+    def is_cached_response_fresh(self, cachedresponse: Response, request: Request) -> bool:
+        return True
+
+    def is_cached_response_valid(self, cachedresponse: Response, response: Response, request: Request) -> bool:
+        return True
+
+
+def parse_cache_control(header: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    Directives of a Cache-Control header, e.g. `public, max-age=3600` is `{'public': None, 'max-age': '3600'}`.
+    :param header:
+    :return:
+    """
+    directives = {}
+    for directive in (header or '').split(','):
+        key, sep, value = directive.strip().partition('=')
+        if key:
+            directives[key.lower()] = value.strip().strip('"') if sep else None
+    return directives
+
+
+def _request_cache_control(request: Request) -> Dict[str, Optional[str]]:
+    return parse_cache_control(request._headers.get('Cache-Control') if request._headers else None)
+
+
+def http_date_to_epoch(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    try:
+        return mktime_tz(parsed)
+    except (OverflowError, ValueError):
+        return None
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RFC2616Policy:
+    """
+    Cache as RFC 2616 says, honouring Cache-Control and Expires of requests and responses.
+    A stale cached response is revalidated with If-None-Match and If-Modified-Since, and used again if
+    the server answers 304, or if it fails with a server error and the response does not say must-revalidate.
+    """
+
+    # Lifetime of permanent redirects.
+    MAXAGE = 3600 * 24 * 365
+
+    def __init__(self, settings: Settings):
+        self.always_store: bool = settings.get('HTTPCACHE_ALWAYS_STORE')
+        self.ignore_schemes = frozenset(settings.get('HTTPCACHE_IGNORE_SCHEMES'))
+        self.ignore_response_cache_controls = frozenset(
+            directive.lower() for directive in settings.get('HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS')
+        )
+
+    def _response_cache_control(self, response: Response) -> Dict[str, Optional[str]]:
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        for directive in self.ignore_response_cache_controls:
+            directives.pop(directive, None)
+        return directives
+
+    def should_cache_request(self, request: Request) -> bool:
+        if request.url.scheme in self.ignore_schemes:
+            return False
+        return 'no-store' not in _request_cache_control(request)
+
+    def should_cache_response(self, response: Response, request: Request) -> bool:
+        cache_control = self._response_cache_control(response)
+        if 'no-store' in cache_control:
+            return False
+        # A 304 has no body to cache.
+        if response.status == 304:
+            return False
+        if self.always_store:
+            return True
+        if 'max-age' in cache_control or 'Expires' in response.headers:
+            return True
+        if response.status in (300, 301, 308):
+            return True
+        if response.status in (200, 203, 401):
+            return 'Last-Modified' in response.headers or 'ETag' in response.headers
+        return False
+
+    def is_cached_response_fresh(self, cachedresponse: Response, request: Request) -> bool:
+        response_cc = self._response_cache_control(cachedresponse)
+        request_cc = _request_cache_control(request)
+        if 'no-cache' in response_cc or 'no-cache' in request_cc:
+            return False
+
+        now = time()
+        lifetime = self._freshness_lifetime(cachedresponse, response_cc, now)
+        age = self._current_age(cachedresponse, now)
+        max_age = _int(request_cc.get('max-age'))
+        if age < (lifetime if max_age is None else min(lifetime, max_age)):
+            return True
+
+        if 'max-stale' in request_cc and 'must-revalidate' not in response_cc:
+            max_stale = request_cc['max-stale']
+            if max_stale is None:
+                return True
+            if age < lifetime + (_int(max_stale) or 0):
+                return True
+
+        self._set_conditional_validators(request, cachedresponse)
+        return False
+
+    def is_cached_response_valid(self, cachedresponse: Response, response: Response, request: Request) -> bool:
+        if response.status >= 500:
+            return 'must-revalidate' not in self._response_cache_control(cachedresponse)
+        return response.status == 304
+
+    def _set_conditional_validators(self, request: Request, cachedresponse: Response):
+        if 'Last-Modified' in cachedresponse.headers:
+            request.headers['If-Modified-Since'] = cachedresponse.headers['Last-Modified']
+        if 'ETag' in cachedresponse.headers:
+            request.headers['If-None-Match'] = cachedresponse.headers['ETag']
+
+    def _freshness_lifetime(self, response: Response, cache_control: Dict[str, Optional[str]], now: float) -> float:
+        max_age = _int(cache_control.get('max-age'))
+        if max_age is not None:
+            return max_age
+        date = http_date_to_epoch(response.headers.get('Date')) or now
+        expires = http_date_to_epoch(response.headers.get('Expires'))
+        if expires is not None:
+            return max(0.0, expires - date)
+        # Heuristic of RFC 2616 13.2.4, a tenth of the time since last modification.
+        last_modified = http_date_to_epoch(response.headers.get('Last-Modified'))
+        if last_modified is not None and last_modified <= date:
+            return (date - last_modified) / 10
+        if response.status in (300, 301, 308):
+            return self.MAXAGE
+        return 0
+
+    def _current_age(self, response: Response, now: float) -> float:
+        date = http_date_to_epoch(response.headers.get('Date'))
+        age = max(0.0, now - date) if date is not None else 0.0
+        header_age = _int(response.headers.get('Age'))
+        return max(age, header_age) if header_age is not None else age
+
+
+def _dump_response(response: Response) -> bytes:
+    return pickle.dumps(
+        (str(response.url), response.status, list(response.headers.items()), bytes(response.body)),
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+
+
+def _load_response(data: bytes, request: Request) -> Response:
+    url, status, headers, body = pickle.loads(data)
+    return Response(url, status, headers, body, request)
+
+
+class FilesystemCacheStorage:
+    """
+    A file per response in HTTPCACHE_DIR/<spider name>/, sharded into 256 directories by the first byte
+    of the request fingerprint. A response is expired HTTPCACHE_EXPIRATION_SECS after it was stored.
+    """
+
+    def __init__(self, settings: Settings):
+        self.cache_dir: str = settings.get('HTTPCACHE_DIR')
+        self.expiration_secs: float = settings.get('HTTPCACHE_EXPIRATION_SECS')
+        self.spider_dir: Optional[str] = None
+
+    async def open_spider(self, spider: 'BaseSpider'):
+        self.spider_dir = os.path.join(self.cache_dir, spider.name)
+
+    async def close_spider(self, spider: 'BaseSpider'):
+        pass
+
+    def _path(self, request: Request) -> str:
+        key = request_fingerprint(request).hex()
+        return os.path.join(self.spider_dir, key[:2], key)
+
+    async def retrieve_response(self, spider: 'BaseSpider', request: Request) -> Optional[Response]:
+        data = await run_in_thread_pool(self._read, self._path(request))
+        return None if data is None else _load_response(data, request)
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, 'rb') as f:
+                if self.expiration_secs and time() - os.fstat(f.fileno()).st_mtime > self.expiration_secs:
+                    return None
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def store_response(self, spider: 'BaseSpider', request: Request, response: Response):
+        # Pickling a large body takes a while, it is done in the thread too.
+        await run_in_thread_pool(self._store, self._path(request), response)
+
+    def _store(self, path: str, response: Response):
+        self._write(path, _dump_response(response))
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A reader never sees a partial file.
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class SqliteCacheStorage:
+    """
+    Responses of a spider in a single SQLite database, HTTPCACHE_DIR/<spider name>.sqlite.
+    The connection is used by one thread only, queries run one at a time in order.
+    A response is expired HTTPCACHE_EXPIRATION_SECS after it was stored.
+    """
+
+    def __init__(self, settings: Settings):
+        self.cache_dir: str = settings.get('HTTPCACHE_DIR')
+        self.expiration_secs: float = settings.get('HTTPCACHE_EXPIRATION_SECS')
+        self.db: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    async def open_spider(self, spider: 'BaseSpider'):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='httpcache')
+        await self._run(self._open, os.path.join(self.cache_dir, f'{spider.name}.sqlite'))
+
+    def _open(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses (fingerprint BLOB PRIMARY KEY, stored REAL, data BLOB)'
+        )
+        self.db.commit()
+
+    async def close_spider(self, spider: 'BaseSpider'):
+        await self._run(self.db.close)
+        self._executor.shutdown()
+
+    async def retrieve_response(self, spider: 'BaseSpider', request: Request) -> Optional[Response]:
+        data = await self._run(self._read, request_fingerprint(request))
+        return None if data is None else _load_response(data, request)
+
+    def _read(self, fingerprint: bytes) -> Optional[bytes]:
+        row = self.db.execute('SELECT stored, data FROM responses WHERE fingerprint = ?', (fingerprint,)).fetchone()
+        if row is None or (self.expiration_secs and time() - row[0] > self.expiration_secs):
+            return None
+        return row[1]
+
+    async def store_response(self, spider: 'BaseSpider', request: Request, response: Response):
+        await self._run(self._store, request_fingerprint(request), response)
+
+    def _store(self, fingerprint: bytes, response: Response):
+        self._write(fingerprint, _dump_response(response))
+
+    def _write(self, fingerprint: bytes, data: bytes):
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses (fingerprint, stored, data) VALUES (?, ?, ?)',
+                (fingerprint, time(), data),
+            )
@@ -0,0 +1,87 @@
+import logging
+import math
+from typing import TYPE_CHECKING, Optional
+from weakref import WeakKeyDictionary
+
+from aio_scrapy import signals
+from aio_scrapy.exceptions import NotConfigured
+from aio_scrapy.http import Response
+
+if TYPE_CHECKING:
+    from aio_scrapy.crawler import Crawler
+    from aio_scrapy.downloader import Slot
+    from aio_scrapy.spiders import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+
+class AutoThrottle:
+    """
+    Adapt delay and concurrency of each download slot to the latency of its host.
+
+    Latency of every response is folded into an exponentially weighted moving average of the slot.
+    Requests sent every `latency / AUTOTHROTTLE_TARGET_CONCURRENCY` seconds keep the target number of
+    requests in flight, so that is the new delay of the slot, bounded by DOWNLOAD_DELAY and
+    AUTOTHROTTLE_MAX_DELAY. Concurrency of the slot is the number of requests in flight at that pace.
+    Error responses never lower the average, they are often answered faster than real pages.
+    """
+
+    def __init__(self, crawler: 'Crawler'):
+        settings = crawler.settings
+        if not settings.get('AUTOTHROTTLE_ENABLED'):
+            raise NotConfigured
+        self.target_concurrency: float = settings.get('AUTOTHROTTLE_TARGET_CONCURRENCY')
+        if self.target_concurrency <= 0:
+            raise NotConfigured(f'AUTOTHROTTLE_TARGET_CONCURRENCY must be positive, got {self.target_concurrency}')
+        self.crawler = crawler
+        self.min_delay: float = settings.get('DOWNLOAD_DELAY')
+        self.max_delay: float = settings.get('AUTOTHROTTLE_MAX_DELAY')
+        self.start_delay: float = max(self.min_delay, settings.get('AUTOTHROTTLE_START_DELAY'))
+        self.max_concurrency: int = (
+            settings.get('CONCURRENT_REQUESTS_PER_IP') or settings.get('CONCURRENT_REQUESTS_PER_DOMAIN')
+        )
+        self.alpha: float = settings.get('AUTOTHROTTLE_EWMA_ALPHA')
+        self.debug: bool = settings.get('AUTOTHROTTLE_DEBUG')
+        # Average latency of slots, it goes away with a slot when the downloader collects it.
+        self.latency: 'WeakKeyDictionary[Slot, float]' = WeakKeyDictionary()
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+
+    @classmethod
+    def from_crawler(cls, crawler: 'Crawler'):
+        return cls(crawler)
+
+    async def spider_opened(self, spider: 'BaseSpider'):
+        # Slots start at AUTOTHROTTLE_START_DELAY until latency of their host is known.
+        self.crawler.engine.downloader.download_delay = self.start_delay
+
+    async def response_downloaded(self, response: Response, slot: 'Slot', latency: float):
+        self.adjust(slot, latency, response.status)
+
+    def adjust(self, slot: 'Slot', latency: float, status: Optional[int] = 200):
+        """
+        Fold `latency` into the average of `slot` and update its delay and concurrency.
+        :param slot:
+        :param latency: seconds from sending the request to reading the response body.
+        :param status:
+        :return:
+        """
+        average = self.latency.get(slot)
+        if average is None:
+            average = latency
+        elif status == 200 or latency > average:
+            average = self.alpha * latency + (1 - self.alpha) * average
+        self.latency[slot] = average
+
+        delay = min(max(average / self.target_concurrency, self.min_delay), self.max_delay)
+        in_flight = min(self.target_concurrency, average / delay) if delay else self.target_concurrency
+        concurrency = max(1, min(self.max_concurrency, math.ceil(in_flight)))
+
+        if self.debug:
+            logger.info(
+                f'slot latency: {average * 1000:.0f}ms, delay: {slot.delay * 1000:.0f}ms -> {delay * 1000:.0f}ms, '
+                f'concurrency: {slot.concurrency} -> {concurrency}, status: {status}'
+            )
+        slot.delay = delay
+        slot.concurrency = concurrency
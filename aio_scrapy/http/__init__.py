@@ -0,0 +1,4 @@
+from aio_scrapy.http.request import Request
+from aio_scrapy.http.response import Response
+
+__all__ = ['Request', 'Response']
@@ -0,0 +1,90 @@
+from typing import Any, Callable, Dict, Optional, Union
+
+from aiohttp.typedefs import StrOrURL
+from yarl import URL
+
+
+class Request:
+    """
+    A request to crawl.
+    `__slots__` keeps per-request memory small, a broad crawl can hold millions of them.
+    Url is parsed, and headers and meta are created, on first access only, so requests which just wait in
+    a queue stay cheap. Requests are compared and hashed by identity.
+
+    :param url:
+    :param callback: called with the response, `spider.parse` if None. A name of a spider method is also
+        accepted, which is how callbacks of requests restored from JOBDIR are kept.
+    :param method:
+    :param headers:
+    :param body: str is encoded as utf-8.
+    :param meta: any data to pass along with the request, e.g. from one callback to the next.
+    :param priority: higher is crawled earlier by PriorityScheduler.
+    :param dont_filter: not dropped by the dupe filter when seen before.
+    :param errback: called with the exception if download failed.
+    """
+
+    __slots__ = (
+        '_url', 'method', '_headers', 'body', '_meta', 'callback', 'errback', 'priority', 'dont_filter'
+    )
+
+    def __init__(
+            self,
+            url: StrOrURL,
+            callback: Optional[Union[Callable, str]] = None,
+            method: str = 'GET',
+            headers: Optional[Dict[str, str]] = None,
+            body: Optional[Union[bytes, str]] = None,
+            meta: Optional[Dict[str, Any]] = None,
+            priority: int = 0,
+            dont_filter: bool = False,
+            errback: Optional[Union[Callable, str]] = None
+    ):
+        self._url: Union[str, URL] = url
+        self.callback = callback
+        self.method = method.upper()
+        self._headers = headers
+        self.body: bytes = body.encode('utf-8') if isinstance(body, str) else (body or b'')
+        self._meta = meta
+        self.priority = priority
+        self.dont_filter = dont_filter
+        self.errback = errback
+
+    @property
+    def url(self) -> URL:
+        url = self._url
+        if not isinstance(url, URL):
+            url = self._url = URL(url)
+        return url
+
+    @url.setter
+    def url(self, url: StrOrURL):
+        self._url = url
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        if self._headers is None:
+            self._headers = {}
+        return self._headers
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        if self._meta is None:
+            self._meta = {}
+        return self._meta
+
+    def replace(self, **kwargs) -> 'Request':
+        """
+        Return a copy of the request with given arguments replaced, headers and meta are shared unless replaced.
+        :param kwargs: keyword arguments of Request.
+        :return:
+        """
+        for name in ('url', 'headers', 'meta'):
+            kwargs.setdefault(name, getattr(self, f'_{name}'))
+        for name in ('callback', 'method', 'body', 'priority', 'dont_filter', 'errback'):
+            kwargs.setdefault(name, getattr(self, name))
+        return type(self)(**kwargs)
+
+    def __str__(self):
+        return f'<{self.method} {self._url}>'
+
+    __repr__ = __str__
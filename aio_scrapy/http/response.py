@@ -0,0 +1,76 @@
+import codecs
+import json
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union
+
+from aiohttp.helpers import parse_mimetype
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+if TYPE_CHECKING:
+    from aio_scrapy.http.request import Request
+
+# Marks a lazy attribute which is not computed yet, None is a valid result of parsing json.
+_NOT_SET = object()
+
+
+class Response:
+    """
+    A downloaded response.
+    The downloader reads the whole body and releases the connection before the response is handed to
+    the spider, so a response which is never read does not hold a connection of the pool.
+    Text and json are decoded on first access and cached.
+    Body is bytes, or a memoryview of a temporary file mapped in memory if it was streamed to disk.
+    """
+
+    __slots__ = ('url', 'status', 'headers', 'body', 'request', '_encoding', '_text', '_json')
+
+    def __init__(
+            self,
+            url: Union[str, URL],
+            status: int = 200,
+            headers: Optional[Union[CIMultiDictProxy, dict]] = None,
+            body: Union[bytes, memoryview] = b'',
+            request: Optional['Request'] = None,
+            encoding: Optional[str] = None
+    ):
+        self.url: URL = url if isinstance(url, URL) else URL(url)
+        self.status = status
+        if not isinstance(headers, CIMultiDictProxy):
+            headers = CIMultiDictProxy(CIMultiDict(headers or {}))
+        self.headers: CIMultiDictProxy = headers
+        self.body = body
+        self.request = request
+        self._encoding = encoding
+        self._text: Optional[str] = None
+        self._json: Any = _NOT_SET
+
+    @property
+    def encoding(self) -> str:
+        """
+        Charset of Content-Type header, utf-8 if it is not declared or unknown.
+        :return:
+        """
+        if self._encoding is None:
+            content_type = self.headers.get('Content-Type')
+            charset = parse_mimetype(content_type).parameters.get('charset') if content_type else None
+            try:
+                self._encoding = codecs.lookup(charset).name if charset else 'utf-8'
+            except LookupError:
+                self._encoding = 'utf-8'
+        return self._encoding
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = str(self.body, self.encoding, errors='replace')
+        return self._text
+
+    def json(self, loads: Callable[[str], Any] = json.loads) -> Any:
+        if self._json is _NOT_SET:
+            self._json = loads(self.text)
+        return self._json
+
+    def __str__(self):
+        return f'<{self.status} {self.url}>'
+
+    __repr__ = __str__
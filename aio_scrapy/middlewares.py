@@ -4,6 +4,7 @@ import pprint
 from collections import defaultdict, deque
 from typing import TYPE_CHECKING, Any, List, Optional
 
+from aio_scrapy.exceptions import NotConfigured
 from aio_scrapy.settings import Settings
 from aio_scrapy.utils import create_instance, load_object, wrapper_run_function
 
@@ -34,7 +35,12 @@ class BaseMiddlewareManager:
         enabled = []
         for cls_path in mw_list:
             mw_cls = load_object(cls_path)
-            mw = create_instance(mw_cls, settings, crawler)
+            try:
+                mw = create_instance(mw_cls, settings, crawler)
+            except NotConfigured as e:
+                if e.args:
+                    logger.warning(f'Disabled {cls_path}: {e.args[0]}')
+                continue
             middlewares.append(mw)
             enabled.append(cls_path)
 
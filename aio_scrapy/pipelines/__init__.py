@@ -1,18 +1,164 @@
-from typing import TYPE_CHECKING, Dict, List
+import asyncio
+from asyncio import Future, Task
+from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Dict, List,
+                    Optional)
 
 from aio_scrapy.middlewares import BaseMiddlewareManager
+from aio_scrapy.settings import Settings
+from aio_scrapy.utils.conf import build_component_list
 
 if TYPE_CHECKING:
+    from aio_scrapy.crawler import Crawler
     from aio_scrapy.spiders import BaseSpider
 
 
+class ItemBatch:
+    """
+    Buffer of items for the `process_items` hook of a pipeline.
+    It is flushed when it holds `batch_size` items of its manager, `batch_timeout` seconds after its first item,
+    or when spider closes. Every item waits for its batch and gets its own result.
+    """
+
+    def __init__(
+            self,
+            process_items: Callable[[List[Dict], 'BaseSpider'], Awaitable[Optional[List[Any]]]],
+            manager: 'ItemPipelineManager'
+    ):
+        self.process_items = process_items
+        self.manager = manager
+        self.items: List[Dict] = []
+        self.futures: List[Future] = []
+        self._timer: Optional[Task] = None
+
+    async def add(self, item: Dict, spider: 'BaseSpider'):
+        """
+        Add item to the batch, and return its result when the batch is flushed.
+        :param item:
+        :param spider:
+        :return: the item returned by `process_items` for it.
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self.items.append(item)
+        self.futures.append(future)
+        self.manager.changed.set()
+        if len(self.items) >= self.manager.batch_size:
+            await self.flush(spider)
+        elif self._timer is None:
+            self._timer = loop.create_task(self._flush_later(spider))
+        return await future
+
+    async def _flush_later(self, spider: 'BaseSpider'):
+        await asyncio.sleep(self.manager.batch_timeout)
+        self._timer = None
+        await self.flush(spider)
+
+    async def flush(self, spider: 'BaseSpider'):
+        """
+        Call `process_items` with buffered items.
+        It returns a list of results in the order of items, an exception in the list, e.g. DropItem, is raised for
+        its item only. If it returns None, items pass unchanged, and if it raises, every item of the batch fails.
+        :param spider:
+        :return:
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.items:
+            return
+        items, futures = self.items, self.futures
+        self.items, self.futures = [], []
+        try:
+            results = await self.process_items(items, spider)
+        except Exception as e:
+            results = [e] * len(items)
+        if results is None:
+            results = items
+        elif len(results) != len(items):
+            error = ValueError(
+                f'{self.process_items.__qualname__} returned {len(results)} results of {len(items)} items'
+            )
+            results = [error] * len(items)
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
 class ItemPipelineManager(BaseMiddlewareManager):
+    """
+    Pass items through `process_item` of pipelines of ITEM_PIPELINES, in their order.
+
+    A pipeline with a `process_items(items, spider)` hook gets items in batches instead, see ItemBatch. Each item
+    still goes through the chain on its own and waits for its batch, so signals of items are sent as usual.
+    """
 
     component_name = 'item pipeline'
 
+    def __init__(self, *middlewares):
+        self.batches: List[ItemBatch] = []
+        self.batch_size: int = 1
+        self.batch_timeout: float = 0
+        # Items in the chain, and an event set when one enters a batch or leaves the chain.
+        self.in_chain: int = 0
+        self.changed = asyncio.Event()
+        super().__init__(*middlewares)
+
+    @classmethod
+    def from_settings(cls, settings: Settings, crawler: Optional['Crawler'] = None):
+        manager = super().from_settings(settings, crawler)
+        manager.batch_size = settings.get('ITEM_BATCH_SIZE')
+        manager.batch_timeout = settings.get('ITEM_BATCH_TIMEOUT')
+        return manager
+
     @classmethod
     def _get_mw_list_from_settings(cls, settings) -> List[str]:
-        return settings.get('ITEM_PIPELINES')
+        return build_component_list({}, settings.get('ITEM_PIPELINES'))
+
+    def _add_middleware(self, mw: Any):
+        super()._add_middleware(mw)
+        if hasattr(mw, 'process_items'):
+            batch = ItemBatch(mw.process_items, self)
+            self.batches.append(batch)
+            self.methods['process_item'].append(batch.add)
+        elif hasattr(mw, 'process_item'):
+            self.methods['process_item'].append(mw.process_item)
+
+    @property
+    def max_batched(self) -> int:
+        """
+        Items which may wait in a batch, scraper lets so many items in pipeline at once.
+        :return:
+        """
+        return self.batch_size if self.batches else 0
 
     async def process_item(self, item: Dict, spider: 'BaseSpider'):
-        return await self._process_chain('process_item', item, spider)
+        if not self.batches:
+            return await self._process_chain('process_item', item, spider)
+        self.in_chain += 1
+        try:
+            return await self._process_chain('process_item', item, spider)
+        finally:
+            self.in_chain -= 1
+            self.changed.set()
+
+    async def _settle(self):
+        """
+        Wait until every item in the chain waits in a batch or left the chain.
+        :return:
+        """
+        while self.in_chain > sum(len(batch.items) for batch in self.batches):
+            self.changed.clear()
+            await self.changed.wait()
+
+    async def close_spider(self, spider: 'BaseSpider'):
+        # Batches are flushed in order of the chain, items of a batch reach the next one through any async
+        # pipelines in between before it is flushed.
+        for batch in self.batches:
+            await self._settle()
+            await batch.flush(spider)
+        await self._settle()
+        return await super().close_spider(spider)
@@ -8,18 +8,22 @@ if TYPE_CHECKING:
 
 
 class BasePipeline:
+    """
+    Base of item pipelines. Instead of `process_item`, a pipeline can define `async process_items(items, spider)`
+    to get items in batches of ITEM_BATCH_SIZE, see `aio_scrapy.pipelines.ItemBatch`.
+    """
 
     @classmethod
     def from_settings(
             cls,
             settings: Settings,
-            crawler: Optional[Crawler] = None
+            crawler: Optional['Crawler'] = None
     ) -> Optional['BasePipeline']:
-        pass
+        return cls()
 
     @classmethod
     def from_crawler(cls, crawler: 'Crawler') -> Optional['BasePipeline']:
-        pass
+        return cls.from_settings(crawler.settings, crawler)
 
     async def process_item(self, item: Dict, spider: 'Spider'):
         raise NotImplementedError
@@ -0,0 +1,353 @@
+"""
+Run CPU bound callbacks in a pool of processes, so parsing is not serialized by the GIL and does not stall the loop.
+
+Decorate a sync callback or generator of the spider with `in_process_pool`. Body of the response is handed over in
+shared memory instead of being pickled, and outputs of the callback stream back to the scraper as they are yielded.
+"""
+import asyncio
+import inspect
+import itertools
+import logging
+import multiprocessing
+import pickle
+import threading
+from concurrent.futures import Future as ConcurrentFuture
+from concurrent.futures import ProcessPoolExecutor
+from typing import (TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List,
+                    Optional, Tuple, Union)
+
+from aio_scrapy.http import Request, Response
+from aio_scrapy.utils import run_in_thread_pool
+from aio_scrapy.utils.reqser import request_from_bytes, request_to_bytes
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover, python < 3.8
+    shared_memory = None
+
+if TYPE_CHECKING:
+    from multiprocessing.context import BaseContext
+
+    from aio_scrapy.crawler import Crawler
+    from aio_scrapy.spiders import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+# Messages from workers are (task id, worker index, kind, value).
+_REQUEST = 'request'
+_VALUE = 'value'
+_ERROR = 'error'
+_DONE = 'done'
+
+# Spider, queue of outputs, credits and index of a worker process, set by its initializer.
+_worker_spider: Optional['BaseSpider'] = None
+_worker_queue = None
+_worker_credits: Optional['_Credits'] = None
+_worker_index: int = 0
+
+
+def in_process_pool(func: Callable) -> Callable:
+    """
+    Mark a sync callback, or a sync generator callback, to run in the process pool of the scraper.
+    It runs on a copy of the spider made when the pool starts, of its class, which must be importable, and of its
+    attributes which can be pickled. Attributes it sets are not seen by the crawler.
+    Requests it yields must have no callback, or a method of the spider as callback.
+    :param func:
+    :return:
+    """
+    if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+        raise TypeError(f'{func.__qualname__} is async, only sync callbacks can run in process pool')
+    func.in_process_pool = True
+    return func
+
+
+def _spider_state(spider: 'BaseSpider') -> Dict[str, Any]:
+    """
+    Attributes of the spider which can be pickled, besides its crawler.
+    :param spider:
+    :return:
+    """
+    state = {}
+    for name, value in vars(spider).items():
+        if name == 'crawler':
+            continue
+        try:
+            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            logger.debug(f'{spider} attribute {name} can not be pickled, workers of process pool do not get it')
+            continue
+        state[name] = value
+    return state
+
+
+class _Credits:
+    """
+    Outputs taken by the scraper of the task each worker runs, in memory shared by the crawler and the workers.
+    A worker blocks while `buffer` outputs of its task are not taken, so a callback is only slowed down by its
+    own consumer. A worker runs a task at a time, the state of a worker is the state of its task.
+    """
+
+    def __init__(self, ctx: 'BaseContext', workers: int, buffer: int):
+        self.buffer = buffer
+        self.lock = ctx.Lock()
+        self.counter = ctx.Value('i', 0, lock=False)
+        self.tasks = ctx.Array('q', workers, lock=False)
+        self.taken = ctx.Array('q', workers, lock=False)
+        self.waiting = ctx.Array('b', workers, lock=False)
+        self.wakeups = [ctx.Semaphore(0) for _ in range(workers)]
+
+    def register(self) -> int:
+        """
+        Called by a worker when it starts.
+        :return: index of the worker.
+        """
+        with self.lock:
+            index = self.counter.value
+            self.counter.value += 1
+        return index
+
+    def start(self, index: int, task_id: int):
+        with self.lock:
+            self.tasks[index] = task_id
+            self.taken[index] = 0
+
+    def wait(self, index: int, sent: int):
+        """
+        Block the worker until fewer than `buffer` of the `sent` outputs of its task are not taken.
+        :param index:
+        :param sent:
+        :return:
+        """
+        while True:
+            with self.lock:
+                if sent - self.taken[index] < self.buffer:
+                    return
+                self.waiting[index] = 1
+            self.wakeups[index].acquire()
+
+    def take(self, index: int, task_id: int):
+        """
+        Called by the crawler for an output taken or dropped, an output of a task already done is ignored.
+        :param index:
+        :param task_id:
+        :return:
+        """
+        with self.lock:
+            if self.tasks[index] != task_id:
+                return
+            self.taken[index] += 1
+            if self.waiting[index]:
+                self.waiting[index] = 0
+                self.wakeups[index].release()
+
+
+def _init_worker(spider_cls: type, state: Dict[str, Any], queue, credits: _Credits):
+    global _worker_spider, _worker_queue, _worker_credits, _worker_index
+    _worker_spider = spider_cls.__new__(spider_cls)
+    _worker_spider.__dict__.update(state)
+    _worker_queue = queue
+    _worker_credits = credits
+    _worker_index = credits.register()
+
+
+def _put_error(task_id: int, error: Exception):
+    try:
+        _worker_queue.put((task_id, _worker_index, _ERROR, error))
+    except Exception:
+        # Exception can not be pickled.
+        _worker_queue.put((task_id, _worker_index, _ERROR, RuntimeError(repr(error))))
+
+
+def _parse_in_worker(
+        task_id: int,
+        callback: Union[str, Callable],
+        body: Union[str, bytes],
+        size: int,
+        url: str,
+        status: int,
+        headers: List[Tuple[str, str]],
+        request_data: bytes
+) -> None:
+    """
+    Call the callback in a worker process and put its outputs in the queue one by one.
+    :param task_id:
+    :param callback: name of a spider method, or a function.
+    :param body: name of the shared memory holding the body, or the body itself.
+    :param size: length of the body.
+    :param url:
+    :param status:
+    :param headers:
+    :param request_data: request serialized by `request_to_bytes`.
+    :return:
+    """
+    _worker_credits.start(_worker_index, task_id)
+    memory = None
+    if isinstance(body, str):
+        memory = shared_memory.SharedMemory(body)
+        # Shared memory is page aligned, it may be longer than the body.
+        body = memory.buf[:size]
+    try:
+        if isinstance(callback, str):
+            callback = getattr(_worker_spider, callback)
+        response = Response(url, status, headers, body, request_from_bytes(request_data))
+        output = callback(response)
+        if output is None or isinstance(output, (dict, Request)):
+            output = (output,)
+        sent = 0
+        for value in output:
+            if isinstance(value, Request):
+                message = (task_id, _worker_index, _REQUEST, request_to_bytes(value))
+            elif value is not None:
+                message = (task_id, _worker_index, _VALUE, value)
+            else:
+                continue
+            _worker_credits.wait(_worker_index, sent)
+            _worker_queue.put(message)
+            sent += 1
+    except Exception as e:
+        _put_error(task_id, e)
+    finally:
+        if memory is not None:
+            try:
+                body.release()
+                memory.close()
+            except BufferError:
+                # Outputs still refer to the body, the memory is unmapped when they are collected.
+                pass
+    _worker_queue.put((task_id, _worker_index, _DONE, None))
+
+
+class ProcessPool:
+    """
+    Pool of PROCESS_POOL_WORKERS processes, started on first use, running callbacks marked by `in_process_pool`.
+    Workers are started by a fork server, or spawned where there is none, never forked from the crawler, whose
+    threads may hold locks a forked child would inherit held.
+
+    Outputs come back through a pipe read by a thread of the crawler, which hands them to a queue per callback
+    on the loop without ever waiting. A worker blocks while PROCESS_POOL_BUFFER outputs of its callback are not
+    taken by the scraper, so a callback yielding faster than the scraper consumes is slowed down, and a slow
+    consumer does not hold up outputs of other callbacks.
+    """
+
+    def __init__(self, crawler: 'Crawler', spider: 'BaseSpider'):
+        self.crawler = crawler
+        self.spider = spider
+        self.workers: int = crawler.settings.get('PROCESS_POOL_WORKERS') or multiprocessing.cpu_count()
+        self.buffer: int = crawler.settings.get('PROCESS_POOL_BUFFER')
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.queue = None
+        self.credits: Optional[_Credits] = None
+        self.reader: Optional[threading.Thread] = None
+        # Outputs of each callback in progress by task id.
+        self.streams: Dict[int, asyncio.Queue] = {}
+        self._ids = itertools.count()
+
+    def _start(self):
+        try:
+            pickle.dumps(type(self.spider))
+        except Exception:
+            raise TypeError(f'{type(self.spider).__qualname__} must be importable to run callbacks in process pool')
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        ctx = multiprocessing.get_context(method)
+        self.queue = ctx.SimpleQueue()
+        self.credits = _Credits(ctx, self.workers, self.buffer)
+        self.executor = ProcessPoolExecutor(
+            self.workers, mp_context=ctx, initializer=_init_worker,
+            initargs=(type(self.spider), _spider_state(self.spider), self.queue, self.credits)
+        )
+        self.reader = threading.Thread(target=self._read, name='aio_scrapy-process-pool', daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        loop = self.crawler.loop
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+            loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: Tuple[int, Optional[int], str, Any]):
+        stream = self.streams.get(message[0])
+        if stream is not None:
+            stream.put_nowait(message)
+        else:
+            # Outputs of a callback whose consumer is gone are dropped, they do not hold up its worker.
+            self._take(message)
+
+    def _take(self, message: Tuple[int, Optional[int], str, Any]):
+        task_id, index, kind, _ = message
+        if index is not None and (kind == _REQUEST or kind == _VALUE):
+            self.credits.take(index, task_id)
+
+    def _callback_ref(self, callback: Callable) -> Union[str, Callable]:
+        if inspect.ismethod(callback) and callback.__self__ is self.spider:
+            return callback.__name__
+        return callback
+
+    def _request_data(self, request: Request) -> bytes:
+        try:
+            return request_to_bytes(request)
+        except ValueError:
+            # A callback which is not a spider method, the worker does not call it anyway.
+            return request_to_bytes(request.replace(callback=None, errback=None))
+
+    async def parse(self, callback: Callable, response: Response) -> AsyncIterator[Union[Request, Any]]:
+        """
+        Call the callback with the response in a worker process, and yield its outputs as they come.
+        An exception of the callback is raised after the outputs yielded before it.
+        :param callback:
+        :param response:
+        :return:
+        """
+        if self.executor is None:
+            self._start()
+        self.crawler.stats.inc_value('process_pool/response_count')
+        task_id = next(self._ids)
+        # Workers keep it at most PROCESS_POOL_BUFFER long.
+        stream = self.streams[task_id] = asyncio.Queue()
+        memory = None
+        body = response.body
+        size = len(body)
+        if shared_memory is not None and size:
+            memory = shared_memory.SharedMemory(create=True, size=size)
+            memory.buf[:size] = body
+            body = memory.name
+        try:
+            future = self.executor.submit(
+                _parse_in_worker, task_id, self._callback_ref(callback), body, size, str(response.url),
+                response.status, list(response.headers.items()), self._request_data(response.request)
+            )
+
+            def _failed(_future: ConcurrentFuture):
+                # The worker died, it will never send the end of outputs.
+                if not _future.cancelled() and _future.exception() is not None:
+                    loop = self.crawler.loop
+                    loop.call_soon_threadsafe(self._dispatch, (task_id, None, _ERROR, _future.exception()))
+                    loop.call_soon_threadsafe(self._dispatch, (task_id, None, _DONE, None))
+
+            future.add_done_callback(_failed)
+            while True:
+                message = await stream.get()
+                self._take(message)
+                _, _, kind, value = message
+                if kind == _DONE:
+                    return
+                if kind == _ERROR:
+                    raise value
+                yield request_from_bytes(value) if kind == _REQUEST else value
+        finally:
+            del self.streams[task_id]
+            # Let the worker go on if it waits for room.
+            while not stream.empty():
+                self._take(stream.get_nowait())
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+
+    async def close(self):
+        if self.executor is None:
+            return
+        await run_in_thread_pool(self.executor.shutdown)
+        self.queue.put(None)
+        await run_in_thread_pool(self.reader.join)
+        self.executor = None
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import socket
+from asyncio import Future
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.helpers import is_ip_address
+
+from aio_scrapy.settings import Settings
+from aio_scrapy.utils import load_object
+
+logger = logging.getLogger(__name__)
+
+_Key = Tuple[str, int, int]
+
+
+def _retrieve_exception(future: Future):
+    # A failed lookup nobody waits for any more, e.g. a prefetch, must not be logged as never retrieved.
+    if not future.cancelled():
+        future.exception()
+
+
+class CachingResolver(AbstractResolver):
+    """
+    Cache results of another resolver for `ttl` seconds, at most `size` of them, least recently used are
+    dropped first. Concurrent lookups of a host share a single lookup of the wrapped resolver.
+    The system resolver does not tell TTLs of records, so every result is kept `ttl` seconds.
+
+    A resolver can be shared by crawlers, e.g. all crawlers of a CrawlerRunner, so a host is looked up
+    once for all of them.
+
+    :param resolver: the resolver doing lookups, e.g. aiohttp ThreadedResolver or AsyncResolver.
+    :param size:
+    :param ttl:
+    """
+
+    def __init__(self, resolver: AbstractResolver, size: int = 10000, ttl: float = 300):
+        self.resolver = resolver
+        self.size = size
+        self.ttl = ttl
+        self.cache: 'OrderedDict[_Key, Tuple[float, List[dict]]]' = OrderedDict()
+        self.pending: Dict[_Key, Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> 'CachingResolver':
+        return cls(
+            load_object(settings.get('DNS_RESOLVER'))(),
+            settings.get('DNSCACHE_SIZE'),
+            settings.get('DNSCACHE_TTL'),
+        )
+
+    def cached(self, host: str, port: int = 0, family: int = socket.AF_INET) -> Optional[List[dict]]:
+        """
+        Result of a lookup if it is cached and not expired.
+        :param host:
+        :param port:
+        :param family:
+        :return:
+        """
+        key = (host, port, family)
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires < monotonic():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return result
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[dict]:
+        result = self.cached(host, port, family)
+        if result is not None:
+            self.hits += 1
+            # The caller may change the list.
+            return list(result)
+        future = self._lookup(host, port, family)
+        # A caller giving up does not cancel the lookup others wait for.
+        return list(await asyncio.shield(future))
+
+    def prefetch(self, host: str, port: int = 0, family: int = socket.AF_INET) -> None:
+        """
+        Start looking up host in the background unless it is cached already.
+        :param host:
+        :param port:
+        :param family:
+        :return:
+        """
+        if not host or is_ip_address(host) or self.cached(host, port, family) is not None:
+            return
+        self._lookup(host, port, family)
+
+    def _lookup(self, host: str, port: int, family: int) -> Future:
+        key = (host, port, family)
+        future = self.pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = self.pending[key] = asyncio.ensure_future(self._resolve(key))
+            future.add_done_callback(_retrieve_exception)
+        return future
+
+    async def _resolve(self, key: _Key) -> List[dict]:
+        try:
+            result = await self.resolver.resolve(*key)
+        finally:
+            self.pending.pop(key, None)
+        self.cache[key] = (monotonic() + self.ttl, result)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+        return result
+
+    async def close(self) -> None:
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.cache.clear()
+        await self.resolver.close()
@@ -1,9 +1,34 @@
+import heapq
+import itertools
+import logging
+import mmap
+import os
+import shutil
+import tempfile
 from collections import deque
-from typing import TYPE_CHECKING
+from typing import (TYPE_CHECKING, BinaryIO, Collection, Deque, List, Optional,
+                    Tuple)
+
+from aio_scrapy.http import Request
+from aio_scrapy.utils import run_in_thread_pool
+from aio_scrapy.utils.job import (job_dir, read_pickle, read_requests,
+                                  write_pickle, write_requests)
+from aio_scrapy.utils.reqser import records_to_requests, requests_to_records
 
 if TYPE_CHECKING:
     from aio_scrapy.crawler import Crawler
     from aio_scrapy.spiders import BaseSpider
+    from aio_scrapy.statscollectors import StatsCollector
+
+logger = logging.getLogger(__name__)
+
+
+def _log_unpersisted(unserializable: List[Request]):
+    if unserializable:
+        logger.warning(
+            f'{len(unserializable)} pending requests can not be serialized, they are not persisted, '
+            f'e.g. {unserializable[0]}'
+        )
 
 
 class BaseScheduler:
@@ -27,17 +52,37 @@ class BaseScheduler:
     def next_request(self):
         raise NotImplementedError
 
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    async def checkpoint(self):
+        """
+        Persist pending requests while crawling, so a crawl can resume from it after a crash.
+        Schedulers which can not persist their queue keep this no-op.
+        :return:
+        """
+
 
 class SimpleScheduler(BaseScheduler):
+    """
+    FIFO scheduler in memory.
+    If JOBDIR is set, pending requests are written to `JOBDIR/requests.queue` on close and every
+    checkpoint, and restored on open.
+    """
 
-    def __init__(self):
+    def __init__(self, jobdir: Optional[str] = None):
         self.queue_cls = deque
 
         self.queue = self.queue_cls()
+        self.jobdir = jobdir
 
     @classmethod
     def from_crawler(cls, crawler: 'Crawler', *args, **kwargs):
-        return cls()
+        return cls(job_dir(crawler.settings))
+
+    @property
+    def requests_path(self) -> str:
+        return os.path.join(self.jobdir, 'requests.queue')
 
     def enqueue_request(self, request):
         self.queue.append(request)
@@ -45,6 +90,9 @@ class SimpleScheduler(BaseScheduler):
     def has_pending_requests(self):
         return len(self.queue) > 0
 
+    def __len__(self) -> int:
+        return len(self.queue)
+
     def next_request(self):
         if self.queue:
             return self.queue.popleft()
@@ -52,7 +100,326 @@ class SimpleScheduler(BaseScheduler):
             return None
 
     async def open(self, spider: 'BaseSpider'):
-        pass
+        if self.jobdir:
+            requests = await run_in_thread_pool(read_requests, self.requests_path)
+            self.queue.extend(requests)
+            if requests:
+                logger.info(f'Resuming crawl ({len(requests)} requests scheduled) from {self.jobdir}')
+
+    async def close(self, reason):
+        await self.checkpoint()
+
+    async def checkpoint(self):
+        if self.jobdir:
+            # Copy on loop is a fast memcpy of references, serializing and writing run in thread pool.
+            unserializable = await run_in_thread_pool(write_requests, self.requests_path, list(self.queue))
+            _log_unpersisted(unserializable)
+
+
+class PriorityScheduler(BaseScheduler):
+    """
+    Requests with higher `Request.priority` are dequeued first, requests with the same priority
+    keep FIFO order. Both enqueue and dequeue are O(log n) on a binary heap.
+    """
+
+    def __init__(self, jobdir: Optional[str] = None):
+        self.queue: List[Tuple[int, int, Request]] = []
+        # Monotonic sequence as the second key, so equal priorities never compare requests
+        # and are popped in insertion order.
+        self._counter = itertools.count()
+        self.jobdir = jobdir
+
+    @classmethod
+    def from_crawler(cls, crawler: 'Crawler', *args, **kwargs):
+        return cls(job_dir(crawler.settings))
+
+    @property
+    def requests_path(self) -> str:
+        return os.path.join(self.jobdir, 'requests.queue')
+
+    def enqueue_request(self, request: Request):
+        heapq.heappush(self.queue, (-request.priority, next(self._counter), request))
+
+    def has_pending_requests(self):
+        return len(self.queue) > 0
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def next_request(self) -> Optional[Request]:
+        if self.queue:
+            return heapq.heappop(self.queue)[2]
+        else:
+            return None
+
+    async def open(self, spider: 'BaseSpider'):
+        if self.jobdir:
+            requests = await run_in_thread_pool(read_requests, self.requests_path)
+            # Requests are persisted in dequeue order, a sorted list is already a valid heap.
+            self.queue = [(-request.priority, next(self._counter), request) for request in requests]
+            if requests:
+                logger.info(f'Resuming crawl ({len(requests)} requests scheduled) from {self.jobdir}')
+
+    async def close(self, reason):
+        await self.checkpoint()
+
+    async def checkpoint(self):
+        if self.jobdir:
+            _log_unpersisted(await run_in_thread_pool(self._write_sorted, list(self.queue)))
+
+    def _write_sorted(self, items: List[Tuple[int, int, Request]]) -> List[Request]:
+        items.sort()
+        return write_requests(self.requests_path, (request for _, _, request in items))
+
+
+class _Segment:
+    """
+    An append-only file of length prefixed request records.
+    """
+
+    def __init__(self, path: str, size: int = 0, count: int = 0, read_offset: int = 0):
+        self.path = path
+        # Restored segments are only read, a new segment is created for writing.
+        self.file: Optional[BinaryIO] = None if size else open(path, 'wb')
+        self.size = size
+        self.count = count
+        self.read_offset = read_offset
+
+    def write(self, requests: Collection[Request]) -> List[Request]:
+        """
+        :param requests:
+        :return: requests which can not be serialized, they are not written.
+        """
+        unserializable: List[Request] = []
+        data = requests_to_records(requests, unserializable)
+        self.file.write(data)
+        self.size += len(data)
+        self.count += len(requests) - len(unserializable)
+        return unserializable
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def close_writer(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def read(self, max_count: int) -> List[Request]:
+        """
+        Read up to `max_count` records from the last read offset by memory-mapped I/O.
+        :param max_count:
+        :return:
+        """
+        self.flush()
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                requests, self.read_offset = records_to_requests(view, self.read_offset, self.size, max_count)
+            finally:
+                view.release()
+        self.count -= len(requests)
+        return requests
+
+    def exhausted(self) -> bool:
+        return self.read_offset >= self.size
+
+    def remove(self):
+        self.close_writer()
+        os.remove(self.path)
+
+
+class DiskQueueScheduler(BaseScheduler):
+    """
+    FIFO scheduler for frontiers larger than memory, `Request.priority` is not used.
+    Only a head and a tail of at most SCHEDULER_DISK_MEMORY_SIZE requests stay in memory,
+    requests in between are spilled to append-only segment files and read back through mmap,
+    so memory is bounded no matter how big the queue gets.
+
+    A request which can not be serialized, e.g. with a lambda as callback, stays in memory, it is added to
+    the head and counted in `scheduler/unserializable`.
+
+    If JOBDIR is set, segments are kept in `JOBDIR/requests.queue` unless SCHEDULER_DISK_PATH is set,
+    and the queue is persisted: head, tail and the index of segments are written to `queue.state`.
+    A segment read out is removed after the next checkpoint, which no longer refers to it.
+    """
+
+    def __init__(
+            self,
+            path: Optional[str] = None,
+            memory_size: int = 10000,
+            segment_bytes: int = 64 * 1024 * 1024,
+            persist: bool = False,
+            stats: Optional['StatsCollector'] = None
+    ):
+        self.path = path
+        self.memory_size = memory_size
+        self.segment_bytes = segment_bytes
+        self.persist = persist
+        self.stats = stats
+
+        self.head: Deque[Request] = deque()
+        self.tail: Deque[Request] = deque()
+        self.segments: Deque[_Segment] = deque()
+        # Segments read out since the last checkpoint, which still refers to them.
+        self._consumed: List[_Segment] = []
+        self._segment_ids = itertools.count()
+        self._remove_path = False
+
+    @classmethod
+    def from_crawler(cls, crawler: 'Crawler', *args, **kwargs):
+        settings = crawler.settings
+        jobdir = job_dir(settings)
+        path = settings.get('SCHEDULER_DISK_PATH')
+        if path is None and jobdir:
+            path = os.path.join(jobdir, 'requests.queue')
+        return cls(
+            path=path,
+            memory_size=settings.get('SCHEDULER_DISK_MEMORY_SIZE'),
+            segment_bytes=settings.get('SCHEDULER_DISK_SEGMENT_BYTES'),
+            persist=bool(jobdir),
+            stats=crawler.stats,
+        )
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.path, 'queue.state')
+
+    def _ensure_path(self):
+        if self.path is None:
+            self.path = tempfile.mkdtemp(prefix='aio_scrapy-queue-')
+            self._remove_path = True
+        else:
+            os.makedirs(self.path, exist_ok=True)
+
+    def _spilled(self) -> int:
+        return sum(segment.count for segment in self.segments)
+
+    def enqueue_request(self, request: Request):
+        if not self.segments and not self.tail and len(self.head) < self.memory_size:
+            self.head.append(request)
+            return
+        self.tail.append(request)
+        if len(self.tail) >= self.memory_size:
+            self._spill_tail()
+
+    def _spill_tail(self):
+        if not self.segments or self.segments[-1].file is None or self.segments[-1].size >= self.segment_bytes:
+            if self.segments:
+                self.segments[-1].close_writer()
+            self._ensure_path()
+            path = os.path.join(self.path, f'{next(self._segment_ids):08d}.seg')
+            self.segments.append(_Segment(path))
+        unserializable = self.segments[-1].write(self.tail)
+        self.tail.clear()
+        if unserializable:
+            # Dequeued before spilled requests, like by the memory queue Scrapy falls back to.
+            self.head.extend(unserializable)
+            if self.stats is not None:
+                self.stats.inc_value('scheduler/unserializable', len(unserializable))
+            logger.warning(
+                f'{len(unserializable)} requests can not be serialized, they are kept in memory, '
+                f'e.g. {unserializable[0]}'
+            )
+
+    def _refill_head(self):
+        while self.segments:
+            segment = self.segments[0]
+            requests = segment.read(self.memory_size)
+            if segment.exhausted():
+                self.segments.popleft()
+                if self.persist:
+                    segment.close_writer()
+                    self._consumed.append(segment)
+                else:
+                    segment.remove()
+            if requests:
+                self.head.extend(requests)
+                return
+        self.head, self.tail = self.tail, self.head
+
+    def has_pending_requests(self):
+        return len(self) > 0
+
+    def __len__(self) -> int:
+        return len(self.head) + self._spilled() + len(self.tail)
+
+    def next_request(self) -> Optional[Request]:
+        if not self.head:
+            self._refill_head()
+        if self.head:
+            return self.head.popleft()
+        return None
+
+    async def open(self, spider: 'BaseSpider'):
+        if not self.persist:
+            return
+        self._ensure_path()
+        state = await run_in_thread_pool(read_pickle, self.state_path)
+        known = set()
+        if state:
+            for name, size, count, read_offset in state['segments']:
+                path = os.path.join(self.path, name)
+                if not os.path.exists(path):
+                    logger.warning(f'Segment {path} of the queue is missing, {count} requests are lost')
+                    continue
+                # Requests read after the checkpoint are read again, they were not in its head.
+                self.segments.append(_Segment(path, size, count, read_offset))
+                known.add(name)
+            self.head.extend(records_to_requests(state['head'])[0])
+            self.tail.extend(records_to_requests(state['tail'])[0])
+            self._segment_ids = itertools.count(state['next_segment_id'])
+            logger.info(f'Resuming crawl ({len(self)} requests scheduled) from {self.path}')
+        # Segments created after the last checkpoint hold requests which are also in the restored tail.
+        for name in os.listdir(self.path):
+            if name.endswith('.seg') and name not in known:
+                os.remove(os.path.join(self.path, name))
+
+    async def checkpoint(self):
+        if not self.persist:
+            return
+        self._ensure_path()
+        for segment in self.segments:
+            segment.flush()
+        segments = [
+            (os.path.basename(segment.path), segment.size, segment.count, segment.read_offset)
+            for segment in self.segments
+        ]
+        # Segment ids are never reused, a new segment can not overwrite one referenced by the state.
+        next_segment_id = next(self._segment_ids)
+        self._segment_ids = itertools.count(next_segment_id + 1)
+        head, tail = list(self.head), list(self.tail)
+        consumed, self._consumed = self._consumed, []
+
+        def _write() -> List[Request]:
+            unserializable: List[Request] = []
+            write_pickle(self.state_path, {
+                'segments': segments,
+                'head': requests_to_records(head, unserializable),
+                'tail': requests_to_records(tail, unserializable),
+                'next_segment_id': next_segment_id + 1,
+            })
+            return unserializable
+
+        _log_unpersisted(await run_in_thread_pool(_write))
+        for segment in consumed:
+            segment.remove()
 
     async def close(self, reason):
-        pass
+        if self.persist:
+            await self.checkpoint()
+            for segment in self.segments:
+                segment.close_writer()
+            return
+        pending = len(self)
+        if pending:
+            logger.info(f'Drop {pending} pending requests in disk queue, reason: {reason}')
+        for segment in self.segments:
+            segment.remove()
+        self.segments.clear()
+        self.head.clear()
+        self.tail.clear()
+        if self._remove_path and self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
@@ -1,12 +1,19 @@
 import asyncio
+import inspect
 import logging
+from asyncio import Future
 from collections import deque
-from typing import TYPE_CHECKING, Awaitable, Deque, Type
+from types import GeneratorType
+from typing import (TYPE_CHECKING, Any, Awaitable, Deque, Optional, Set, Type,
+                    Union)
 
 from aio_scrapy import signals
 from aio_scrapy.exceptions import DropItem
+from aio_scrapy.http import Request, Response
 from aio_scrapy.pipelines import ItemPipelineManager
-from aio_scrapy.utils import load_object, wrapper_run_function
+from aio_scrapy.processpool import ProcessPool
+from aio_scrapy.utils import (as_async_generator, iterate_in_thread_pool,
+                              load_object, wrapper_run_function)
 
 if TYPE_CHECKING:
     from aio_scrapy.crawler import Crawler
@@ -14,6 +21,21 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# A response counts as at least this size in SCRAPER_SLOT_MAX_ACTIVE_SIZE, so tiny ones and failures are limited too.
+MIN_RESPONSE_SIZE = 1024
+
+
+def _response_size(response: Union[Response, Exception]) -> int:
+    """
+    Size a response counts in SCRAPER_SLOT_MAX_ACTIVE_SIZE. A body streamed to a file counts its whole length too,
+    it is mapped in memory and paged in as soon as a callback reads `text` or `body`.
+    :param response:
+    :return:
+    """
+    if not isinstance(response, Response):
+        return MIN_RESPONSE_SIZE
+    return max(len(response.body), MIN_RESPONSE_SIZE)
+
 
 class Scraper:
 
@@ -24,69 +46,168 @@ class Scraper:
         self.max_size: int = crawler.settings.get('CONCURRENT_ITEMS')
         self.active: int = 0
         self.queue: Deque = deque()
+        # Bytes of bodies of queued and active responses.
+        self.active_size: int = 0
+        self.max_active_size: int = crawler.settings.get('SCRAPER_SLOT_MAX_ACTIVE_SIZE')
+        # Items in pipeline, of all responses. A batch of pipeline must be able to fill up.
+        self.items_slots = asyncio.Semaphore(max(self.max_size, self.item_processor.max_batched))
+        # Runs callbacks marked by `in_process_pool`, started on first use.
+        self.process_pool: Optional[ProcessPool] = None
 
     async def open_spider(self, spider: 'BaseSpider'):
         await self.item_processor.open_spider(spider)
 
     async def close_spider(self, spider: 'BaseSpider'):
+        if self.process_pool is not None:
+            await self.process_pool.close()
+            self.process_pool = None
         await self.item_processor.close_spider(spider)
 
     def should_revocation(self):
-        return self.active >= self.max_size
+        return self.active >= self.max_size or self.active_size > self.max_active_size
 
     def is_idle(self):
-        return not self.queue
+        return not self.queue and not self.active
 
-    def enqueue_scrape(self, request, response, spider: 'BaseSpider') -> Awaitable:
+    def enqueue_scrape(self, request: Request, response: Union[Response, Exception], spider: 'BaseSpider') -> Awaitable:
         """
         Enqueue request, background process queue. Increase active during process a request and decrease
         active count when processed.
+        Size of the body in memory counts in `active_size` until the response is processed, engine stops
+        downloading while it exceeds SCRAPER_SLOT_MAX_ACTIVE_SIZE.
         Return a future object immediately, and future is done when a request processed.
         :param request:
-        :param response:
+        :param response: the response, or the exception if download failed.
         :param spider:
         :return:
         """
         future = self.crawler.loop.create_future()
+        size = _response_size(response)
 
-        # Decrease active count when future is done.
+        # Decrease active count and size when future is done.
         def _deactivate(x):
             self.active -= 1
+            self.active_size -= size
+            self.crawler.stats.set_value('scraper/active_size', self.active_size)
+            self.crawler.engine.wakeup()
 
         future.add_done_callback(_deactivate)
+        stats = self.crawler.stats
+        if self.active_size <= self.max_active_size < self.active_size + size:
+            stats.inc_value('scraper/backpressure_count')
+        self.active_size += size
         self.queue.append((request, response, future))
+        # Current values, and their peaks.
+        stats.set_value('scraper/active_size', self.active_size)
+        stats.set_value('scraper/queue_depth', len(self.queue))
+        stats.max_value('scraper/max_active_size', self.active_size)
+        stats.max_value('scraper/max_queue_depth', len(self.queue))
         self.crawler.loop.create_task(self._scrap_from_queue(spider))
         return future
 
     async def _scrap_from_queue(self, spider):
         while self.queue:
             request, response, future = self.queue.popleft()
+            self.crawler.stats.set_value('scraper/queue_depth', len(self.queue))
             # Increase active count when process item.
             self.active += 1
-            parse = getattr(spider, 'parse')
-            if parse:
-                if asyncio.iscoroutinefunction(parse):
-                    item = await parse(response)
-
-                else:
-                    item = await wrapper_run_function(parse, response)
-                result = await self.handle_spider_output(item, request, response, spider)
-
-                future.set_result(result)
-
-    async def handle_spider_output(self, output, request, response, spider: 'BaseSpider'):
-        if isinstance(output, dict):
             try:
-                result = await self.item_processor.process_item(output, spider)
+                output = await self.call_spider(request, response, spider)
+                await self.handle_spider_output(output, request, response, spider)
             except Exception as e:
-                result = e
-            await self._item_process_finished(result, output, response, spider)
+                logger.error(f'Spider error processing {request}', exc_info=True)
+                self.crawler.stats.inc_value(f'spider_exceptions/{type(e).__name__}')
+                await self.crawler.signals.send(
+                    signal=signals.spider_error,
+                    failure=e,
+                    response=response,
+                    spider=spider
+                )
+            finally:
+                future.set_result(None)
+
+    async def call_spider(self, request: Request, response: Union[Response, Exception], spider: 'BaseSpider'):
+        """
+        Call `request.callback` with the response, or `spider.parse` if it has no callback.
+        If download failed, `request.errback` is called with the exception instead.
+        A callback can also be the name of a spider method.
+        A generator callback is only called here, it runs while `handle_spider_output` consumes it.
+        A callback marked by `in_process_pool` runs in the process pool, its outputs are an async generator.
+        :param request:
+        :param response:
+        :param spider:
+        :return:
+        """
+        if isinstance(response, Exception):
+            callback = request.errback
         else:
-            logger.error(f'Spider must return Dict or None, got {type(output).__name__} in {request}')
+            callback = request.callback or spider.parse
+        if isinstance(callback, str):
+            callback = getattr(spider, callback)
+        if getattr(callback, 'in_process_pool', False) and not isinstance(response, Exception):
+            if self.process_pool is None:
+                self.process_pool = ProcessPool(self.crawler, spider)
+            return self.process_pool.parse(callback, response)
+        if inspect.isgeneratorfunction(callback) or inspect.isasyncgenfunction(callback):
+            return callback(response)
+        return await wrapper_run_function(callback, response)
+
+    async def handle_spider_output(self, output: Any, request: Request, response, spider: 'BaseSpider'):
+        """
+        Handle output of a callback, a Request, a dict, None, or a list, sync or async generator of them.
+        Output of a generator is handled as it is yielded: requests are crawled right away, and items go to
+        pipeline while the generator goes on. The generator waits while CONCURRENT_ITEMS items of the
+        scraper are in pipeline. Sync generators run in thread pool like sync callbacks.
+        :param output:
+        :param request:
+        :param response:
+        :param spider:
+        :return:
+        """
+        if isinstance(output, GeneratorType):
+            output = iterate_in_thread_pool(output)
+        elif not hasattr(output, '__aiter__') and not isinstance(output, (list, tuple)):
+            await self._handle_output(output, request, response, spider)
+            return
+
+        pending: Set[Future] = set()
+        try:
+            async for value in as_async_generator(output):
+                if isinstance(value, dict):
+                    await self.items_slots.acquire()
+                    task = self.crawler.loop.create_task(self._process_item(value, response, spider))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    task.add_done_callback(lambda _: self.items_slots.release())
+                else:
+                    await self._handle_output(value, request, response, spider)
+        finally:
+            # Response is scraped when its items are.
+            if pending:
+                await asyncio.wait(pending)
+
+    async def _handle_output(self, output: Any, request: Request, response, spider: 'BaseSpider'):
+        if output is None:
+            return
+        if isinstance(output, Request):
+            await self.crawler.engine.crawl(output, spider)
+        elif isinstance(output, dict):
+            async with self.items_slots:
+                await self._process_item(output, response, spider)
+        else:
+            logger.error(f'Spider must return Request, Dict or None, got {type(output).__name__} in {request}')
+
+    async def _process_item(self, item: dict, response, spider: 'BaseSpider'):
+        try:
+            result = await self.item_processor.process_item(item, spider)
+        except Exception as e:
+            result = e
+        await self._item_process_finished(result, item, response, spider)
 
     async def _item_process_finished(self, output, item, response, spider):
         if isinstance(output, Exception):
             if isinstance(output, DropItem):
+                self.crawler.stats.inc_value('item_dropped_count')
                 await self.crawler.signals.send(
                     signal=signals.item_dropped,
                     item=item,
@@ -95,6 +216,7 @@ class Scraper:
                     exception=output
                 )
             else:
+                self.crawler.stats.inc_value('item_error_count')
                 await self.crawler.signals.send(
                     signal=signals.item_error,
                     item=item,
@@ -104,6 +226,7 @@ class Scraper:
                 )
         else:
             logger.debug(f'Scraped from {response} \n{item}')
+            self.crawler.stats.inc_value('item_scraped_count')
             await self.crawler.signals.send(
                 signal=signals.item_scraped,
                 item=output,
@@ -9,9 +9,180 @@ DEFAULT_USERAGENT = 'Mozilla/5.0 (Windows NT 10) AppleWebKit/537.2 (KHTML, like
 
 ITEM_PROCESSOR = 'aio_scrapy.pipelines.ItemPipelineManager'
 
+DUPEFILTER_CLASS = 'aio_scrapy.dupefilters.RFPDupeFilter'
+DUPEFILTER_DEBUG = False
+# RFPDupeFilter keeps 64 or 128 bits of each request fingerprint.
+DUPEFILTER_FINGERPRINT_BITS = 64
+# BloomDupeFilter
+DUPEFILTER_BLOOM_CAPACITY = 10000000
+DUPEFILTER_BLOOM_ERROR_RATE = 0.001
+
+SCHEDULER = 'aio_scrapy.scheduler.SimpleScheduler'
+# DiskQueueScheduler, segments are written to a temporary directory if path is None.
+SCHEDULER_DISK_PATH = None
+SCHEDULER_DISK_MEMORY_SIZE = 10000
+SCHEDULER_DISK_SEGMENT_BYTES = 64 * 1024 * 1024
+
 ITEM_PIPELINES = {}
+# A pipeline with a `process_items` hook gets items in batches of this size, or what is buffered after
+# ITEM_BATCH_TIMEOUT seconds. Scraper lets at least ITEM_BATCH_SIZE items in pipeline then, not CONCURRENT_ITEMS.
+ITEM_BATCH_SIZE = 100
+ITEM_BATCH_TIMEOUT = 1.0
+
+STATS_CLASS = 'aio_scrapy.statscollectors.MemoryStatsCollector'
+STATS_DUMP = True
 
 DOWNLOAD_DELAY = 0.5
+# Delay is a random value between 0.5 * DOWNLOAD_DELAY and 1.5 * DOWNLOAD_DELAY.
+RANDOMIZE_DOWNLOAD_DELAY = False
+# Override concurrency, delay and randomize_delay of a download slot by its key, e.g.
+# {'example.com': {'concurrency': 1, 'delay': 2, 'randomize_delay': True}}
+DOWNLOAD_SLOTS = {}
+
+# Downloader middlewares and their order, process_request runs in this order and process_response in reverse.
+# Set the order of a base middleware to None in DOWNLOADER_MIDDLEWARES to disable it.
+DOWNLOADER_MIDDLEWARES = {}
+DOWNLOADER_MIDDLEWARES_BASE = {
+    'aio_scrapy.downloadermiddlewares.retry.RetryMiddleware': 550,
+    'aio_scrapy.downloadermiddlewares.proxy.ProxyPoolMiddleware': 750,
+    'aio_scrapy.downloadermiddlewares.conditional.ConditionalRequestMiddleware': 850,
+    'aio_scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware': 900,
+}
+
+# Send If-None-Match and If-Modified-Since with validators of the last crawl, kept in CONDITIONAL_DIR,
+# and drop 304 responses. Also drop responses whose body did not change if CONDITIONAL_SKIP_UNCHANGED is set.
+CONDITIONAL_ENABLED = False
+CONDITIONAL_DIR = 'conditional'
+CONDITIONAL_SKIP_UNCHANGED = False
+# Validators are written to disk this many at a time.
+CONDITIONAL_FLUSH_SIZE = 1000
+
+HTTPCACHE_ENABLED = False
+HTTPCACHE_DIR = 'httpcache'
+# Seconds a cached response is kept, 0 is forever.
+HTTPCACHE_EXPIRATION_SECS = 0
+# FilesystemCacheStorage or SqliteCacheStorage.
+HTTPCACHE_STORAGE = 'aio_scrapy.extensions.httpcache.FilesystemCacheStorage'
+# DummyPolicy caches everything, RFC2616Policy honours Cache-Control and Expires.
+HTTPCACHE_POLICY = 'aio_scrapy.extensions.httpcache.DummyPolicy'
+HTTPCACHE_IGNORE_HTTP_CODES = []
+HTTPCACHE_IGNORE_SCHEMES = ['file']
+# RFC2616Policy only, store responses even without caching headers, and Cache-Control directives to ignore.
+HTTPCACHE_ALWAYS_STORE = False
+HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS = []
+
+# Rotate requests over proxies of PROXY_LIST and of PROXY_LIST_FILE, a file with a proxy url per line.
+PROXY_POOL_ENABLED = False
+PROXY_LIST = []
+PROXY_LIST_FILE = None
+# Send all requests to a host through the same proxy while it is healthy.
+PROXY_STICKY = False
+# Weight of the last request in moving averages of latency and error rate of a proxy.
+PROXY_EWMA_ALPHA = 0.3
+# A proxy is quarantined if its error rate reaches PROXY_MAX_ERROR_RATE after PROXY_MIN_REQUESTS requests,
+# for PROXY_QUARANTINE seconds doubled every time, and evicted after PROXY_MAX_QUARANTINES quarantines.
+PROXY_MIN_REQUESTS = 5
+PROXY_MAX_ERROR_RATE = 0.5
+PROXY_QUARANTINE = 60
+PROXY_MAX_QUARANTINES = 3
+# Responses with these statuses count as errors of a proxy, besides download exceptions.
+PROXY_ERROR_HTTP_CODES = [403, 407, 429, 502, 503]
+
+# A GET or HEAD request whose fingerprint matches a download in flight of the same crawler gets the response of
+# that download instead of being downloaded again. Headers, proxy and cookies of the requests must match too.
+DOWNLOAD_COALESCE = False
+
+# Seconds a download may take, request meta `download_timeout` overrides it.
+DOWNLOAD_TIMEOUT = 180
+
+# Bytes of a response body above which the download is aborted, 0 is no limit.
+# Request meta `download_maxsize` overrides it.
+DOWNLOAD_MAXSIZE = 1024 * 1024 * 1024
+# Bytes of a response body above which a warning is logged, 0 is no warning.
+# Request meta `download_warnsize` overrides it.
+DOWNLOAD_WARNSIZE = 32 * 1024 * 1024
+# Bodies of requests with meta `download_stream` set are written to a temporary file once they are larger
+# than this, and the response body is a memoryview of the file mapped in memory.
+DOWNLOAD_STREAM_THRESHOLD = 1024 * 1024
+
+RETRY_ENABLED = True
+RETRY_TIMES = 2
+RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408, 429]
+# Retries are crawled later than other requests of the same priority.
+RETRY_PRIORITY_ADJUST = -1
+# A retry waits RETRY_BACKOFF_BASE * 2 ** (retries - 1) seconds at most RETRY_BACKOFF_MAX,
+# and a random fraction RETRY_BACKOFF_JITTER of it is taken off.
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 60
+RETRY_BACKOFF_JITTER = 0.5
+# Seconds since the first download of a request after which it is not retried anymore, None is no limit.
+RETRY_DEADLINE = None
+
+# Extensions of a crawler and their order, set the order of a base extension to None in EXTENSIONS to disable it.
+EXTENSIONS = {}
+EXTENSIONS_BASE = {
+    'aio_scrapy.extensions.throttle.AutoThrottle': 0,
+}
+
+# AutoThrottle adapts delay and concurrency of each host to its latency, DOWNLOAD_DELAY is the minimum delay.
+AUTOTHROTTLE_ENABLED = False
+AUTOTHROTTLE_START_DELAY = 5
+AUTOTHROTTLE_MAX_DELAY = 60
+# Average number of requests in flight to each host.
+AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+# Weight of the latest latency in the moving average of latency.
+AUTOTHROTTLE_EWMA_ALPHA = 0.3
+AUTOTHROTTLE_DEBUG = False
 
 CONCURRENT_ITEMS = 10
+# Engine stops downloading while bodies of responses waiting for or in scraping take more bytes than this, bodies
+# streamed to a file included. Stats scraper/active_size and scraper/queue_depth hold the current values.
+SCRAPER_SLOT_MAX_ACTIVE_SIZE = 5000000
+# Processes running callbacks marked by `aio_scrapy.processpool.in_process_pool`, 0 is one per CPU.
+PROCESS_POOL_WORKERS = 0
+# Outputs of a callback in process pool waiting for the scraper, its worker blocks while so many are waiting.
+PROCESS_POOL_BUFFER = 100
 CONCURRENT_REQUESTS = 10
+# Each host has a download slot with its own queue, concurrency and delay.
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
+# If non-zero, slots are keyed by IP instead of host, and this limit is used instead.
+CONCURRENT_REQUESTS_PER_IP = 0
+
+# Resolver doing DNS lookups, aiohttp.resolver.AsyncResolver uses aiodns instead of threads.
+DNS_RESOLVER = 'aiohttp.resolver.ThreadedResolver'
+# Cache lookups for DNSCACHE_TTL seconds, at most DNSCACHE_SIZE hosts. Crawlers of a CrawlerRunner share the cache.
+DNSCACHE_ENABLED = True
+DNSCACHE_SIZE = 10000
+DNSCACHE_TTL = 300
+# Look up hosts of requests as they are queued in download slots, before they are ready to be transferred.
+DNS_PREFETCH = True
+
+# Per-slot circuit breaker. It opens when at least CIRCUIT_BREAKER_THRESHOLD of the transfers of the last
+# CIRCUIT_BREAKER_WINDOW seconds failed, and there were at least CIRCUIT_BREAKER_MIN_REQUESTS of them.
+# Requests to an open slot are parked, after CIRCUIT_BREAKER_COOLDOWN seconds one probe is sent,
+# the circuit closes if it succeeds and opens again otherwise.
+CIRCUIT_BREAKER_ENABLED = False
+CIRCUIT_BREAKER_WINDOW = 30
+CIRCUIT_BREAKER_THRESHOLD = 0.5
+CIRCUIT_BREAKER_MIN_REQUESTS = 10
+CIRCUIT_BREAKER_COOLDOWN = 30
+# Responses with these statuses count as failures, besides download exceptions.
+CIRCUIT_BREAKER_HTTP_CODES = [500, 502, 503, 504, 522, 524]
+
+# Start requests are consumed lazily, consumption pauses when scheduler holds HIGH requests
+# and resumes when it drains down to LOW.
+START_REQUESTS_HIGH_WATERMARK = 1000
+START_REQUESTS_LOW_WATERMARK = 100
+
+# Interval of the engine safety-net heartbeat, the engine is normally woken up by events.
+ENGINE_HEARTBEAT_INTERVAL = 5
+
+# Set by CrawlerRunner(workers=N) in each worker process. Requests are sharded by host, a worker sends
+# requests of hosts of other workers to them.
+SHARD_INDEX = 0
+SHARD_COUNT = 1
+
+# Directory to persist crawl state in, so a crawl can be paused and resumed.
+JOBDIR = None
+# Seconds between checkpoints of crawl state to JOBDIR, besides the one on spider close.
+JOBDIR_CHECKPOINT_INTERVAL = 60
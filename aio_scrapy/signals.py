@@ -12,6 +12,7 @@ request_dropped = object()
 request_reached_downloader = object()
 response_received = object()
 response_downloaded = object()
+circuit_state_changed = object()
 item_scraped = object()
 item_dropped = object()
 item_error = object()
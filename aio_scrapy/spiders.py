@@ -1,10 +1,10 @@
 import logging
-from typing import TYPE_CHECKING, Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Union
 
-from aiohttp import ClientResponse
 from aiohttp.typedefs import StrOrURL
 
 from aio_scrapy import signals
+from aio_scrapy.http import Request, Response
 from aio_scrapy.utils import wrapper_run_function
 
 if TYPE_CHECKING:  # pragma: no cover
@@ -51,11 +51,16 @@ class BaseSpider:
         if callable(closed):
             return await wrapper_run_function(closed, reason)
 
-    def start_requests(self) -> StrOrURL:
+    def start_requests(self) -> Iterator[Union[StrOrURL, Request]]:
+        """
+        Urls or Requests to start crawling with. Override it as a sync or an async generator, engine
+        consumes it lazily, so it may produce far more urls than fit in memory.
+        :return:
+        """
         for url in self.start_urls:
             yield url
 
-    async def parse(self, response: ClientResponse):
+    async def parse(self, response: Response):
         raise NotImplementedError('{}.parse callback is not defined'.format(self.__class__.__name__))
 
     def __str__(self):
@@ -0,0 +1,103 @@
+import logging
+import pprint
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional
+
+if TYPE_CHECKING:
+    from aio_scrapy.crawler import Crawler
+    from aio_scrapy.spiders import BaseSpider
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCollector:
+
+    def __init__(self, crawler: 'Crawler'):
+        self._dump: bool = crawler.settings.get('STATS_DUMP')
+        self._stats: Dict[str, Any] = {}
+
+    def get_value(self, key: str, default: Any = None) -> Any:
+        return self._stats.get(key, default)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self._stats
+
+    def set_value(self, key: str, value: Any) -> None:
+        self._stats[key] = value
+
+    def set_stats(self, stats: Dict[str, Any]) -> None:
+        self._stats = stats
+
+    def inc_value(self, key: str, count: int = 1, start: int = 0) -> None:
+        self._stats[key] = self._stats.setdefault(key, start) + count
+
+    def max_value(self, key: str, value: Any) -> None:
+        self._stats[key] = max(self._stats.setdefault(key, value), value)
+
+    def min_value(self, key: str, value: Any) -> None:
+        self._stats[key] = min(self._stats.setdefault(key, value), value)
+
+    def clear_stats(self) -> None:
+        self._stats.clear()
+
+    def open_spider(self, spider: 'BaseSpider') -> None:
+        pass
+
+    def close_spider(self, spider: 'BaseSpider', reason: str) -> None:
+        if self._dump:
+            logger.info(f'Dumping aio_scrapy stats:\n{pprint.pformat(self._stats)}')
+        self._persist_stats(self._stats, spider)
+
+    def _persist_stats(self, stats: Dict[str, Any], spider: 'BaseSpider') -> None:
+        pass
+
+
+class MemoryStatsCollector(StatsCollector):
+
+    def __init__(self, crawler: 'Crawler'):
+        super().__init__(crawler)
+        self.spider_stats: Dict[str, Dict[str, Any]] = {}
+
+    def _persist_stats(self, stats: Dict[str, Any], spider: 'BaseSpider') -> None:
+        self.spider_stats[spider.name] = stats
+
+
+class DummyStatsCollector(StatsCollector):
+
+    def get_value(self, key: str, default: Any = None) -> Any:
+        return default
+
+    def set_value(self, key: str, value: Any) -> None:
+        pass
+
+    def set_stats(self, stats: Dict[str, Any]) -> None:
+        pass
+
+    def inc_value(self, key: str, count: int = 1, start: int = 0) -> None:
+        pass
+
+    def max_value(self, key: str, value: Any) -> None:
+        pass
+
+    def min_value(self, key: str, value: Any) -> None:
+        pass
+
+
+def merge_stats(stats_list: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Merge stats of several crawlers of the same spider, e.g. collected in worker processes.
+    Numbers are summed, `*start_time` keeps the earliest datetime and other datetimes the latest,
+    any other value keeps the first one seen.
+    :param stats_list:
+    :return:
+    """
+    merged: Dict[str, Any] = {}
+    for stats in stats_list:
+        for key, value in (stats or {}).items():
+            if key not in merged:
+                merged[key] = value
+            elif isinstance(value, datetime):
+                merged[key] = min(merged[key], value) if key.endswith('start_time') else max(merged[key], value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] += value
+    return merged
@@ -2,7 +2,8 @@ import asyncio
 import functools
 from asyncio import Task
 from importlib import import_module
-from typing import Any, Awaitable, Callable, Optional, TypeVar, Union
+from typing import (Any, AsyncIterable, AsyncIterator, Awaitable, Callable,
+                    Iterable, Iterator, Optional, TypeVar, Union)
 
 T = TypeVar('T')
 
@@ -55,6 +56,35 @@ async def wrapper_run_function(
         return await run_in_thread_pool(func, *args, **kwargs)
 
 
+async def as_async_generator(iterable: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    """
+    Wrap a sync or async iterable as an async generator, values are pulled lazily.
+    :param iterable:
+    :return:
+    """
+    if hasattr(iterable, '__aiter__'):
+        async for value in iterable:
+            yield value
+    else:
+        for value in iterable:
+            yield value
+
+
+async def iterate_in_thread_pool(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """
+    Wrap a sync iterator as an async generator, each value is pulled in thread pool, so the code of a
+    generator does not block the loop.
+    :param iterator:
+    :return:
+    """
+    stop = object()
+    while True:
+        value = await run_in_thread_pool(next, iterator, stop)
+        if value is stop:
+            return
+        yield value
+
+
 class CallLateOnce:
 
     def __init__(self, func: Callable[..., Awaitable], *args, **kwargs):
@@ -69,6 +99,15 @@ class CallLateOnce:
     async def scheduler(self, delay: int = 0):
         if self._task is None:
             await asyncio.sleep(delay)
+            self.schedule()
+
+    def schedule(self):
+        """
+        Create the call task on the loop right now, unless one is already pending.
+        Unlike `scheduler`, this is a plain function, so it can be used from future callbacks.
+        :return:
+        """
+        if self._task is None:
             self._task = self.loop.create_task(self())
 
     def cancel(self):
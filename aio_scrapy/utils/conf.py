@@ -0,0 +1,18 @@
+from typing import List, Mapping, Optional
+
+
+def build_component_list(
+        base: Mapping[str, Optional[int]],
+        custom: Optional[Mapping[str, Optional[int]]] = None
+) -> List[str]:
+    """
+    Sort component paths by their order, lower order comes first.
+    A component whose order is None is disabled, so a base component can be disabled by custom.
+    :param base: dict of component path and order, e.g. EXTENSIONS_BASE.
+    :param custom: dict of component path and order which overrides base, e.g. EXTENSIONS.
+    :return:
+    """
+    components = dict(base)
+    components.update(custom or {})
+    enabled = [(order, path) for path, order in components.items() if order is not None]
+    return [path for order, path in sorted(enabled, key=lambda x: x[0])]
@@ -0,0 +1,74 @@
+"""
+Helpers to persist crawl state in JOBDIR, so a crawl can be resumed after a restart.
+Writes go to a temporary file which replaces the target, a crash never leaves a partial file.
+"""
+import mmap
+import os
+import pickle
+import tempfile
+from typing import Any, Iterable, List, Optional
+
+from aio_scrapy.http import Request
+from aio_scrapy.settings import Settings
+from aio_scrapy.utils.reqser import records_to_requests, requests_to_records
+
+
+def job_dir(settings: Settings) -> Optional[str]:
+    path = settings.get('JOBDIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """
+    Write data to a temporary file of its own, then replace path. Concurrent writers never share a temporary file,
+    the last replace wins.
+    :param path:
+    :param data:
+    :return:
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f'{os.path.basename(path)}.', suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with open(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_requests(path: str, requests: Iterable[Request]) -> List[Request]:
+    """
+    :param path:
+    :param requests:
+    :return: requests which can not be serialized, they are skipped.
+    """
+    unserializable: List[Request] = []
+    write_atomic(path, requests_to_records(requests, unserializable))
+    return unserializable
+
+
+def read_requests(path: str) -> List[Request]:
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            requests, _ = records_to_requests(view)
+        finally:
+            view.release()
+    return requests
+
+
+def write_pickle(path: str, obj: Any) -> None:
+    write_atomic(path, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def read_pickle(path: str, default: Any = None) -> Any:
+    if not os.path.exists(path):
+        return default
+    with open(path, 'rb') as f:
+        return pickle.load(f)
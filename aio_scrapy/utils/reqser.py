@@ -0,0 +1,114 @@
+"""
+Compact binary serialization of requests, used to spill and persist scheduler queues.
+"""
+import inspect
+import pickle
+import struct
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from aio_scrapy.http import Request
+
+# priority, flags, url length
+_HEADER = struct.Struct('<iBI')
+
+_DONT_FILTER = 1
+# Method, headers, body, meta, callback or errback is set, they follow the url as a pickled dict.
+_EXTRA = 2
+
+# Length prefix of a record in a stream of requests
+RECORD_HEADER = struct.Struct('<I')
+
+
+def _callback_name(callback: Optional[Union[Callable, str]]) -> Optional[str]:
+    if callback is None or isinstance(callback, str):
+        return callback
+    if inspect.ismethod(callback):
+        return callback.__name__
+    raise ValueError(f'Callback {callback!r} is not a method of spider, the request can not be serialized')
+
+
+def request_to_bytes(request: Request) -> bytes:
+    """
+    Most requests are plain GETs, they are serialized as priority, flags and url only.
+    Callbacks are kept by name, they must be methods of the spider.
+    :param request:
+    :return:
+    """
+    # str() is a no-op for a url which was never parsed, headers and meta are not created if they are unused.
+    url = str(request._url).encode('utf-8')
+    flags = _DONT_FILTER if request.dont_filter else 0
+    extra: Dict[str, Any] = {}
+    if request.method != 'GET':
+        extra['method'] = request.method
+    if request._headers:
+        extra['headers'] = request._headers
+    if request.body:
+        extra['body'] = request.body
+    if request._meta:
+        extra['meta'] = request._meta
+    if request.callback is not None:
+        extra['callback'] = _callback_name(request.callback)
+    if request.errback is not None:
+        extra['errback'] = _callback_name(request.errback)
+    if extra:
+        flags |= _EXTRA
+        return _HEADER.pack(request.priority, flags, len(url)) + url + pickle.dumps(extra, pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(request.priority, flags, len(url)) + url
+
+
+def request_from_bytes(data: bytes) -> Request:
+    priority, flags, url_length = _HEADER.unpack_from(data)
+    offset = _HEADER.size + url_length
+    url = bytes(data[_HEADER.size:offset]).decode('utf-8')
+    # Keys of extra are keyword arguments of Request.
+    extra = pickle.loads(data[offset:]) if flags & _EXTRA else {}
+    return Request(url, priority=priority, dont_filter=bool(flags & _DONT_FILTER), **extra)
+
+
+def requests_to_records(requests: Iterable[Request], unserializable: Optional[List[Request]] = None) -> bytes:
+    """
+    Serialize requests as length prefixed records.
+    :param requests:
+    :param unserializable: if it is given, requests which can not be serialized, e.g. with a lambda as callback
+        or a socket in meta, are appended to it and skipped, instead of raising.
+    :return:
+    """
+    pack = RECORD_HEADER.pack
+    records = []
+    for request in requests:
+        try:
+            data = request_to_bytes(request)
+        except (ValueError, TypeError, AttributeError, pickle.PicklingError):
+            if unserializable is None:
+                raise
+            unserializable.append(request)
+            continue
+        records.append(pack(len(data)))
+        records.append(data)
+    return b''.join(records)
+
+
+def records_to_requests(
+        buffer,
+        offset: int = 0,
+        end: Optional[int] = None,
+        max_count: Optional[int] = None
+) -> Tuple[List[Request], int]:
+    """
+    Deserialize length prefixed records from a buffer, e.g. a memoryview of a mmap.
+    :param buffer:
+    :param offset: where to start reading.
+    :param end: where to stop reading, default is the end of buffer.
+    :param max_count: read at most `max_count` requests.
+    :return: requests and the offset after the last one read.
+    """
+    end = len(buffer) if end is None else end
+    header_size = RECORD_HEADER.size
+    unpack_from = RECORD_HEADER.unpack_from
+    requests = []
+    while offset < end and (max_count is None or len(requests) < max_count):
+        length, = unpack_from(buffer, offset)
+        offset += header_size
+        requests.append(request_from_bytes(buffer[offset:offset + length]))
+        offset += length
+    return requests, offset
@@ -0,0 +1,18 @@
+import hashlib
+
+from aio_scrapy.http import Request
+from aio_scrapy.utils.url import canonicalize_url
+
+
+def request_fingerprint(request: Request) -> bytes:
+    """
+    16 bytes digest identifying the resource of a request, computed from its canonical url, and also
+    method and body unless it is a GET without body. Take a prefix of it if a shorter fingerprint is enough.
+    :param request:
+    :return:
+    """
+    digest = hashlib.blake2b(canonicalize_url(request.url).encode('utf-8'), digest_size=16)
+    if request.method != 'GET' or request.body:
+        digest.update(b'\0' + request.method.encode('ascii') + b'\0')
+        digest.update(request.body)
+    return digest.digest()
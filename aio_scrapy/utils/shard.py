@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from yarl import URL
+
+from aio_scrapy import signals
+from aio_scrapy.exceptions import DontCloseSpider
+from aio_scrapy.http import Request
+from aio_scrapy.utils.reqser import request_from_bytes, request_to_bytes
+
+if TYPE_CHECKING:
+    from multiprocessing.context import BaseContext
+
+    from aio_scrapy.crawler import Crawler
+
+
+def jump_consistent_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash, see https://arxiv.org/abs/1406.2294
+    Only about 1/n keys move to another bucket when buckets grow from n-1 to n.
+    :param key: 64 bits integer
+    :param buckets:
+    :return: bucket in range [0, buckets)
+    """
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def host_shard(url: URL, shards: int) -> int:
+    """
+    Get which shard a url belongs to by its host, so all requests of a host are crawled
+    by the same worker. Python `hash()` is salted per process, so a stable digest is used.
+    :param url:
+    :param shards:
+    :return:
+    """
+    host: Optional[str] = url.host or ''
+    key = int.from_bytes(hashlib.md5(host.lower().encode('utf-8')).digest()[:8], 'little')
+    return jump_consistent_hash(key, shards)
+
+
+class ShardChannels:
+    """
+    Inbox of each worker of a sharded crawl, and counters telling when the crawl is finished on every worker.
+    They are created by the parent process before workers start, one set for each crawl.
+    """
+
+    def __init__(self, ctx: 'BaseContext', workers: int):
+        self.inboxes = [ctx.Queue() for _ in range(workers)]
+        self.lock = ctx.Lock()
+        # Workers which found their spider idle, and requests sent to other workers and received from them.
+        self.idle = ctx.Array('b', workers, lock=False)
+        self.sent = ctx.Value('q', 0, lock=False)
+        self.received = ctx.Value('q', 0, lock=False)
+
+
+class ShardRouter:
+    """
+    Send requests of hosts of other workers to their owner, and crawl requests sent by other workers.
+
+    A worker only closes its spider when every worker found its spider idle and every sent request was received,
+    so a request in transit is never lost. A worker receiving a request is busy again.
+    """
+
+    def __init__(self, crawler: 'Crawler', channels: ShardChannels, index: int):
+        self.crawler = crawler
+        self.channels = channels
+        self.index = index
+        self.inbox = channels.inboxes[index]
+        self.reader: Optional[threading.Thread] = None
+        crawler.signals.connect(self.engine_started, signal=signals.engine_started)
+        crawler.signals.connect(self.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(self.engine_stopped, signal=signals.engine_stopped)
+
+    def engine_started(self):
+        self.reader = threading.Thread(target=self._read, name=f'aio_scrapy-shard-{self.index}', daemon=True)
+        self.reader.start()
+
+    def engine_stopped(self):
+        if self.reader is not None:
+            self.inbox.put(None)
+            self.reader = None
+        for inbox in self.channels.inboxes:
+            # Do not wait for requests to a worker which exited, when this one exits.
+            inbox.cancel_join_thread()
+
+    def send(self, request: Request, shard: int) -> bool:
+        """
+        :param request:
+        :param shard: the worker owning the host of the request.
+        :return: False if the request can not be serialized, then it is crawled locally.
+        """
+        try:
+            data = request_to_bytes(request)
+        except ValueError:
+            self.crawler.stats.inc_value('shard/foreign_unserializable')
+            return False
+        channels = self.channels
+        with channels.lock:
+            channels.sent.value += 1
+            channels.idle[self.index] = 0
+        channels.inboxes[shard].put(data)
+        self.crawler.stats.inc_value('shard/foreign_sent')
+        return True
+
+    def _read(self):
+        loop = self.crawler.loop
+        while True:
+            data = self.inbox.get()
+            if data is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._receive(data), loop)
+
+    async def _receive(self, data: bytes):
+        engine = self.crawler.engine
+        self.crawler.stats.inc_value('shard/foreign_received')
+        try:
+            await engine.crawl(request_from_bytes(data), engine.spider)
+        finally:
+            # Counted once it is in the scheduler, the request is in transit until then.
+            channels = self.channels
+            with channels.lock:
+                channels.received.value += 1
+                channels.idle[self.index] = 0
+
+    def spider_idle(self):
+        channels = self.channels
+        with channels.lock:
+            channels.idle[self.index] = 1
+            finished = all(channels.idle) and channels.sent.value == channels.received.value
+        if not finished:
+            raise DontCloseSpider
@@ -0,0 +1,25 @@
+from aiohttp.typedefs import StrOrURL
+from yarl import URL
+
+
+def canonicalize_url(url: StrOrURL, keep_fragments: bool = False) -> str:
+    """
+    Canonicalize url, so urls which point to the same resource have the same string.
+
+    - lowercase scheme and host, drop default port (done by yarl)
+    - sort query arguments, keep blank values
+    - normalize empty path to `/`
+    - remove fragment, unless `keep_fragments`
+    :param url:
+    :param keep_fragments:
+    :return:
+    """
+    if not isinstance(url, URL):
+        url = URL(url)
+    # `with_path` clears query and fragment, so rebuild them afterwards.
+    canonical = url.with_path(url.raw_path or '/', encoded=True)
+    if url.raw_query_string:
+        canonical = canonical.with_query(sorted(url.query.items()))
+    if keep_fragments and url.raw_fragment:
+        canonical = canonical.with_fragment(url.fragment)
+    return str(canonical)
@@ -0,0 +1,105 @@
+"""
+Crawl a local aiohttp server whose latency changes over time, with a static DOWNLOAD_DELAY and with AutoThrottle.
+
+The server answers in ``--latencies`` seconds, switching to the next value every ``--phase`` seconds, and each
+crawl is stopped when the last phase ends. Every response reports the delay of the download slot, so the trace
+shows how AutoThrottle follows the latency.
+
+Usage: python benchmarks/bench_autothrottle.py [--latencies 0.02,0.2,0.05] [--phase 2] [--delay 0.5] [--target 4]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import List, Tuple
+
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.spiders import BaseSpider
+
+
+async def start_server(latencies: List[float], phase: float, in_flight: List[int]):
+    started = time.perf_counter()
+
+    async def handler(request):
+        index = min(int((time.perf_counter() - started) / phase), len(latencies) - 1)
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(latencies[index])
+        in_flight[0] -= 1
+        return web.Response(text='OK')
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f'http://{host}:{port}'
+
+
+async def run(mode: str, latencies: List[float], phase: float, delay: float, target: float):
+    # Current and max number of requests the server is handling.
+    in_flight = [0, 0]
+    runner, server = await start_server(latencies, phase, in_flight)
+    trace: List[Tuple[float, float, int]] = []
+
+    class Spider(BaseSpider):
+        name = 'bench'
+
+        def start_requests(self):
+            i = 0
+            while True:
+                yield f'{server}/?id={i}'
+                i += 1
+
+        async def parse(self, response):
+            slot = self.crawler.engine.downloader.slots[response.url.host]
+            trace.append((time.perf_counter(), slot.delay, slot.concurrency))
+            return {}
+
+    if mode == 'static':
+        settings = {'DOWNLOAD_DELAY': delay}
+    else:
+        settings = {
+            'DOWNLOAD_DELAY': 0,
+            'AUTOTHROTTLE_ENABLED': True,
+            'AUTOTHROTTLE_START_DELAY': delay,
+            'AUTOTHROTTLE_TARGET_CONCURRENCY': target,
+        }
+    loop = asyncio.get_event_loop()
+    crawler = Crawler(Spider, settings=settings, loop=loop)
+    duration = phase * len(latencies)
+    loop.call_later(duration, lambda: loop.create_task(crawler.stop()))
+    started = time.perf_counter()
+    try:
+        await crawler.crawl()
+    finally:
+        await runner.cleanup()
+    requests = len(trace)
+
+    print(f'{mode:>12}: {requests} requests in {duration:.2f}s, {requests / duration:.1f} req/s, '
+          f'max {in_flight[1]} requests in flight on server')
+    step = max(1, len(trace) // 10)
+    for at, slot_delay, concurrency in trace[::step]:
+        print(f'{"":>14}t={at - started:6.2f}s delay={slot_delay * 1000:7.1f}ms concurrency={concurrency}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latencies', default='0.02,0.2,0.05', help='comma separated latency of each phase')
+    parser.add_argument('--phase', type=float, default=2, help='seconds of each latency phase')
+    parser.add_argument('--delay', type=float, default=0.5, help='static delay, and start delay of AutoThrottle')
+    parser.add_argument('--target', type=float, default=4, help='AUTOTHROTTLE_TARGET_CONCURRENCY')
+    args = parser.parse_args()
+    latencies = [float(latency) for latency in args.latencies.split(',')]
+
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    for mode in ('static', 'autothrottle'):
+        loop.run_until_complete(run(mode, latencies, args.phase, args.delay, args.target))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Enqueue/dequeue rate and resident memory of DiskQueueScheduler compared with the in-memory deque.
+
+Every scheduler runs in its own process, so peak RSS is not shared between them.
+
+Usage: python benchmarks/bench_disk_queue.py [--requests 10000000] [--schedulers disk simple]
+"""
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+
+from aio_scrapy.http import Request
+from aio_scrapy.scheduler import DiskQueueScheduler, SimpleScheduler
+
+
+def current_rss_mb() -> float:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def bench(name: str, count: int):
+    with tempfile.TemporaryDirectory() as path:
+        scheduler = DiskQueueScheduler(path=path) if name == 'disk' else SimpleScheduler()
+        base_rss = current_rss_mb()
+
+        started = time.perf_counter()
+        for i in range(count):
+            scheduler.enqueue_request(Request(f'http://example.com/item/{i}'))
+        enqueue = time.perf_counter() - started
+        full_rss = current_rss_mb()
+
+        started = time.perf_counter()
+        while scheduler.next_request() is not None:
+            pass
+        dequeue = time.perf_counter() - started
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{name:>6}: enqueue {count / enqueue / 1e3:.0f}k req/s, dequeue {count / dequeue / 1e3:.0f}k req/s, '
+          f'rss +{full_rss - base_rss:.0f}MB when full, peak {peak_rss:.0f}MB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=10000000)
+    parser.add_argument('--schedulers', nargs='+', default=['disk', 'simple'])
+    args = parser.parse_args()
+
+    print(f'{args.requests} requests')
+    for name in args.schedulers:
+        process = multiprocessing.Process(target=bench, args=(name, args.requests))
+        process.start()
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Crawl many hosts with two crawlers of a CrawlerRunner against a local stub DNS resolver.
+
+The stub resolves every host to the local aiohttp server after ``--latency`` seconds, at most ``--parallel``
+lookups at a time like a system resolver behind a small thread pool, and counts lookups. Modes:
+
+* ``connector``: DNSCACHE_ENABLED off, each crawler's aiohttp connector caches lookups on its own.
+* ``cache``: a CachingResolver shared by both crawlers, without prefetch.
+* ``prefetch``: the shared CachingResolver, looking hosts up as their requests are queued.
+
+Usage: python benchmarks/bench_dns.py [--hosts 300] [--requests 3] [--latency 0.02] [--parallel 4]
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import time
+
+from aiohttp import web
+from aiohttp.abc import AbstractResolver
+
+from aio_scrapy.crawler import CrawlerRunner
+from aio_scrapy.spiders import BaseSpider
+
+
+class StubResolver(AbstractResolver):
+    lookups = 0
+    latency = 0.02
+    semaphore: asyncio.Semaphore = None
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        async with StubResolver.semaphore:
+            StubResolver.lookups += 1
+            await asyncio.sleep(self.latency)
+        return [{
+            'hostname': host, 'host': '127.0.0.1', 'port': port, 'family': socket.AF_INET, 'proto': 0, 'flags': 0
+        }]
+
+    async def close(self):
+        pass
+
+
+async def start_server():
+    async def handler(request):
+        return web.Response(text='OK')
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def run(mode: str, hosts: int, requests: int, parallel: int):
+    server, port = await start_server()
+    StubResolver.lookups = 0
+    StubResolver.semaphore = asyncio.Semaphore(parallel)
+
+    def make_spider(name: str):
+        class Spider(BaseSpider):
+            start_urls = [f'http://host{h}.test:{port}/?id={i}' for i in range(requests) for h in range(hosts)]
+
+            async def parse(self, response):
+                return None
+
+        Spider.name = name
+        return Spider
+
+    settings = {
+        'DOWNLOAD_DELAY': 0,
+        'CONCURRENT_REQUESTS': 64,
+        'STATS_DUMP': False,
+        'DNS_RESOLVER': '__main__.StubResolver',
+        'DNSCACHE_ENABLED': mode != 'connector',
+        'DNS_PREFETCH': mode == 'prefetch',
+    }
+    runner = CrawlerRunner(settings)
+    started = time.perf_counter()
+    runner.crawl(make_spider('first'))
+    runner.crawl(make_spider('second'))
+    await runner.join()
+    elapsed = time.perf_counter() - started
+    await server.cleanup()
+    total = 2 * hosts * requests
+    print(f'{mode:>9}: {total / elapsed:8.1f} req/s, {StubResolver.lookups:5d} lookups for {hosts} hosts')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hosts', type=int, default=300)
+    parser.add_argument('--requests', type=int, default=3, help='requests per host and crawler')
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--parallel', type=int, default=4)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    StubResolver.latency = args.latency
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    for mode in ('connector', 'cache', 'prefetch'):
+        loop.run_until_complete(run(mode, args.hosts, args.requests, args.parallel))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-request overhead of DownloaderMiddlewareManager with 0, 5 and 20 middlewares.
+
+Each middleware defines sync `process_request` and `process_response` which do nothing, or with
+``--kind async`` async ones, or with ``--kind none`` no hook at all. Download is a coroutine returning a
+prepared Response, so only the cost of running the chains is measured.
+
+Usage: python benchmarks/bench_downloader_middlewares.py [--requests 100000] [--kind sync|async|none]
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from aio_scrapy.downloadermiddlewares import DownloaderMiddlewareManager
+from aio_scrapy.http import Request, Response
+
+
+class SyncMiddleware:
+
+    def process_request(self, request, spider):
+        return None
+
+    def process_response(self, request, response, spider):
+        return response
+
+
+class AsyncMiddleware:
+
+    async def process_request(self, request, spider):
+        return None
+
+    async def process_response(self, request, response, spider):
+        return response
+
+
+class NoHookMiddleware:
+    pass
+
+
+MIDDLEWARES = {'sync': SyncMiddleware, 'async': AsyncMiddleware, 'none': NoHookMiddleware}
+
+
+async def run(count: int, kind: str, requests: int) -> float:
+    manager = DownloaderMiddlewareManager(*(MIDDLEWARES[kind]() for _ in range(count)))
+    request = Request('http://example.com/')
+    response = Response('http://example.com/', request=request)
+
+    async def download(request, spider):
+        return response
+
+    download_ = manager.download
+    started = time.perf_counter()
+    for _ in range(requests):
+        await download_(download, request, None)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--kind', choices=sorted(MIDDLEWARES), default='sync')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+    baseline = None
+    for count in (0, 5, 20):
+        elapsed = loop.run_until_complete(run(count, args.kind, args.requests))
+        per_request = elapsed / args.requests * 1e6
+        baseline = per_request if baseline is None else baseline
+        print(f'{count:>2} {args.kind} middlewares: {per_request:6.3f} us/request, '
+              f'overhead {per_request - baseline:6.3f} us/request')
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure how long the engine leaves a local aiohttp server idle between requests.
+
+Two modes are compared:
+
+* ``poll``: event wakeups are disabled, the engine only runs on the heartbeat, which is
+  how the engine behaved before wakeups were event driven.
+* ``event``: the default, the engine is woken up when slots are freed or requests enqueued.
+
+Usage: python benchmarks/bench_engine_wakeup.py [--requests 50] [--latency 0.01] [--heartbeat 1]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import List, Tuple
+
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.engine import ExecutionEngine
+from aio_scrapy.spiders import BaseSpider
+
+
+async def start_server(latency: float, spans: List[Tuple[float, float]]):
+    async def handler(request):
+        start = time.perf_counter()
+        await asyncio.sleep(latency)
+        spans.append((start, time.perf_counter()))
+        return web.Response(text='OK')
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f'http://{host}:{port}'
+
+
+def idle_time(spans: List[Tuple[float, float]]) -> float:
+    """Wall time between the first and last request during which no request was being served."""
+    idle = 0.0
+    spans = sorted(spans)
+    current_end = spans[0][1]
+    for start, end in spans[1:]:
+        if start > current_end:
+            idle += start - current_end
+        current_end = max(current_end, end)
+    return idle
+
+
+async def run(mode: str, requests: int, latency: float, heartbeat: float):
+    spans: List[Tuple[float, float]] = []
+    runner, server = await start_server(latency, spans)
+
+    class Spider(BaseSpider):
+        name = 'bench'
+        start_urls = [f'{server}/?id={i}' for i in range(requests)]
+
+        async def parse(self, response):
+            return {}
+
+    settings = {'DOWNLOAD_DELAY': 0, 'ENGINE_HEARTBEAT_INTERVAL': heartbeat}
+    crawler = Crawler(Spider, settings=settings, loop=asyncio.get_event_loop())
+    original_wakeup = ExecutionEngine.wakeup
+    if mode == 'poll':
+        ExecutionEngine.wakeup = lambda self: None
+    try:
+        started = time.perf_counter()
+        await crawler.crawl()
+        elapsed = time.perf_counter() - started
+    finally:
+        ExecutionEngine.wakeup = original_wakeup
+        await runner.cleanup()
+
+    print(f'{mode:>6}: {len(spans)} requests in {elapsed:.3f}s, '
+          f'server idle {idle_time(spans):.3f}s between first and last request')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--heartbeat', type=float, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    for mode in ('poll', 'event'):
+        loop.run_until_complete(run(mode, args.requests, args.latency, args.heartbeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Crawl rate of a fully cached re-crawl, with each HTTP cache storage.
+
+A local aiohttp server answers every request after ``--latency`` seconds. Each storage crawls ``--requests``
+pages twice into a fresh cache directory, the first crawl fills the cache and the second one is served from it
+without asking the server.
+
+Usage: python benchmarks/bench_httpcache.py [--requests 5000] [--latency 0.01] [--size 20000]
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.spiders import BaseSpider
+
+STORAGES = ('FilesystemCacheStorage', 'SqliteCacheStorage')
+
+
+async def start_server(latency: float, size: int, served: list):
+    body = b'x' * size
+
+    async def handler(request):
+        served[0] += 1
+        await asyncio.sleep(latency)
+        return web.Response(body=body)
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f'http://{host}:{port}'
+
+
+async def crawl(server: str, requests: int, settings: dict) -> float:
+    class Spider(BaseSpider):
+        name = 'bench'
+        start_urls = [f'{server}/?id={i}' for i in range(requests)]
+
+        async def parse(self, response):
+            return None
+
+    crawler = Crawler(Spider, settings=settings)
+    started = time.perf_counter()
+    await crawler.crawl()
+    return time.perf_counter() - started
+
+
+async def run(requests: int, latency: float, size: int):
+    served = [0]
+    runner, server = await start_server(latency, size, served)
+    for storage in STORAGES:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            settings = {
+                'DOWNLOAD_DELAY': 0,
+                'CONCURRENT_REQUESTS': 64,
+                'CONCURRENT_REQUESTS_PER_DOMAIN': 64,
+                'STATS_DUMP': False,
+                'HTTPCACHE_ENABLED': True,
+                'HTTPCACHE_DIR': cache_dir,
+                'HTTPCACHE_STORAGE': f'aio_scrapy.extensions.httpcache.{storage}',
+            }
+            served[0] = 0
+            first = await crawl(server, requests, settings)
+            fetched = served[0]
+            cached = await crawl(server, requests, settings)
+            print(f'{storage:>22}: first crawl {requests / first:8.1f} req/s ({fetched} fetched), '
+                  f'cached re-crawl {requests / cached:8.1f} req/s ({served[0] - fetched} fetched)')
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--size', type=int, default=20000, help='bytes per body')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(run(args.requests, args.latency, args.size))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Time to persist and restore a scheduler frontier in JOBDIR.
+
+Usage: python benchmarks/bench_jobdir_restore.py [--requests 5000000] [--schedulers simple priority disk]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from aio_scrapy.http import Request
+from aio_scrapy.scheduler import (DiskQueueScheduler, PriorityScheduler,
+                                  SimpleScheduler)
+
+
+def create(name: str, jobdir: str):
+    if name == 'disk':
+        return DiskQueueScheduler(path=os.path.join(jobdir, 'requests.queue'), persist=True)
+    return {'simple': SimpleScheduler, 'priority': PriorityScheduler}[name](jobdir=jobdir)
+
+
+async def bench(name: str, count: int):
+    with tempfile.TemporaryDirectory() as jobdir:
+        scheduler = create(name, jobdir)
+        await scheduler.open(None)
+        for i in range(count):
+            scheduler.enqueue_request(Request(f'http://example.com/item/{i}', priority=i % 10))
+
+        started = time.perf_counter()
+        await scheduler.close('shutdown')
+        persist = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(jobdir) for f in files)
+        del scheduler
+
+        restored = create(name, jobdir)
+        started = time.perf_counter()
+        await restored.open(None)
+        restore = time.perf_counter() - started
+        assert len(restored) == count
+        await restored.close('finished')
+
+    print(f'{name:>8}: persist {persist:.2f}s, restore {restore:.2f}s, {size / 1024 / 1024:.0f}MB on disk')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000000)
+    parser.add_argument('--schedulers', nargs='+', default=['simple', 'priority', 'disk'])
+    args = parser.parse_args()
+
+    print(f'{args.requests} pending requests')
+    for name in args.schedulers:
+        asyncio.run(bench(name, args.requests))
+
+
+if __name__ == '__main__':
+    main()
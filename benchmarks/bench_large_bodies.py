@@ -0,0 +1,103 @@
+"""
+Peak RSS while crawling many large responses concurrently, bodies kept in memory or streamed to disk.
+
+A local aiohttp server answers every request with a ``--size`` MB body sent in chunks. The spider only looks at
+the length of each body. Each mode runs in its own process, so peak RSS of one does not hide the other.
+
+Usage: python benchmarks/bench_large_bodies.py [--requests 40] [--size 32] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import resource
+import time
+
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.http import Request
+from aio_scrapy.spiders import BaseSpider
+
+
+async def start_server(size: int):
+    chunk = b'x' * (1024 * 1024)
+
+    async def handler(request):
+        response = web.StreamResponse(headers={'Content-Length': str(size * len(chunk))})
+        await response.prepare(request)
+        for _ in range(size):
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f'http://{host}:{port}'
+
+
+async def run(stream: bool, requests: int, size: int, concurrency: int):
+    runner, server = await start_server(size)
+    received = []
+
+    class Spider(BaseSpider):
+        name = 'bench'
+
+        def start_requests(self):
+            for i in range(requests):
+                yield Request(f'{server}/?id={i}', meta={'download_stream': stream})
+
+        async def parse(self, response):
+            received.append(len(response.body))
+            return None
+
+    settings = {
+        'DOWNLOAD_DELAY': 0,
+        'CONCURRENT_REQUESTS': concurrency,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': concurrency,
+        'STATS_DUMP': False,
+    }
+    crawler = Crawler(Spider, settings=settings)
+    started = time.perf_counter()
+    await crawler.crawl()
+    elapsed = time.perf_counter() - started
+    await runner.cleanup()
+    assert received == [size * 1024 * 1024] * requests
+    return elapsed
+
+
+def measure(stream: bool, requests: int, size: int, concurrency: int, results):
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    elapsed = loop.run_until_complete(run(stream, requests, size, concurrency))
+    loop.close()
+    # Kilobytes on Linux.
+    results.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--size', type=int, default=32, help='MB per body')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    for stream in (False, True):
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=measure, args=(stream, args.requests, args.size, args.concurrency, results)
+        )
+        process.start()
+        elapsed, peak = results.get()
+        process.join()
+        mode = 'stream' if stream else 'memory'
+        total = args.requests * args.size
+        print(f'{mode:>6}: peak RSS {peak:8.1f} MB, {total / elapsed:7.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Measure pages/sec of a CPU-heavy `parse` with CrawlerRunner(workers=N).
+
+A local aiohttp server listens on all interfaces and urls are spread over the hosts
+127.0.0.1 .. 127.0.0.<hosts>, so start requests are sharded to every worker.
+
+Usage: python benchmarks/bench_multiprocess.py [--pages 400] [--hosts 32] [--work 2000000] [--workers 1 2 4]
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+from aiohttp import web
+
+from aio_scrapy.crawler import CrawlerRunner
+from aio_scrapy.spiders import BaseSpider
+
+
+async def start_server():
+    async def handler(request):
+        return web.Response(text='x' * 1024)
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='0.0.0.0', port=0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+def burn(data: bytes, rounds: int) -> str:
+    digest = data
+    for _ in range(rounds // 1000):
+        digest = hashlib.sha256(digest * 32).digest()
+    return digest.hex()
+
+
+# Workers of CrawlerRunner import it.
+class Spider(BaseSpider):
+    name = 'bench'
+    work = 0
+
+    async def parse(self, response):
+        return {'digest': burn(response.body, self.work)}
+
+
+async def run(workers: int, pages: int, hosts: int, work: int, port: int) -> float:
+    runner = CrawlerRunner({'DOWNLOAD_DELAY': 0, 'STATS_DUMP': False}, workers=workers)
+    runner.crawl(Spider, start_urls=[f'http://127.0.0.{i % hosts + 1}:{port}/?id={i}' for i in range(pages)], work=work)
+    started = time.perf_counter()
+    await runner.join()
+    elapsed = time.perf_counter() - started
+    crawled = runner.stats['bench'].get('item_scraped_count', 0)
+    print(f'workers={workers}: {crawled} pages in {elapsed:.2f}s, {crawled / elapsed:.1f} pages/sec')
+    return elapsed
+
+
+async def main(args):
+    server, port = await start_server()
+    try:
+        for workers in args.workers:
+            await run(workers, args.pages, args.hosts, args.work, port)
+    finally:
+        await server.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--hosts', type=int, default=32)
+    parser.add_argument('--work', type=int, default=2000000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    logging.disable(logging.INFO)
+    print(f'cpu count: {os.cpu_count()}')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,131 @@
+"""
+Parse throughput of a CPU bound callback, run in the thread pool or in process pools of 1 to ``--max-workers``
+processes.
+
+A local aiohttp server answers every request with the same HTML table of ``--rows`` rows. The callback parses it
+with lxml, or with the html.parser of the standard library if lxml is not installed, and yields an item per row.
+Parsing holds the GIL, so only the process pool can use more than one core.
+
+Usage: python benchmarks/bench_process_pool.py [--pages 200] [--rows 2000] [--max-workers <cpu count>]
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import time
+from html.parser import HTMLParser
+
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.processpool import in_process_pool
+from aio_scrapy.spiders import BaseSpider
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+
+class CellParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.in_cell = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self.rows.append([])
+        self.in_cell = tag == 'td'
+
+    def handle_data(self, data):
+        if self.in_cell:
+            self.rows[-1].append(data)
+
+
+def parse_rows(response):
+    if lxml_html is not None:
+        tree = lxml_html.fromstring(bytes(response.body))
+        for row in tree.iterfind('.//tr'):
+            yield {'cells': [cell.text for cell in row.iterfind('td')]}
+    else:
+        parser = CellParser()
+        parser.feed(response.text)
+        for cells in parser.rows:
+            yield {'cells': cells}
+
+
+class Spider(BaseSpider):
+    name = 'bench'
+
+    def parse(self, response):
+        yield from parse_rows(response)
+
+
+# Workers of the process pool import it.
+class ProcessPoolSpider(Spider):
+
+    @in_process_pool
+    def parse(self, response):
+        yield from parse_rows(response)
+
+
+async def start_server(rows: int):
+    body = '<html><body><table>{}</table></body></html>'.format(''.join(
+        f'<tr><td class="id">{i}</td><td><a href="/item/{i}">item {i}</a></td><td>{i * 3.5}</td></tr>'
+        for i in range(rows)
+    ))
+
+    async def handler(request):
+        return web.Response(text=body, content_type='text/html')
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f'http://{host}:{port}', len(body)
+
+
+async def run(workers: int, pages: int, rows: int):
+    runner, server, size = await start_server(rows)
+    settings = {
+        'DOWNLOAD_DELAY': 0,
+        'CONCURRENT_REQUESTS': 16,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 16,
+        'CONCURRENT_ITEMS': 1000,
+        'PROCESS_POOL_WORKERS': workers,
+        'STATS_DUMP': False,
+    }
+    crawler = Crawler(ProcessPoolSpider if workers else Spider, settings=settings)
+    started = time.perf_counter()
+    await crawler.crawl(start_urls=[f'{server}/?page={i}' for i in range(pages)])
+    elapsed = time.perf_counter() - started
+    await runner.cleanup()
+    items = crawler.stats.get_value('item_scraped_count')
+    mode = f'{workers} processes' if workers else 'thread pool'
+    print(f'{mode:>12}: {pages / elapsed:7.1f} pages/s, {items / elapsed:9.0f} items/s, {size / 1024:.0f} KB pages')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--max-workers', type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f'parser: {"lxml" if lxml_html is not None else "html.parser"}, {multiprocessing.cpu_count()} CPUs')
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    workers = 1
+    loop.run_until_complete(run(0, args.pages, args.rows))
+    while workers <= args.max_workers:
+        loop.run_until_complete(run(workers, args.pages, args.rows))
+        workers *= 2
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-request memory and CPU of tracking in-flight requests.
+
+* ``url+uuid``: how requests were tracked before Request carried everything, a parsed yarl URL and a
+  uuid1 per request, the uuid being what the downloader kept in its active set.
+* ``request``: a Request whose url is never parsed, e.g. while it waits in the scheduler.
+* ``request+url``: a Request whose url is parsed, as it is once it is downloaded.
+
+Requests are tracked in a set by identity, memory is what stays allocated while all of them are tracked.
+
+Usage: python benchmarks/bench_request_alloc.py [--requests 100000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+import uuid
+from typing import Callable, List, Set
+
+from yarl import URL
+
+from aio_scrapy.http import Request
+
+
+def url_uuid(url: str):
+    return URL(url), uuid.uuid1()
+
+
+def request(url: str):
+    return Request(url)
+
+
+def request_url(url: str):
+    r = Request(url)
+    r.url
+    return r
+
+
+def track(make: Callable, urls: List[str]):
+    active: Set = set()
+    kept = []
+    for url in urls:
+        obj = make(url)
+        kept.append(obj)
+        active.add(obj[1] if isinstance(obj, tuple) else obj)
+    return kept, active
+
+
+def measure(name: str, make: Callable, urls: List[str]):
+    gc.collect()
+    tracemalloc.start()
+    kept = track(make, urls)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    gc.collect()
+    started = time.perf_counter()
+    kept = track(make, urls)
+    elapsed = time.perf_counter() - started
+    del kept
+
+    count = len(urls)
+    print(f'{name:>12}: {current / count:7.1f} bytes/request, {elapsed / count * 1e6:6.2f} us/request')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100000)
+    args = parser.parse_args()
+
+    urls = [f'http://example.com/item/{i}?page={i % 50}' for i in range(args.requests)]
+    for name, make in (('url+uuid', url_uuid), ('request', request), ('request+url', request_url)):
+        measure(name, make, urls)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Micro-benchmark enqueue and dequeue of schedulers.
+
+Usage: python benchmarks/bench_scheduler.py [--requests 1000000] [--schedulers simple priority]
+"""
+import argparse
+import random
+import time
+
+from aio_scrapy.http import Request
+from aio_scrapy.scheduler import PriorityScheduler, SimpleScheduler
+
+SCHEDULERS = {
+    'simple': SimpleScheduler,
+    'priority': PriorityScheduler,
+}
+
+
+def bench(name: str, requests: list):
+    scheduler = SCHEDULERS[name]()
+    count = len(requests)
+
+    started = time.perf_counter()
+    for request in requests:
+        scheduler.enqueue_request(request)
+    enqueue = time.perf_counter() - started
+
+    started = time.perf_counter()
+    while scheduler.next_request() is not None:
+        pass
+    dequeue = time.perf_counter() - started
+
+    print(f'{name:>10}: enqueue {count / enqueue / 1e6:.2f}M req/s, dequeue {count / dequeue / 1e6:.2f}M req/s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000000)
+    parser.add_argument('--schedulers', nargs='+', default=list(SCHEDULERS))
+    args = parser.parse_args()
+
+    random.seed(0)
+    requests = [Request(f'http://example.com/{i}', priority=random.randint(0, 10)) for i in range(args.requests)]
+    print(f'{args.requests} requests with random priorities in [0, 10]')
+    for name in args.schedulers:
+        bench(name, requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
+import asyncio
 from asyncio import AbstractEventLoop
 
 import pytest
 from aiohttp import web
 
+SLOW_SERVER_LATENCY = 0.05
+
 
 @pytest.fixture()
 async def mocker_server(loop: AbstractEventLoop):
@@ -13,7 +16,7 @@ async def mocker_server(loop: AbstractEventLoop):
     :param loop:
     :return:
     """
-    # host = 'localhost'
+    host = '127.0.0.1'
     port = 0
 
     async def handler(request):
@@ -22,10 +25,32 @@ async def mocker_server(loop: AbstractEventLoop):
     server = web.Server(handler)
     runner = web.ServerRunner(server)
     await runner.setup()
-    site = web.TCPSite(runner, port=port)
+    site = web.TCPSite(runner, host=host, port=port)
     # site_task = loop.create_task(site.start())
     await site.start()
     host, port = site._server.sockets[0].getsockname()  # 获取socket实际绑定端口
     server_addr = f'http://{host}:{port}'
     yield server_addr  # 返回访问地址
     await runner.cleanup()
+
+
+@pytest.fixture()
+async def slow_mocker_server(loop: AbstractEventLoop):
+    """
+    和 mocker_server 一样，但每个请求会延迟 SLOW_SERVER_LATENCY 秒后再响应，用于并发吞吐测试。
+    :param loop:
+    :return:
+    """
+
+    async def handler(request):
+        await asyncio.sleep(SLOW_SERVER_LATENCY)
+        return web.Response(text="OK")
+
+    server = web.Server(handler)
+    runner = web.ServerRunner(server)
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}'
+    await runner.cleanup()
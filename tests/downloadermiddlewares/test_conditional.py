@@ -0,0 +1,174 @@
+import asyncio
+from email.utils import formatdate
+
+import pytest
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.downloadermiddlewares.conditional import (Validators,
+                                                          ValidatorStore)
+from aio_scrapy.spiders import BaseSpider
+
+LAST_MODIFIED = formatdate(1600000000, usegmt=True)
+
+
+@pytest.fixture()
+async def catalogue_server(loop):
+    """
+    Server answering `/etag/<i>` with an ETag, `/date/<i>` with Last-Modified and `/plain/<i>` with none,
+    and 304 to a request whose validator matches. Bodies are `version`.
+    :param loop:
+    :return:
+    """
+    state = {'version': 'v1', 'conditional': [], 'bodies': 0}
+
+    async def handler(request):
+        kind = request.path.split('/')[1]
+        headers = {}
+        if kind == 'etag':
+            headers['ETag'] = f'"{state["version"]}"'
+            if request.headers.get('If-None-Match') == headers['ETag']:
+                state['conditional'].append(request.path)
+                return web.Response(status=304, headers=headers)
+        elif kind == 'date':
+            headers['Last-Modified'] = LAST_MODIFIED
+            if request.headers.get('If-Modified-Since') == LAST_MODIFIED:
+                state['conditional'].append(request.path)
+                return web.Response(status=304, headers=headers)
+        state['bodies'] += 1
+        return web.Response(text=state['version'] * 100, headers=headers)
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}', state
+    await runner.cleanup()
+
+
+statuses = []
+
+
+class StatusMiddleware:
+    """
+    Record status of responses, it runs `process_response` after ConditionalRequestMiddleware.
+    """
+
+    def process_response(self, request, response, spider):
+        statuses.append(response.status)
+        return response
+
+
+async def crawl(loop, urls, **settings):
+    parsed = []
+
+    class Spider(BaseSpider):
+        name = 'test'
+        start_urls = urls
+
+        def parse(self, response):
+            parsed.append(response.url.path)
+
+    settings = dict(settings, DOWNLOAD_DELAY=0, CONDITIONAL_ENABLED=True, CONDITIONAL_FLUSH_SIZE=2)
+    crawler = Crawler(Spider, settings=settings, loop=loop)
+    await asyncio.wait_for(crawler.crawl(), timeout=10)
+    return sorted(parsed), crawler.stats
+
+
+@pytest.mark.asyncio
+async def test_validator_store(loop, tmp_path):
+    store = ValidatorStore(str(tmp_path / 'test.sqlite'), flush_size=2)
+    await store.open()
+    validators = Validators('"a"', 1600000000, b'12345678', 10)
+    await store.set(1, validators)
+    assert await store.get(1) == validators
+    await store.set(-2, validators._replace(etag=None, last_modified=None))
+    assert not store.pending
+    assert (await store.get(-2)).etag is None
+    await store.set(3, validators)
+    await store.close()
+
+    store = ValidatorStore(str(tmp_path / 'test.sqlite'))
+    await store.open()
+    assert await store.get(3) == validators
+    assert await store.get(4) is None
+    await store.close()
+
+
+class TestConditionalRequestMiddleware:
+
+    @pytest.mark.asyncio
+    async def test_recrawl(self, loop, tmp_path, catalogue_server):
+        server, state = catalogue_server
+        urls = [f'{server}/{kind}/{i}' for kind in ('etag', 'date', 'plain') for i in range(3)]
+        settings = {'CONDITIONAL_DIR': str(tmp_path)}
+        parsed, stats = await crawl(loop, urls, **settings)
+        assert len(parsed) == 9
+        assert stats.get_value('conditional/not_modified') is None
+
+        # Unchanged pages answer 304 and are not parsed again.
+        parsed, stats = await crawl(loop, urls, **settings)
+        assert parsed == [f'/plain/{i}' for i in range(3)]
+        assert stats.get_value('conditional/not_modified') == 6
+        assert stats.get_value('conditional/bytes_saved') == 6 * 200
+        assert stats.get_value('conditional/unchanged') == 3
+        assert len(state['conditional']) == 6
+
+        # Pages without validators are dropped by their digest if asked to.
+        parsed, stats = await crawl(loop, urls, CONDITIONAL_SKIP_UNCHANGED=True, **settings)
+        assert parsed == []
+
+        # Changed pages are downloaded and parsed.
+        state['version'] = 'v2'
+        parsed, stats = await crawl(loop, urls, CONDITIONAL_SKIP_UNCHANGED=True, **settings)
+        assert parsed == [f'/etag/{i}' for i in range(3)] + [f'/plain/{i}' for i in range(3)]
+        assert stats.get_value('conditional/not_modified') == 3
+
+    @pytest.mark.asyncio
+    async def test_later_middlewares(self, loop, tmp_path, catalogue_server):
+        """
+        Dropped responses still go through `process_response` of middlewares after it.
+        :param loop:
+        :param tmp_path:
+        :param catalogue_server:
+        :return:
+        """
+        server, state = catalogue_server
+        urls = [f'{server}/etag/0', f'{server}/plain/0']
+        settings = {
+            'CONDITIONAL_DIR': str(tmp_path),
+            'CONDITIONAL_SKIP_UNCHANGED': True,
+            'DOWNLOADER_MIDDLEWARES': {'tests.downloadermiddlewares.test_conditional.StatusMiddleware': 100},
+        }
+        await crawl(loop, urls, **settings)
+        statuses.clear()
+        parsed, stats = await crawl(loop, urls, **settings)
+        assert parsed == []
+        assert sorted(statuses) == [200, 304]
+
+    @pytest.mark.asyncio
+    async def test_httpcache(self, loop, tmp_path, catalogue_server):
+        """
+        A 304 is not stored by the http cache, a response served by the cache is not dropped as unchanged.
+        :param loop:
+        :param tmp_path:
+        :param catalogue_server:
+        :return:
+        """
+        server, state = catalogue_server
+        urls = [f'{server}/etag/0', f'{server}/plain/0']
+        settings = {'CONDITIONAL_DIR': str(tmp_path / 'conditional'), 'CONDITIONAL_SKIP_UNCHANGED': True}
+        await crawl(loop, urls, **settings)
+
+        settings.update(HTTPCACHE_ENABLED=True, HTTPCACHE_DIR=str(tmp_path / 'httpcache'))
+        parsed, stats = await crawl(loop, urls, **settings)
+        assert parsed == []
+        assert stats.get_value('httpcache/store') == 1
+        assert stats.get_value('httpcache/uncacheable') == 1
+
+        bodies = state['bodies']
+        parsed, stats = await crawl(loop, urls, **settings)
+        assert parsed == ['/plain/0']
+        assert stats.get_value('httpcache/hit') == 1
+        assert state['bodies'] == bodies
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from aio_scrapy.http import Request, Response
+from aio_scrapy.spiders import BaseSpider
+from aio_scrapy.utils.reqser import request_from_bytes, request_to_bytes
+
+
+@pytest.fixture()
+async def counting_server(loop):
+    """
+    Server answering `text` with `headers`, and 304 to a request whose If-None-Match is the ETag of `headers`.
+    :param loop:
+    :return:
+    """
+    state = {'served': 0, 'text': 'v1', 'headers': {}}
+
+    async def handler(request):
+        state['served'] += 1
+        etag = state['headers'].get('ETag')
+        if etag and request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers=state['headers'])
+        return web.Response(text=state['text'], headers=state['headers'])
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}', state
+    await runner.cleanup()
+
+
+async def crawl(loop, urls, **settings):
+    texts = []
+
+    class Spider(BaseSpider):
+        name = 'test'
+
+        def start_requests(self):
+            for url in urls:
+                yield Request(url)
+
+        def parse(self, response):
+            texts.append((response.status, response.text))
+
+    settings.setdefault('DOWNLOAD_DELAY', 0)
+    crawler = Crawler(Spider, settings=dict(settings, HTTPCACHE_ENABLED=True), loop=loop)
+    await asyncio.wait_for(crawler.crawl(), timeout=10)
+    return sorted(texts), crawler.stats
+
+
+@pytest.mark.parametrize('storage', ['FilesystemCacheStorage', 'SqliteCacheStorage'])
+class TestHttpCacheMiddleware:
+
+    @pytest.mark.asyncio
+    async def test_dummy_policy(self, loop, tmp_path, counting_server, storage):
+        server, state = counting_server
+        urls = [f'{server}/?id={i}' for i in range(5)]
+        settings = {
+            'HTTPCACHE_DIR': str(tmp_path),
+            'HTTPCACHE_STORAGE': f'aio_scrapy.extensions.httpcache.{storage}',
+        }
+        texts, stats = await crawl(loop, urls, **settings)
+        assert texts == [(200, 'v1')] * 5
+        assert (stats.get_value('httpcache/miss'), stats.get_value('httpcache/store')) == (5, 5)
+
+        # Everything is served from cache, the server is not asked again.
+        state['text'] = 'v2'
+        texts, stats = await crawl(loop, urls, **settings)
+        assert texts == [(200, 'v1')] * 5
+        assert stats.get_value('httpcache/hit') == 5
+        assert state['served'] == 5
+
+    @pytest.mark.asyncio
+    async def test_rfc2616_policy(self, loop, tmp_path, counting_server, storage):
+        server, state = counting_server
+        settings = {
+            'HTTPCACHE_DIR': str(tmp_path),
+            'HTTPCACHE_STORAGE': f'aio_scrapy.extensions.httpcache.{storage}',
+            'HTTPCACHE_POLICY': 'aio_scrapy.extensions.httpcache.RFC2616Policy',
+        }
+        state['headers'] = {'Cache-Control': 'max-age=0', 'ETag': '"v1"'}
+        await crawl(loop, [f'{server}/'], **settings)
+
+        # Stale, revalidated by a 304 of the server.
+        state['text'] = 'v2'
+        texts, stats = await crawl(loop, [f'{server}/'], **settings)
+        assert texts == [(200, 'v1')]
+        assert stats.get_value('httpcache/revalidate') == 1
+
+        # Changed, the new response replaces the cached one.
+        state['headers'] = {'Cache-Control': 'max-age=600', 'ETag': '"v2"'}
+        texts, stats = await crawl(loop, [f'{server}/'], **settings)
+        assert texts == [(200, 'v2')]
+        assert stats.get_value('httpcache/invalidate') == 1
+        texts, stats = await crawl(loop, [f'{server}/'], **settings)
+        assert texts == [(200, 'v2')]
+        assert stats.get_value('httpcache/hit') == 1
+        assert state['served'] == 3
+
+        # Responses which must not be stored are not.
+        state['headers'] = {'Cache-Control': 'no-store'}
+        texts, stats = await crawl(loop, [f'{server}/no-store'], **settings)
+        assert stats.get_value('httpcache/uncacheable') == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_response_not_in_meta(self, loop, tmp_path, storage):
+        """
+        A stale cached response waiting for the download is not kept in request meta, so the request can still
+        be serialized.
+        :param loop:
+        :param tmp_path:
+        :param storage:
+        :return:
+        """
+
+        class Spider(BaseSpider):
+            name = 'test'
+
+        settings = {
+            'HTTPCACHE_ENABLED': True,
+            'HTTPCACHE_DIR': str(tmp_path),
+            'HTTPCACHE_STORAGE': f'aio_scrapy.extensions.httpcache.{storage}',
+            'HTTPCACHE_POLICY': 'aio_scrapy.extensions.httpcache.RFC2616Policy',
+        }
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        spider = crawler._create_spider()
+        middleware = HttpCacheMiddleware.from_crawler(crawler)
+        await middleware.open_spider(spider)
+        request = Request('http://example.com/')
+        headers = {'Cache-Control': 'max-age=0', 'ETag': '"v1"'}
+        await middleware.storage.store_response(
+            spider, request, Response('http://example.com/', 200, headers, b'v1', request)
+        )
+
+        request = Request('http://example.com/')
+        assert await middleware.process_request(request, spider) is None
+        assert request_from_bytes(request_to_bytes(request)).meta == request.meta
+        # Still used if the download fails.
+        response = middleware.process_exception(request, asyncio.TimeoutError(), spider)
+        assert (response.body, response.request) == (b'v1', request)
+        assert request.meta['from_cache']
+        assert not middleware.cached
+        await middleware.close_spider(spider)
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.downloadermiddlewares import DownloaderMiddlewareManager
+from aio_scrapy.http import Request, Response
+from aio_scrapy.spiders import BaseSpider
+
+calls = []
+
+
+class SyncMiddleware:
+
+    def process_request(self, request, spider):
+        calls.append('sync request')
+
+    def process_response(self, request, response, spider):
+        calls.append('sync response')
+        return response
+
+
+class AsyncMiddleware:
+
+    async def process_request(self, request, spider):
+        await asyncio.sleep(0)
+        calls.append('async request')
+
+    async def process_response(self, request, response, spider):
+        calls.append('async response')
+        return response
+
+
+class NoHookMiddleware:
+    pass
+
+
+class CachedMiddleware:
+
+    def process_request(self, request, spider):
+        if request.meta.get('cached'):
+            return Response(request.url, body=b'cached', request=request)
+
+
+class RecoverMiddleware:
+
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, ConnectionError):
+            return Response(request.url, status=599, request=request)
+
+
+class RescheduleMiddleware:
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get('rescheduled'):
+            return Request(request.url, meta={'rescheduled': True}, dont_filter=True)
+        return response
+
+
+async def download(request, spider):
+    calls.append('download')
+    if request.meta.get('fail'):
+        raise ConnectionError('reset')
+    return Response(request.url, body=b'OK', request=request)
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+@pytest.mark.asyncio
+async def test_chain_order(loop):
+    manager = DownloaderMiddlewareManager(SyncMiddleware(), NoHookMiddleware(), AsyncMiddleware())
+    response = await manager.download(download, Request('http://example.com'), None)
+    assert response.body == b'OK'
+    assert calls == ['sync request', 'async request', 'download', 'async response', 'sync response']
+    assert len(manager._process_request) == 2
+
+
+@pytest.mark.asyncio
+async def test_no_hooks(loop):
+    manager = DownloaderMiddlewareManager(NoHookMiddleware(), NoHookMiddleware())
+    assert not manager._hooked
+    response = await manager.download(download, Request('http://example.com'), None)
+    assert response.body == b'OK'
+
+
+@pytest.mark.asyncio
+async def test_short_circuit(loop):
+    manager = DownloaderMiddlewareManager(CachedMiddleware(), SyncMiddleware())
+    response = await manager.download(download, Request('http://example.com', meta={'cached': True}), None)
+    assert response.body == b'cached'
+    assert calls == ['sync response']
+
+
+@pytest.mark.asyncio
+async def test_process_exception(loop):
+    manager = DownloaderMiddlewareManager(SyncMiddleware(), RecoverMiddleware())
+    response = await manager.download(download, Request('http://example.com', meta={'fail': True}), None)
+    assert response.status == 599
+    assert calls == ['sync request', 'download', 'sync response']
+
+    manager = DownloaderMiddlewareManager(SyncMiddleware())
+    with pytest.raises(ConnectionError):
+        await manager.download(download, Request('http://example.com', meta={'fail': True}), None)
+
+
+@pytest.mark.asyncio
+async def test_invalid_output(loop):
+    class Invalid:
+        def process_response(self, request, response, spider):
+            return 'text'
+
+    manager = DownloaderMiddlewareManager(Invalid())
+    with pytest.raises(TypeError):
+        await manager.download(download, Request('http://example.com'), None)
+
+
+@pytest.mark.asyncio
+async def test_settings(loop, mocker_server):
+    parsed = []
+
+    class Spider(BaseSpider):
+        name = 'test'
+        start_urls = [mocker_server]
+
+        async def parse(self, response):
+            parsed.append(response.request.meta.get('rescheduled'))
+            return {}
+
+    settings = {
+        'DOWNLOAD_DELAY': 0,
+        'DOWNLOADER_MIDDLEWARES': {
+            'tests.downloadermiddlewares.test_manager.SyncMiddleware': 10,
+            'tests.downloadermiddlewares.test_manager.RescheduleMiddleware': 5,
+            'tests.downloadermiddlewares.test_manager.AsyncMiddleware': None,
+        },
+    }
+    crawler = Crawler(Spider, settings=settings, loop=loop)
+    await asyncio.wait_for(crawler.crawl(), timeout=10)
+    assert parsed == [True]
+    assert calls == ['sync request', 'sync response'] * 2
+    assert crawler.stats.get_value('downloader/request_count') == 2
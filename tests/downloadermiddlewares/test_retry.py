@@ -0,0 +1,183 @@
+import asyncio
+from email.utils import formatdate
+from time import time
+
+import pytest
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.downloadermiddlewares import retry as retry_module
+from aio_scrapy.downloadermiddlewares.retry import (RetryMiddleware,
+                                                    parse_retry_after)
+from aio_scrapy.http import Request, Response
+from aio_scrapy.spiders import BaseSpider
+
+
+@pytest.fixture()
+async def flaky_server(loop):
+    """
+    Server answering 503 to the first `failures` requests of each path and OK to the others.
+    :param loop:
+    :return:
+    """
+    state = {'failures': 2, 'retry_after': None, 'served': {}}
+
+    async def handler(request):
+        served = state['served'][request.path] = state['served'].get(request.path, 0) + 1
+        if served <= state['failures']:
+            headers = {'Retry-After': state['retry_after']} if state['retry_after'] else None
+            return web.Response(status=503, headers=headers)
+        return web.Response(text='OK')
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}', state
+    await runner.cleanup()
+
+
+def make_spider(urls, results):
+    class Spider(BaseSpider):
+        name = 'test'
+
+        def start_requests(self):
+            for url in urls:
+                yield Request(url, errback=self.on_error)
+
+        def parse(self, response):
+            results.append(response.status)
+
+        def on_error(self, failure):
+            results.append(type(failure).__name__)
+
+    return Spider
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(formatdate(time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
+    assert parse_retry_after(formatdate(time() - 30, usegmt=True)) == 0
+
+
+class TestRetryMiddleware:
+
+    @pytest.mark.asyncio
+    async def test_backoff(self, loop):
+        settings = {'RETRY_BACKOFF_BASE': 1, 'RETRY_BACKOFF_MAX': 10, 'RETRY_BACKOFF_JITTER': 0.5}
+        retry = RetryMiddleware(Crawler(BaseSpider, settings=settings, loop=loop))
+        for retries, expected in ((1, 1), (2, 2), (3, 4), (4, 8), (5, 10), (20, 10)):
+            for _ in range(20):
+                assert expected / 2 <= retry.backoff(retries) <= expected
+
+    @pytest.mark.asyncio
+    async def test_retry_response(self, loop):
+        settings = {'RETRY_TIMES': 1, 'RETRY_BACKOFF_JITTER': 0, 'RETRY_HTTP_CODES': [503]}
+        crawler = Crawler(BaseSpider, settings=settings, loop=loop)
+        retry = RetryMiddleware(crawler)
+        request = Request('http://example.com/', meta={'page': 1}, priority=3)
+        response = Response('http://example.com/', status=503, headers={'Retry-After': '5'}, request=request)
+
+        assert retry.process_response(request, Response('http://example.com/', status=404), None).status == 404
+        retried = retry.process_response(request, response, None)
+        assert isinstance(retried, Request)
+        assert retried.meta['page'] == 1
+        assert retried.meta['retry_times'] == 1
+        assert retried.meta['schedule_delay'] == 5
+        assert retried.priority == 2
+        assert retried.dont_filter
+        assert 'retry_times' not in request.meta
+
+        assert retry.process_response(retried, response, None) is response
+        assert crawler.stats.get_value('retry/count') == 1
+        assert crawler.stats.get_value('retry/reason_count/503') == 1
+        assert crawler.stats.get_value('retry/max_reached') == 1
+
+        request.meta['dont_retry'] = True
+        assert retry.process_response(request, response, None) is response
+
+    @pytest.mark.asyncio
+    async def test_retry_exception(self, loop):
+        retry = RetryMiddleware(Crawler(BaseSpider, loop=loop))
+        request = Request('http://example.com/')
+        assert isinstance(retry.process_exception(request, asyncio.TimeoutError(), None), Request)
+        assert isinstance(retry.process_exception(request, ConnectionResetError(), None), Request)
+        assert retry.process_exception(request, ValueError(), None) is None
+
+    @pytest.mark.asyncio
+    async def test_deadline(self, loop, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(retry_module, 'time', lambda: clock[0])
+        settings = {'RETRY_TIMES': 10, 'RETRY_BACKOFF_BASE': 1, 'RETRY_BACKOFF_JITTER': 0, 'RETRY_DEADLINE': 5}
+        crawler = Crawler(BaseSpider, settings=settings, loop=loop)
+        retry = RetryMiddleware(crawler)
+        request = Request('http://example.com/')
+        retry.process_request(request, None)
+        assert request.meta['retry_start'] == 1000
+
+        # Backoff 1, 2 and 4 seconds, the last one would end after the deadline.
+        for retries in (1, 2):
+            request = retry.process_exception(request, asyncio.TimeoutError(), None)
+            assert request.meta['retry_start'] == 1000
+            clock[0] += request.meta['schedule_delay']
+        assert retry.process_exception(request, asyncio.TimeoutError(), None) is None
+        assert crawler.stats.get_value('retry/deadline_reached') == 1
+
+        # Per-request deadline.
+        request = Request('http://example.com/', meta={'retry_deadline': 0.5})
+        assert retry.process_exception(request, asyncio.TimeoutError(), None) is None
+
+    @pytest.mark.asyncio
+    async def test_request_deadline(self, loop, monkeypatch):
+        """
+        A deadline in meta only expires though RETRY_DEADLINE is not set, it counts from the first failure.
+        :param loop:
+        :param monkeypatch:
+        :return:
+        """
+        clock = [1000.0]
+        monkeypatch.setattr(retry_module, 'time', lambda: clock[0])
+        settings = {'RETRY_TIMES': 10, 'RETRY_BACKOFF_BASE': 1, 'RETRY_BACKOFF_JITTER': 0}
+        crawler = Crawler(BaseSpider, settings=settings, loop=loop)
+        retry = RetryMiddleware(crawler)
+        assert not hasattr(retry, 'process_request')
+
+        request = Request('http://example.com/', meta={'retry_deadline': 5})
+        for _ in range(2):
+            request = retry.process_exception(request, asyncio.TimeoutError(), None)
+            assert request.meta['retry_start'] == 1000
+            clock[0] += request.meta['schedule_delay']
+        assert retry.process_exception(request, asyncio.TimeoutError(), None) is None
+        assert crawler.stats.get_value('retry/deadline_reached') == 1
+
+    @pytest.mark.asyncio
+    async def test_crawl(self, loop, flaky_server):
+        server, state = flaky_server
+        results = []
+        settings = {'DOWNLOAD_DELAY': 0, 'RETRY_TIMES': 2, 'RETRY_BACKOFF_BASE': 0.1}
+        crawler = Crawler(make_spider([f'{server}/a', f'{server}/b'], results), settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert results == [200, 200]
+        assert state['served'] == {'/a': 3, '/b': 3}
+        assert crawler.stats.get_value('retry/count') == 4
+        assert crawler.stats.get_value('retry/reason_count/503') == 4
+        assert crawler.stats.get_value('retry/max_reached') is None
+
+    @pytest.mark.asyncio
+    async def test_crawl_give_up(self, loop, flaky_server):
+        server, state = flaky_server
+        state.update(failures=10, retry_after='0')
+        results = []
+        settings = {'DOWNLOAD_DELAY': 0, 'RETRY_TIMES': 1, 'RETRY_BACKOFF_BASE': 0.05}
+        crawler = Crawler(make_spider([f'{server}/a', 'http://127.0.0.1:1/'], results), settings=settings, loop=loop)
+        started = time()
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert sorted(results, key=str) == [503, 'ClientConnectorError']
+        assert state['served'] == {'/a': 2}
+        assert crawler.stats.get_value('retry/count') == 2
+        assert crawler.stats.get_value('retry/max_reached') == 2
+        assert time() - started < 5
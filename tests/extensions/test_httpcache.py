@@ -0,0 +1,117 @@
+import os
+from email.utils import formatdate
+from time import time
+
+import pytest
+
+from aio_scrapy.extensions.httpcache import (FilesystemCacheStorage,
+                                             RFC2616Policy, SqliteCacheStorage,
+                                             parse_cache_control)
+from aio_scrapy.http import Request, Response
+from aio_scrapy.settings import Settings
+from aio_scrapy.spiders import BaseSpider
+
+
+def make_settings(**kwargs) -> Settings:
+    settings = Settings()
+    settings.update(kwargs)
+    return settings
+
+
+def test_parse_cache_control():
+    assert parse_cache_control(None) == {}
+    assert parse_cache_control('public, max-age=3600, no-cache="Set-Cookie"') == {
+        'public': None, 'max-age': '3600', 'no-cache': 'Set-Cookie'
+    }
+
+
+class TestRFC2616Policy:
+
+    def test_should_cache(self):
+        policy = RFC2616Policy(make_settings())
+        request = Request('http://example.com/')
+        assert policy.should_cache_request(request)
+        assert not policy.should_cache_request(Request('http://example.com/', headers={'Cache-Control': 'no-store'}))
+        assert not policy.should_cache_request(Request('file:///tmp/a'))
+
+        response = Response('http://example.com/', headers={'Cache-Control': 'max-age=10'})
+        assert policy.should_cache_response(response, request)
+        assert policy.should_cache_response(Response('http://example.com/', headers={'ETag': '"a"'}), request)
+        assert policy.should_cache_response(Response('http://example.com/', status=301), request)
+        assert not policy.should_cache_response(Response('http://example.com/'), request)
+        assert not policy.should_cache_response(
+            Response('http://example.com/', headers={'Cache-Control': 'no-store, max-age=10'}), request
+        )
+        assert not policy.should_cache_response(Response('http://example.com/', status=304), request)
+        assert RFC2616Policy(make_settings(HTTPCACHE_ALWAYS_STORE=True)).should_cache_response(
+            Response('http://example.com/'), request
+        )
+
+    def test_freshness(self):
+        policy = RFC2616Policy(make_settings())
+        now = time()
+
+        def cached(**headers):
+            headers.setdefault('Date', formatdate(now - 100, usegmt=True))
+            return Response('http://example.com/', headers={k.replace('_', '-'): v for k, v in headers.items()})
+
+        assert policy.is_cached_response_fresh(cached(Cache_Control='max-age=200'), Request('http://example.com/'))
+        assert policy.is_cached_response_fresh(
+            cached(Expires=formatdate(now + 100, usegmt=True)), Request('http://example.com/')
+        )
+        # Heuristic freshness is a tenth of the time since last modification.
+        assert policy.is_cached_response_fresh(
+            cached(Last_Modified=formatdate(now - 2000, usegmt=True)), Request('http://example.com/')
+        )
+        assert not policy.is_cached_response_fresh(
+            cached(Last_Modified=formatdate(now - 500, usegmt=True)), Request('http://example.com/')
+        )
+        assert not policy.is_cached_response_fresh(
+            cached(Cache_Control='max-age=200'), Request('http://example.com/', headers={'Cache-Control': 'max-age=50'})
+        )
+        assert policy.is_cached_response_fresh(
+            cached(Cache_Control='max-age=50'), Request('http://example.com/', headers={'Cache-Control': 'max-stale'})
+        )
+
+        # A stale response is revalidated.
+        request = Request('http://example.com/')
+        response = cached(Cache_Control='max-age=50', ETag='"v1"', Last_Modified=formatdate(now - 500, usegmt=True))
+        assert not policy.is_cached_response_fresh(response, request)
+        assert request.headers['If-None-Match'] == '"v1"'
+        assert request.headers['If-Modified-Since'] == response.headers['Last-Modified']
+        assert policy.is_cached_response_valid(response, Response('http://example.com/', status=304), request)
+        assert policy.is_cached_response_valid(response, Response('http://example.com/', status=503), request)
+        assert not policy.is_cached_response_valid(response, Response('http://example.com/'), request)
+
+
+@pytest.mark.parametrize('storage_cls', [FilesystemCacheStorage, SqliteCacheStorage])
+class TestCacheStorage:
+
+    @pytest.mark.asyncio
+    async def test_store_retrieve(self, loop, tmp_path, storage_cls):
+        storage = storage_cls(make_settings(HTTPCACHE_DIR=str(tmp_path), HTTPCACHE_EXPIRATION_SECS=0))
+        spider = BaseSpider('test')
+        await storage.open_spider(spider)
+        request = Request('http://example.com/a')
+        assert await storage.retrieve_response(spider, request) is None
+        response = Response('http://example.com/a', 203, {'X-A': '1', 'x-b': '2'}, memoryview(b'body'), request)
+        await storage.store_response(spider, request, response)
+
+        cached = await storage.retrieve_response(spider, Request('http://example.com/a'))
+        assert (str(cached.url), cached.status, cached.body) == ('http://example.com/a', 203, b'body')
+        assert cached.headers['x-a'] == '1'
+        assert await storage.retrieve_response(spider, Request('http://example.com/a', method='POST')) is None
+        await storage.close_spider(spider)
+        assert os.listdir(tmp_path)
+
+    @pytest.mark.asyncio
+    async def test_expiration(self, loop, tmp_path, storage_cls):
+        storage = storage_cls(make_settings(HTTPCACHE_DIR=str(tmp_path), HTTPCACHE_EXPIRATION_SECS=60))
+        spider = BaseSpider('test')
+        await storage.open_spider(spider)
+        request = Request('http://example.com/a')
+        await storage.store_response(spider, request, Response('http://example.com/a', body=b'body'))
+        assert await storage.retrieve_response(spider, request) is not None
+        storage.expiration_secs = 0.000001
+        assert await storage.retrieve_response(spider, request) is None
+        await storage.close_spider(spider)
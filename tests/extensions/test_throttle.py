@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.downloader import Slot
+from aio_scrapy.extensions.throttle import AutoThrottle
+from aio_scrapy.spiders import BaseSpider
+
+
+@pytest.fixture()
+async def variable_latency_server(loop):
+    """
+    Server answering the first `switch_after` requests after `fast` seconds and the others after `slow` seconds.
+    :param loop:
+    :return:
+    """
+    latency = {'fast': 0.01, 'slow': 0.1, 'switch_after': 10, 'served': 0}
+
+    async def handler(request):
+        latency['served'] += 1
+        slow = latency['served'] > latency['switch_after']
+        await asyncio.sleep(latency['slow'] if slow else latency['fast'])
+        return web.Response(text='OK')
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}', latency
+    await runner.cleanup()
+
+
+class TestAutoThrottle:
+
+    @pytest.mark.asyncio
+    async def test_disabled(self, loop):
+        crawler = Crawler(BaseSpider, loop=loop)
+        assert not any(isinstance(extension, AutoThrottle) for extension in crawler.extensions.middlewares)
+
+    @pytest.mark.asyncio
+    async def test_adjust(self, loop):
+        settings = {
+            'AUTOTHROTTLE_ENABLED': True,
+            'AUTOTHROTTLE_TARGET_CONCURRENCY': 2,
+            'AUTOTHROTTLE_MAX_DELAY': 1,
+            'DOWNLOAD_DELAY': 0.01,
+        }
+        crawler = Crawler(BaseSpider, settings=settings, loop=loop)
+        throttle, = crawler.extensions.middlewares
+        slot = Slot(8, 5, False)
+
+        for _ in range(30):
+            throttle.adjust(slot, 0.4)
+        assert slot.delay == pytest.approx(0.2)
+        assert slot.concurrency == 2
+
+        # Fast error responses do not lower the delay.
+        for _ in range(30):
+            throttle.adjust(slot, 0.01, 503)
+        assert slot.delay == pytest.approx(0.2)
+
+        for _ in range(30):
+            throttle.adjust(slot, 0.04)
+        assert slot.delay == pytest.approx(0.02, rel=0.01)
+
+        # Delay is bounded by DOWNLOAD_DELAY and AUTOTHROTTLE_MAX_DELAY.
+        for _ in range(30):
+            throttle.adjust(slot, 0.001)
+        assert slot.delay == 0.01
+        assert slot.concurrency == 1
+        throttle.adjust(slot, 100)
+        assert slot.delay == 1
+        assert slot.concurrency == 2
+
+    @pytest.mark.asyncio
+    async def test_converge(self, loop, variable_latency_server):
+        server, latency = variable_latency_server
+        count, start_delay = 30, 1
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{server}/?id={i}' for i in range(count)]
+
+            async def parse(self, response):
+                return {}
+
+        settings = {
+            'AUTOTHROTTLE_ENABLED': True,
+            'AUTOTHROTTLE_TARGET_CONCURRENCY': 2,
+            'AUTOTHROTTLE_START_DELAY': start_delay,
+            'AUTOTHROTTLE_EWMA_ALPHA': 0.5,
+            'DOWNLOAD_DELAY': 0,
+        }
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        started = loop.time()
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert latency['served'] == count
+        # Only the first request waits for the start delay.
+        assert loop.time() - started < start_delay + count * latency['slow']
+        slot, = crawler.engine.downloader.slots.values()
+        # Latency went from 10ms to 100ms, so delay should follow it up to 100ms / 2.
+        assert 0.03 < slot.delay < 0.07
+        assert slot.concurrency == 2
@@ -0,0 +1,63 @@
+import pytest
+from yarl import URL
+
+from aio_scrapy.http import Request
+from aio_scrapy.utils.reqser import (records_to_requests, request_from_bytes,
+                                     request_to_bytes, requests_to_records)
+
+
+class Spider:
+
+    def parse_detail(self, response):
+        pass
+
+
+def test_lazy_attributes():
+    request = Request('http://example.com/a')
+    assert request._url == 'http://example.com/a'
+    assert request.url == URL('http://example.com/a')
+    assert request.url is request.url
+    assert request._headers is None and request._meta is None
+    request.meta['depth'] = 1
+    assert request.meta == {'depth': 1}
+    assert request.method == 'GET' and request.body == b''
+    assert Request('http://example.com', method='post', body='中').body == '中'.encode()
+
+
+def test_identity():
+    a, b = Request('http://example.com'), Request('http://example.com')
+    assert a != b
+    assert len({a, b}) == 2
+    with pytest.raises(AttributeError):
+        a.foo = 1
+
+
+def test_serialize_plain():
+    request = Request('http://example.com/a', priority=-3, dont_filter=True)
+    data = request_to_bytes(request)
+    restored = request_from_bytes(data)
+    assert (str(restored.url), restored.priority, restored.dont_filter) == ('http://example.com/a', -3, True)
+    assert restored.callback is None and restored._meta is None
+
+
+def test_serialize_full():
+    spider = Spider()
+    request = Request(
+        'http://example.com/a',
+        callback=spider.parse_detail,
+        method='POST',
+        headers={'Content-Type': 'application/json'},
+        body=b'{}',
+        meta={'depth': 2},
+        priority=5,
+        errback='on_error',
+    )
+    restored, = records_to_requests(requests_to_records([request]))[0]
+    assert restored.callback == 'parse_detail'
+    assert restored.errback == 'on_error'
+    assert (restored.method, restored.headers, restored.body, restored.meta, restored.priority) == (
+        'POST', {'Content-Type': 'application/json'}, b'{}', {'depth': 2}, 5
+    )
+
+    with pytest.raises(ValueError):
+        request_to_bytes(Request('http://example.com', callback=lambda response: None))
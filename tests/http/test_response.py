@@ -0,0 +1,42 @@
+import pytest
+
+from aio_scrapy.http import Response
+
+
+def test_text_encoding():
+    body = '中文'.encode('gbk')
+    response = Response('http://example.com', headers={'Content-Type': 'text/html; charset=GBK'}, body=body)
+    assert response.encoding == 'gbk'
+    assert response.text == '中文'
+    assert response.text is response.text
+
+    assert Response('http://example.com', body='中文'.encode()).text == '中文'
+    response = Response('http://example.com', headers={'content-type': 'text/html; charset=unknown'}, body=b'a')
+    assert response.encoding == 'utf-8'
+
+
+def test_memoryview_body():
+    response = Response('http://example.com', body=memoryview(b'{"a": [1, 2]}'))
+    assert response.text == '{"a": [1, 2]}'
+
+
+def test_json():
+    calls = []
+
+    def loads(text):
+        calls.append(text)
+        return None
+
+    response = Response('http://example.com', body=b'null')
+    assert response.json(loads) is None
+    assert response.json(loads) is None
+    assert len(calls) == 1
+    assert Response('http://example.com', body=b'{"a": 1}').json() == {'a': 1}
+
+
+def test_slots():
+    response = Response('http://example.com')
+    with pytest.raises(AttributeError):
+        response.foo = 1
+    assert response.headers.get('X-Missing') is None
+    assert str(response) == '<200 http://example.com>'
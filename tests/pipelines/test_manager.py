@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.exceptions import DropItem
+from aio_scrapy.pipelines import ItemPipelineManager
+from aio_scrapy.pipelines.base import BasePipeline
+from aio_scrapy.spiders import BaseSpider
+
+batches = []
+events = []
+
+
+class TagPipeline(BasePipeline):
+
+    async def process_item(self, item, spider):
+        item['tagged'] = True
+        return item
+
+
+class BatchPipeline(BasePipeline):
+
+    async def open_spider(self, spider):
+        events.append('open')
+
+    async def process_items(self, items, spider):
+        batches.append([item['i'] for item in items])
+        return [DropItem('odd') if item['i'] % 2 else dict(item, batched=True) for item in items]
+
+    async def close_spider(self, spider):
+        events.append('close')
+
+
+class SlowPipeline(BasePipeline):
+
+    async def process_item(self, item, spider):
+        await asyncio.sleep(0.02)
+        return item
+
+
+class FailingPipeline(BasePipeline):
+
+    async def process_items(self, items, spider):
+        raise ValueError('database is down')
+
+
+@pytest.fixture()
+def records():
+    batches.clear()
+    events.clear()
+    yield batches, events
+
+
+def create_manager(*pipelines, size=3, timeout=0.05):
+    manager = ItemPipelineManager(*pipelines)
+    manager.batch_size = size
+    manager.batch_timeout = timeout
+    return manager
+
+
+class TestItemPipelineManager:
+
+    @pytest.mark.asyncio
+    async def test_batch(self, loop, records):
+        manager = create_manager(TagPipeline(), BatchPipeline())
+        spider = BaseSpider('test')
+        results = await asyncio.gather(
+            *[manager.process_item({'i': i}, spider) for i in range(7)], return_exceptions=True
+        )
+        # Two full batches, and one flushed by timeout.
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+        assert results[0] == {'i': 0, 'tagged': True, 'batched': True}
+        assert isinstance(results[1], DropItem)
+        assert [i for i, result in enumerate(results) if isinstance(result, dict)] == [0, 2, 4, 6]
+
+        # A failed batch fails each of its items.
+        manager = create_manager(FailingPipeline(), size=2)
+        results = await asyncio.gather(
+            *[manager.process_item({'i': i}, spider) for i in range(2)], return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_flush_on_close(self, loop, records):
+        manager = create_manager(BatchPipeline(), TagPipeline(), BatchPipeline(), timeout=60)
+        spider = BaseSpider('test')
+        await manager.open_spider(spider)
+        tasks = [loop.create_task(manager.process_item({'i': i}, spider)) for i in (0, 2)]
+        await asyncio.sleep(0)
+        assert batches == []
+        await manager.close_spider(spider)
+        results = await asyncio.gather(*tasks)
+        assert batches == [[0, 2], [0, 2]]
+        assert results == [{'i': i, 'batched': True, 'tagged': True} for i in (0, 2)]
+        assert events == ['open', 'open', 'close', 'close']
+
+    @pytest.mark.asyncio
+    async def test_flush_on_close_async(self, loop, records):
+        """
+        Items flushed on close reach the next batch through an async pipeline before that one is flushed.
+        :param loop:
+        :param records:
+        :return:
+        """
+        manager = create_manager(BatchPipeline(), SlowPipeline(), BatchPipeline(), timeout=60)
+        spider = BaseSpider('test')
+        await manager.open_spider(spider)
+        tasks = [loop.create_task(manager.process_item({'i': i}, spider)) for i in (0, 2)]
+        await asyncio.sleep(0)
+        await asyncio.wait_for(manager.close_spider(spider), timeout=5)
+        assert all(task.done() for task in tasks)
+        assert batches == [[0, 2], [0, 2]]
+        assert manager.in_chain == 0
+
+
+@pytest.mark.asyncio
+async def test_crawl_with_batches(loop, mocker_server, records):
+
+    class Spider(BaseSpider):
+        name = 'test'
+        start_urls = [mocker_server]
+
+        async def parse(self, response):
+            for i in range(25):
+                yield {'i': i}
+
+    settings = {
+        'DOWNLOAD_DELAY': 0,
+        'ITEM_PIPELINES': {
+            'tests.pipelines.test_manager.BatchPipeline': 200,
+            'tests.pipelines.test_manager.TagPipeline': 100,
+        },
+        'ITEM_BATCH_SIZE': 10,
+        'ITEM_BATCH_TIMEOUT': 0.05,
+    }
+    crawler = Crawler(Spider, settings=settings, loop=loop)
+    await asyncio.wait_for(crawler.crawl(), timeout=10)
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert crawler.stats.get_value('item_scraped_count') == 13
+    assert crawler.stats.get_value('item_dropped_count') == 12
+    assert events == ['open', 'close']
@@ -1,7 +1,14 @@
+import asyncio
+import os
+
 import pytest
+from yarl import URL
 
-from proxypool.scrapy.crawler import Crawler
-from proxypool.scrapy.spiders import BaseSpider
+from aio_scrapy.crawler import Crawler, CrawlerRunner
+from aio_scrapy.http import Request
+from aio_scrapy.spiders import BaseSpider
+from aio_scrapy.utils.job import read_requests
+from aio_scrapy.utils.shard import host_shard
 
 
 class TestCrawler:
@@ -18,5 +25,176 @@ class TestCrawler:
         await crawler.crawl()
 
 
+class ShardedSpider(BaseSpider):
+    """
+    Workers of CrawlerRunner import it. Its first page links to `foreign`, a host of another worker.
+    """
+    name = 'test'
+
+    def parse(self, response):
+        if response.request.meta.get('followed'):
+            return {'url': str(response.url)}
+        return [
+            {'url': str(response.url)},
+            Request(self.foreign, meta={'followed': True}),
+        ]
+
+
+class CrashingSpider(BaseSpider):
+    name = 'test'
+
+    def parse(self, response):
+        os._exit(3)
+
+
 class TestCrawlerRunner:
-    pass
+
+    @pytest.mark.asyncio
+    async def test_crawl_workers(self, loop, mocker_server):
+        count = 6
+        # 127.0.0.1 and localhost are hosts of different workers.
+        assert host_shard(URL(mocker_server), 2) != host_shard(URL(mocker_server.replace('127.0.0.1', 'localhost')), 2)
+        foreign = mocker_server.replace('127.0.0.1', 'localhost') + '/?followed=1'
+
+        settings = {'DOWNLOAD_DELAY': 0, 'ENGINE_HEARTBEAT_INTERVAL': 0.2}
+        runner = CrawlerRunner(settings, loop=loop, workers=2)
+        runner.crawl(ShardedSpider, start_urls=[f'{mocker_server}?id={i}' for i in range(count)], foreign=foreign)
+        await asyncio.wait_for(runner.join(), timeout=30)
+
+        stats = runner.stats['test']
+        # Every start url has one host, so exactly one worker crawls them. Their link to the host of the other
+        # worker is sent to it, and crawled once.
+        assert stats['response_received_count'] == count + 1
+        assert stats['item_scraped_count'] == count + 1
+        assert stats['shard/foreign_sent'] == count
+        assert stats['shard/foreign_received'] == count
+        assert stats['dupefilter/filtered'] == count - 1
+        assert stats['finish_reason'] == 'finished'
+
+    @pytest.mark.asyncio
+    async def test_failed_worker(self, loop, mocker_server):
+        """
+        A worker which dies fails the crawl, the other one waiting for it is terminated.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+        runner = CrawlerRunner({'DOWNLOAD_DELAY': 0, 'ENGINE_HEARTBEAT_INTERVAL': 0.2}, loop=loop, workers=2)
+        runner.crawl(CrashingSpider, start_urls=[mocker_server])
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(runner.join(), timeout=30)
+
+    @pytest.mark.asyncio
+    async def test_foreign_requests(self, loop, mocker_server):
+        """
+        Without workers to send them to, requests of hosts of other shards are crawled here.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+        index = host_shard(URL(mocker_server), 2)
+        foreign = mocker_server.replace('127.0.0.1', 'localhost')
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [mocker_server]
+
+            def parse(self, response):
+                if response.request.meta.get('followed'):
+                    return None
+                return [Request(f'{foreign}/', meta={'followed': True})]
+
+        settings = {'DOWNLOAD_DELAY': 0, 'SHARD_COUNT': 2, 'SHARD_INDEX': index}
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert crawler.stats.get_value('response_received_count') == 2
+
+
+class TestResumeCrawl:
+
+    @pytest.mark.asyncio
+    async def test_jobdir(self, loop, mocker_server, tmp_path):
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{mocker_server}?id={i}' for i in range(3)]
+
+            def parse(self, response):
+                self.state['parsed'] = self.state.get('parsed', 0) + 1
+                return {}
+
+        settings = {'DOWNLOAD_DELAY': 0, 'JOBDIR': str(tmp_path)}
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert crawler.spider.state == {'parsed': 3}
+        assert {'requests.queue', 'requests.seen', 'spider.state'} <= set(p.name for p in tmp_path.iterdir())
+
+        # Seen requests are not crawled again, spider state is restored.
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert crawler.stats.get_value('response_received_count') is None
+        assert crawler.stats.get_value('dupefilter/filtered') == 3
+        assert crawler.spider.state == {'parsed': 3}
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_on_close(self, loop, slow_mocker_server, tmp_path):
+        """
+        Periodic checkpoints run while crawling, the one in progress on close does not overwrite the final one.
+        :param loop:
+        :param slow_mocker_server:
+        :param tmp_path:
+        :return:
+        """
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{slow_mocker_server}?id={i}' for i in range(20)]
+
+            def parse(self, response):
+                return None
+
+        settings = {'DOWNLOAD_DELAY': 0, 'JOBDIR': str(tmp_path), 'JOBDIR_CHECKPOINT_INTERVAL': 0.001}
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert crawler.stats.get_value('response_received_count') == 20
+        assert not [p.name for p in tmp_path.iterdir() if p.name.endswith('.tmp')]
+
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert crawler.stats.get_value('dupefilter/filtered') == 20
+
+    @pytest.mark.asyncio
+    async def test_close_with_unserializable(self, loop, slow_mocker_server, tmp_path):
+        """
+        Pending requests which can not be persisted are skipped on close, the crawl still stops.
+        :param loop:
+        :param slow_mocker_server:
+        :param tmp_path:
+        :return:
+        """
+        persisted = {f'{slow_mocker_server}/?id={i}' for i in range(0, 20, 2)}
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [slow_mocker_server]
+
+            def parse(self, response):
+                if response.request.meta.get('followed'):
+                    return None
+                return [
+                    Request(
+                        f'{slow_mocker_server}/?id={i}',
+                        callback=self.parse if i % 2 == 0 else lambda r: None,
+                        meta={'followed': True}
+                    )
+                    for i in range(20)
+                ]
+
+        settings = {'DOWNLOAD_DELAY': 0, 'CONCURRENT_REQUESTS': 1, 'JOBDIR': str(tmp_path)}
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        task = loop.create_task(crawler.crawl())
+        while (crawler.stats.get_value('response_received_count') or 0) < 2:
+            await asyncio.sleep(0.01)
+        await crawler.engine.close_spider(crawler.spider, 'shutdown')
+        await asyncio.wait_for(task, timeout=10)
+        assert crawler.stats.get_value('finish_reason') == 'shutdown'
+        restored = read_requests(str(tmp_path / 'requests.queue'))
+        assert restored and {str(request.url) for request in restored} <= persisted
@@ -0,0 +1,480 @@
+import asyncio
+import socket
+from time import monotonic
+
+import pytest
+from aiohttp import web
+from aiohttp.abc import AbstractResolver
+from yarl import URL
+
+from aio_scrapy import signals
+from aio_scrapy.crawler import Crawler, CrawlerRunner
+from aio_scrapy.downloader import STREAM_WRITE_SIZE, CircuitBreaker, Slot
+from aio_scrapy.exceptions import DownloadSizeExceeded
+from aio_scrapy.http import Request
+from aio_scrapy.spiders import BaseSpider
+from tests.conftest import SLOW_SERVER_LATENCY
+
+
+class BrokenResolver(AbstractResolver):
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        raise ValueError(f'Broken resolver for {host}')
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture()
+async def sized_server(loop):
+    """
+    Server answering `/<size>` with a body of `size` bytes, `/chunked/<size>` without Content-Length.
+    :param loop:
+    :return:
+    """
+
+    async def handler(request):
+        chunked, size = request.path.startswith('/chunked/'), int(request.path.rsplit('/', 1)[1])
+        body = bytes(i % 251 for i in range(size))
+        if not chunked:
+            return web.Response(body=body)
+        response = web.StreamResponse()
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        for i in range(0, size, 64 * 1024):
+            await response.write(body[i:i + 64 * 1024])
+        await response.write_eof()
+        return response
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}'
+    await runner.cleanup()
+
+
+@pytest.fixture()
+async def counting_server(loop):
+    """
+    Server answering after SLOW_SERVER_LATENCY seconds, and the number of requests it served.
+    :param loop:
+    :return:
+    """
+    served = []
+
+    async def handler(request):
+        served.append(request.path_qs)
+        await asyncio.sleep(SLOW_SERVER_LATENCY)
+        return web.Response(text=request.path_qs)
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}', served
+    await runner.cleanup()
+
+
+def test_slot_download_delay():
+    assert Slot(1, 2, False).download_delay() == 2
+    delays = [Slot(1, 2, True).download_delay() for _ in range(100)]
+    assert all(1 <= delay <= 3 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(window=10, threshold=0.5, min_requests=4, cooldown=5)
+    probe, other = object(), object()
+    for now, failed in ((0, True), (1, False), (2, True)):
+        breaker.record(other, failed, now)
+    assert breaker.state == CircuitBreaker.CLOSED
+    # Outcomes older than the window are dropped.
+    breaker.record(other, False, 11)
+    breaker.record(other, True, 11.5)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(other, True, 12)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.can_transfer(16)
+
+    # Half-open lets a single probe through, other transfers finishing meanwhile do not count.
+    assert breaker.can_transfer(17)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.probe = probe
+    assert not breaker.can_transfer(17)
+    breaker.record(other, False, 18)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record(probe, True, 18)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_at == 23
+
+    assert breaker.can_transfer(23)
+    breaker.probe = probe
+    breaker.record(probe, False, 24)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.can_transfer(24)
+
+
+class TestDownloader:
+
+    @pytest.mark.asyncio
+    async def test_slot_settings(self, loop):
+        settings = {
+            'DOWNLOAD_DELAY': 1,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 4,
+            'DOWNLOAD_SLOTS': {'example.com': {'concurrency': 1, 'delay': 3}},
+        }
+        crawler = Crawler(BaseSpider, settings=settings, loop=loop)
+        downloader = crawler.engine.downloader
+        slot = downloader.get_slot(downloader.get_slot_key(Request('http://example.com/a')))
+        assert (slot.concurrency, slot.delay) == (1, 3)
+        slot = downloader.get_slot(downloader.get_slot_key(Request('http://example.org:8080/a')))
+        assert (slot.concurrency, slot.delay) == (4, 1)
+        assert set(downloader.slots) == {'example.com', 'example.org'}
+        await downloader.close()
+
+    @pytest.mark.asyncio
+    async def test_slow_host_does_not_throttle_others(self, loop, mocker_server):
+        """
+        Requests to `localhost` are delayed by its slot, requests to `127.0.0.1` are not held up by them.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+        delay = 0.3
+        port = URL(mocker_server).port
+        seen = {'localhost': [], '127.0.0.1': []}
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [
+                f'http://{host}:{port}/?id={i}'
+                for i in range(20)
+                for host in (['localhost', '127.0.0.1'] if i < 4 else ['127.0.0.1'])
+            ]
+
+            async def parse(self, response):
+                seen[response.url.host].append(monotonic())
+                return {}
+
+        settings = {'DOWNLOAD_DELAY': 0, 'DOWNLOAD_SLOTS': {'localhost': {'delay': delay}}}
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        slow, fast = seen['localhost'], seen['127.0.0.1']
+        assert (len(slow), len(fast)) == (4, 20)
+        assert max(fast) < slow[1]
+        assert all(b - a >= delay * 0.9 for a, b in zip(slow, slow[1:]))
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_per_domain(self, loop, slow_mocker_server):
+        count, per_domain = 10, 2
+        transferring = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{slow_mocker_server}/?id={i}' for i in range(count)]
+
+            async def parse(self, response):
+                slot = self.crawler.engine.downloader.slots[response.url.host]
+                transferring.append(len(slot.transferring))
+                return {}
+
+        settings = {'DOWNLOAD_DELAY': 0, 'CONCURRENT_REQUESTS': 10, 'CONCURRENT_REQUESTS_PER_DOMAIN': per_domain}
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        started = loop.time()
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert loop.time() - started >= count / per_domain * SLOW_SERVER_LATENCY
+        assert len(transferring) == count
+        assert max(transferring) <= per_domain
+
+    @pytest.mark.asyncio
+    async def test_connection_released(self, loop, mocker_server):
+        """
+        Body is read by downloader, a spider which never touches it does not hold connections of the pool.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+        responses = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{mocker_server}/?id={i}' for i in range(5)]
+
+            async def parse(self, response):
+                responses.append(response)
+                return {}
+
+        settings = {'DOWNLOAD_DELAY': 0, 'CONCURRENT_REQUESTS': 1}
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert len(responses) == 5
+        assert all(response.body == b'OK' and response.text == 'OK' for response in responses)
+        assert responses[0].request.url == responses[0].url
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker(self, loop, mocker_server):
+        """
+        Requests to a dead host are parked once its circuit opened, requests to others are not held up
+        even though the dead ones exceed CONCURRENT_REQUESTS.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+        results = {'ok': 0, 'error': 0}
+        states = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+
+            def start_requests(self):
+                for i in range(6):
+                    yield Request(f'http://localhost:1/?id={i}', errback=self.on_error)
+                for i in range(10):
+                    yield Request(f'{mocker_server}/?id={i}')
+
+            async def parse(self, response):
+                results['ok'] += 1
+
+            async def on_error(self, failure):
+                results['error'] += 1
+
+        async def circuit_state_changed(key, state):
+            states.append((key, state))
+
+        settings = {
+            'DOWNLOAD_DELAY': 0,
+            'CONCURRENT_REQUESTS': 4,
+            'RETRY_ENABLED': False,
+            'CIRCUIT_BREAKER_ENABLED': True,
+            'CIRCUIT_BREAKER_MIN_REQUESTS': 2,
+            'CIRCUIT_BREAKER_COOLDOWN': 0.2,
+        }
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        crawler.signals.connect(circuit_state_changed, signals.circuit_state_changed)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert results == {'ok': 10, 'error': 6}
+        assert states[:2] == [('localhost', 'open'), ('localhost', 'half_open')]
+        assert crawler.stats.get_value('circuit_breaker/open') >= 2
+        assert crawler.stats.get_value('circuit_breaker/open_slots') == 1
+        crawler.signals.disconnect_all(signals.circuit_state_changed)
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker_parked_requests(self, loop, mocker_server):
+        """
+        With default concurrency, requests parked behind an open circuit do not fill the engine, requests to a
+        healthy host are downloaded at once though the cooldown is long.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+        done = loop.create_future()
+        ok = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+
+            def start_requests(self):
+                for i in range(12):
+                    yield Request(f'http://localhost:1/?id={i}', errback=self.on_error)
+                for i in range(10):
+                    yield Request(f'{mocker_server}/?id={i}')
+
+            async def parse(self, response):
+                ok.append(monotonic())
+                if len(ok) == 10:
+                    done.set_result(None)
+
+            async def on_error(self, failure):
+                pass
+
+        settings = {
+            'DOWNLOAD_DELAY': 0,
+            'RETRY_ENABLED': False,
+            'CIRCUIT_BREAKER_ENABLED': True,
+            'CIRCUIT_BREAKER_MIN_REQUESTS': 2,
+            'CIRCUIT_BREAKER_COOLDOWN': 60,
+        }
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        started = monotonic()
+        crawl = loop.create_task(crawler.crawl())
+        try:
+            await asyncio.wait_for(asyncio.shield(done), timeout=5)
+            parked = crawler.engine.downloader.parked()
+        finally:
+            await crawler.engine.close_spider(crawler.spider, 'test')
+            await asyncio.wait_for(crawl, timeout=5)
+        assert ok[-1] - started < 1
+        assert parked > 0
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker_parked_limit(self, loop):
+        """
+        Requests parked beyond the slot's concurrency count against CONCURRENT_REQUESTS, so requests to a dead host
+        stay in the scheduler instead of piling up in the slot.
+        :param loop:
+        :return:
+        """
+        class Spider(BaseSpider):
+            name = 'test'
+
+            def start_requests(self):
+                for i in range(100):
+                    yield Request(f'http://localhost:1/?id={i}', errback=self.on_error)
+
+            async def on_error(self, failure):
+                pass
+
+        settings = {
+            'DOWNLOAD_DELAY': 0,
+            'CONCURRENT_REQUESTS': 4,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
+            'RETRY_ENABLED': False,
+            'CIRCUIT_BREAKER_ENABLED': True,
+            'CIRCUIT_BREAKER_MIN_REQUESTS': 2,
+            'CIRCUIT_BREAKER_COOLDOWN': 60,
+        }
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        crawl = loop.create_task(crawler.crawl())
+        try:
+            while crawler.stats.get_value('circuit_breaker/open_slots') != 1:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.5)
+            queued = len(crawler.engine.downloader.slots['localhost'].queue)
+            pending = len(crawler.engine.scheduler)
+        finally:
+            await crawler.engine.close_spider(crawler.spider, 'test')
+            await asyncio.wait_for(crawl, timeout=5)
+        assert queued == 2 + 4
+        assert pending > 80
+
+    @pytest.mark.asyncio
+    async def test_download_maxsize(self, loop, sized_server):
+        settings = {'DOWNLOAD_MAXSIZE': 100 * 1024, 'DOWNLOAD_WARNSIZE': 10 * 1024}
+        crawler = Crawler(BaseSpider, settings=settings, loop=loop)
+        downloader = crawler.engine.downloader
+        downloader.init_session()
+        response = await downloader.download(Request(f'{sized_server}/{50 * 1024}'))
+        assert len(response.body) == 50 * 1024
+        for path in (f'/{200 * 1024}', f'/chunked/{200 * 1024}'):
+            with pytest.raises(DownloadSizeExceeded):
+                await downloader.download(Request(f'{sized_server}{path}'))
+        request = Request(f'{sized_server}/chunked/{200 * 1024}', meta={'download_maxsize': 0})
+        response = await downloader.download(request)
+        assert len(response.body) == 200 * 1024
+        await downloader.close()
+
+    @pytest.mark.asyncio
+    async def test_download_stream(self, loop, sized_server):
+        size = 3 * STREAM_WRITE_SIZE + 1000
+        crawler = Crawler(BaseSpider, settings={'DOWNLOAD_STREAM_THRESHOLD': 1024}, loop=loop)
+        downloader = crawler.engine.downloader
+        downloader.init_session()
+        expected = bytes(i % 251 for i in range(size))
+        for path in (f'/{size}', f'/chunked/{size}'):
+            response = await downloader.download(Request(f'{sized_server}{path}', meta={'download_stream': True}))
+            assert isinstance(response.body, memoryview)
+            assert response.body == expected
+        # Small bodies and requests which do not opt in are kept in memory.
+        response = await downloader.download(Request(f'{sized_server}/100', meta={'download_stream': True}))
+        assert response.body == expected[:100]
+        assert isinstance(response.body, bytes)
+        response = await downloader.download(Request(f'{sized_server}/{size}'))
+        assert isinstance(response.body, bytes)
+        await downloader.close()
+
+    @pytest.mark.asyncio
+    async def test_coalesce(self, loop, counting_server):
+        server, served = counting_server
+        parsed = []
+
+        def make_spider(name):
+            class Spider(BaseSpider):
+                def start_requests(self):
+                    for i in range(4):
+                        yield Request(f'{server}/same', meta={'i': i}, dont_filter=True)
+                    yield Request(f'{server}/same', method='POST')
+                    yield Request(f'{server}/other')
+
+                def parse(self, response):
+                    parsed.append((self.name, response.request.method, response.request.meta.get('i'), response.text))
+
+            Spider.name = name
+            return Spider
+
+        settings = {'DOWNLOAD_DELAY': 0, 'DOWNLOAD_COALESCE': True}
+        runner = CrawlerRunner(settings, loop=loop)
+        runner.crawl(make_spider('first'))
+        runner.crawl(make_spider('second'))
+        await asyncio.wait_for(runner.join(), timeout=10)
+        assert len(parsed) == 12
+        assert sorted(i for name, method, i, _ in parsed if name == 'first' and method == 'GET' and i is not None) == [
+            0, 1, 2, 3
+        ]
+        # One GET of each url for each crawler, crawlers do not share downloads. POST requests are never coalesced.
+        assert sorted(served) == ['/other', '/other', '/same', '/same', '/same', '/same']
+        assert [stats.get('downloader/coalesced') for stats in runner.stats.values()] == [3, 3]
+        assert not any(crawler.engine.downloader.inflight for crawler in runner.crawlers)
+
+    @pytest.mark.asyncio
+    async def test_coalesce_cancel(self, loop, counting_server):
+        """
+        A coalesced download goes on when its first requester gives up, and is cancelled when all of them did.
+        Requests with other headers are not coalesced.
+        :param loop:
+        :param counting_server:
+        :return:
+        """
+        server, served = counting_server
+        crawler = Crawler(BaseSpider, settings={'DOWNLOAD_DELAY': 0, 'DOWNLOAD_COALESCE': True}, loop=loop)
+        downloader = crawler.engine.downloader
+        downloader.init_session()
+        first = downloader.enqueue_request(Request(f'{server}/same'))
+        second = downloader.enqueue_request(Request(f'{server}/same'))
+        other = downloader.enqueue_request(Request(f'{server}/same', headers={'Accept': 'text/plain'}))
+        first.cancel()
+        response = await asyncio.wait_for(second, timeout=5)
+        assert response.text == '/same'
+        await asyncio.wait_for(other, timeout=5)
+        assert served == ['/same', '/same']
+        assert crawler.stats.get_value('downloader/coalesced') == 1
+
+        gone = downloader.enqueue_request(Request(f'{server}/gone'))
+        shared, = downloader.inflight.values()
+        gone.cancel()
+        await asyncio.sleep(0)
+        assert shared.download.cancelled()
+        await asyncio.sleep(0)
+        assert not downloader.inflight
+        await downloader.close()
+
+    @pytest.mark.asyncio
+    async def test_resolver_error(self, loop, mocker_server):
+        """
+        A request whose host lookup for its ip slot fails with an unexpected error fails, the crawl does not hang.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+        errors = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+
+            def start_requests(self):
+                yield Request(f'http://broken.test:{URL(mocker_server).port}/', errback=self.on_error)
+
+            async def on_error(self, failure):
+                errors.append(type(failure).__name__)
+
+        settings = {
+            'DOWNLOAD_DELAY': 0,
+            'CONCURRENT_REQUESTS_PER_IP': 1,
+            'DNSCACHE_ENABLED': False,
+            'DNS_RESOLVER': 'tests.test_downloader.BrokenResolver',
+        }
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert errors == ['ValueError']
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from aio_scrapy.dupefilters import (BloomDupeFilter, BloomFilter,
+                                    FingerprintSet, RFPDupeFilter)
+from aio_scrapy.http import Request
+
+
+class TestFingerprintSet:
+
+    @pytest.mark.parametrize('bits', [64, 128])
+    def test_add(self, bits):
+        random.seed(bits)
+        fingerprints = {random.getrandbits(bits) for _ in range(5000)} | {0}
+        fingerprint_set = FingerprintSet(bits, capacity=16)
+        for fingerprint in fingerprints:
+            assert fingerprint_set.add(fingerprint)
+        for fingerprint in fingerprints:
+            assert not fingerprint_set.add(fingerprint)
+            assert fingerprint in fingerprint_set
+        assert len(fingerprint_set) == len(fingerprints)
+        assert random.getrandbits(bits) not in fingerprint_set
+
+    def test_invalid_bits(self):
+        with pytest.raises(ValueError):
+            FingerprintSet(32)
+
+
+class TestBloomFilter:
+
+    def test_error_rate(self):
+        random.seed(0)
+        bloom = BloomFilter(capacity=10000, error_rate=0.01)
+        for _ in range(10000):
+            bloom.add(random.getrandbits(128))
+        false_positives = sum(random.getrandbits(128) in bloom for _ in range(10000))
+        assert false_positives < 10000 * 0.02
+
+
+class TestRFPDupeFilter:
+
+    @pytest.fixture()
+    def dupefilter(self):
+        yield RFPDupeFilter()
+
+    def test_request_seen(self, dupefilter):
+        assert not dupefilter.request_seen(Request('http://example.com/?b=1&a=2'))
+        assert dupefilter.request_seen(Request('http://EXAMPLE.com:80/?a=2&b=1#top'))
+        assert not dupefilter.request_seen(Request('http://example.com/?a=2'))
+
+
+class TestBloomDupeFilter(TestRFPDupeFilter):
+
+    @pytest.fixture()
+    def dupefilter(self):
+        yield BloomDupeFilter(capacity=1000, error_rate=0.001)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('dupefilter_cls', [RFPDupeFilter, BloomDupeFilter])
+async def test_persist(tmp_path, dupefilter_cls):
+    def create():
+        if dupefilter_cls is BloomDupeFilter:
+            return BloomDupeFilter(capacity=1000, error_rate=0.001, path=str(tmp_path))
+        return RFPDupeFilter(path=str(tmp_path))
+
+    dupefilter = create()
+    await dupefilter.open()
+    assert not dupefilter.request_seen(Request('http://example.com/1'))
+    await dupefilter.close('shutdown')
+
+    restored = create()
+    await restored.open()
+    assert restored.request_seen(Request('http://example.com/1'))
+    assert not restored.request_seen(Request('http://example.com/2'))
@@ -1,17 +1,160 @@
+import asyncio
+
 import pytest
 
-from proxypool.scrapy.crawler import Crawler
-from proxypool.scrapy.spiders import BaseSpider
+from aio_scrapy import signals
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.http import Request
+from aio_scrapy.spiders import BaseSpider
+from tests.conftest import SLOW_SERVER_LATENCY
 
 
 class TestExecuteEngine:
 
     @pytest.fixture()
-    async def crawler(self):
-        crawler = Crawler(BaseSpider)
+    async def crawler(self, loop):
+        crawler = Crawler(BaseSpider, loop=loop)
         yield crawler
         await crawler.stop()
 
     @pytest.mark.asyncio
     async def test_open_spider(self, crawler):
         pass
+
+    @pytest.mark.asyncio
+    async def test_wakeup_without_heartbeat(self, loop, mocker_server):
+        """
+        Heartbeat is far longer than the test timeout, so the crawl can only finish
+        if the engine is woken up by events.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{mocker_server}?id={i}' for i in range(5)]
+
+            def parse(self, response):
+                return {'url': str(response.url)}
+
+        settings = {'ENGINE_HEARTBEAT_INTERVAL': 60, 'DOWNLOAD_DELAY': 0}
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert crawler.engine.closing
+
+    @staticmethod
+    async def _crawl_elapsed(loop, server: str, concurrency: int, count: int) -> float:
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{server}?id={i}' for i in range(count)]
+
+            async def parse(self, response):
+                return {}
+
+        settings = {
+            'CONCURRENT_REQUESTS': concurrency,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': concurrency,
+            'DOWNLOAD_DELAY': 0,
+        }
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        started = loop.time()
+        await asyncio.wait_for(crawler.crawl(), timeout=30)
+        return loop.time() - started
+
+    @pytest.mark.asyncio
+    async def test_concurrent_throughput(self, loop, slow_mocker_server):
+        """
+        Requests/sec should scale close to linearly with CONCURRENT_REQUESTS against a server with latency.
+        :param loop:
+        :param slow_mocker_server:
+        :return:
+        """
+        count = 40
+        serial = await self._crawl_elapsed(loop, slow_mocker_server, 1, count)
+        parallel = await self._crawl_elapsed(loop, slow_mocker_server, 10, count)
+        assert serial >= count * SLOW_SERVER_LATENCY
+        # Ideal speedup is 10, leave room for a noisy machine.
+        assert serial / parallel > 5
+
+    @pytest.mark.asyncio
+    async def test_async_start_requests_backpressure(self, loop, mocker_server):
+        high, low = 5, 2
+        scheduler_sizes = []
+        parsed = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+
+            async def start_requests(self):
+                for i in range(30):
+                    scheduler_sizes.append(len(self.crawler.engine.scheduler))
+                    yield f'{mocker_server}?id={i}'
+
+            async def parse(self, response):
+                parsed.append(response.url)
+                return {}
+
+        settings = {
+            'DOWNLOAD_DELAY': 0,
+            'CONCURRENT_REQUESTS': 1,
+            'START_REQUESTS_HIGH_WATERMARK': high,
+            'START_REQUESTS_LOW_WATERMARK': low,
+        }
+        crawler = Crawler(Spider, settings=settings, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert len(parsed) == 30
+        assert max(scheduler_sizes) < high
+
+    @pytest.mark.asyncio
+    async def test_crawl_priority(self, loop):
+        crawler = Crawler(BaseSpider, settings={'SCHEDULER': 'aio_scrapy.scheduler.PriorityScheduler'}, loop=loop)
+        await crawler.engine.crawl('http://example.com/low', None)
+        await crawler.engine.crawl('http://example.com/high', None, priority=5)
+        request = crawler.engine.scheduler.next_request()
+        assert str(request.url) == 'http://example.com/high'
+        assert request.priority == 5
+
+    @pytest.mark.asyncio
+    async def test_crawl_duplicate(self, loop):
+        crawler = Crawler(BaseSpider, loop=loop)
+        dropped = []
+
+        async def request_dropped(request, spider):
+            dropped.append(request)
+
+        crawler.signals.connect(request_dropped, signals.request_dropped)
+        await crawler.engine.crawl('http://example.com/?a=1&b=2', None)
+        await crawler.engine.crawl('http://example.com/?b=2&a=1', None)
+        await crawler.engine.crawl(Request('http://example.com/?a=1&b=2', dont_filter=True), None)
+        assert len(crawler.engine.scheduler) == 2
+        assert [str(request.url) for request in dropped] == ['http://example.com/?b=2&a=1']
+        assert crawler.stats.get_value('dupefilter/filtered') == 1
+        crawler.signals.disconnect_all(signals.request_dropped)
+
+    @pytest.mark.asyncio
+    async def test_request_callback(self, loop, mocker_server):
+        results = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+
+            def start_requests(self):
+                yield Request(f'{mocker_server}/list', meta={'page': 1})
+                yield Request('http://127.0.0.1:1/unreachable', errback=self.on_error)
+
+            async def parse(self, response):
+                results.append(('parse', response.request.meta['page']))
+                return Request(f'{mocker_server}/detail', callback='parse_detail', method='POST', body=b'x')
+
+            def parse_detail(self, response):
+                results.append(('detail', response.request.method, response.text))
+                return {'url': str(response.url)}
+
+            async def on_error(self, failure):
+                results.append(('error', type(failure).__name__))
+
+        crawler = Crawler(Spider, settings={'DOWNLOAD_DELAY': 0}, loop=loop)
+        await asyncio.wait_for(crawler.crawl(), timeout=10)
+        assert sorted(results) == [('detail', 'POST', 'OK'), ('error', 'ClientConnectorError'), ('parse', 1)]
+        assert crawler.stats.get_value('item_scraped_count') == 1
@@ -0,0 +1,119 @@
+import asyncio
+import os
+
+import pytest
+
+from aio_scrapy import signals
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.http import Request, Response
+from aio_scrapy.processpool import ProcessPool, in_process_pool
+from aio_scrapy.spiders import BaseSpider
+
+
+def test_in_process_pool():
+    with pytest.raises(TypeError):
+        @in_process_pool
+        async def parse(response):
+            pass
+
+
+class ProcessPoolSpider(BaseSpider):
+    """
+    Workers of process pool import it, and get its `server` attribute.
+    """
+    name = 'test'
+
+    @in_process_pool
+    def parse(self, response):
+        for i in range(3):
+            yield {'pid': os.getpid(), 'body': response.text, 'i': i}
+        yield Request(f'{self.server}/detail', callback=self.parse_detail, meta={'page': 'detail'})
+
+    @in_process_pool
+    def parse_detail(self, response):
+        return {'pid': os.getpid(), 'body': bytes(response.body).decode(), 'page': response.request.meta['page']}
+
+
+class ManyItemsSpider(BaseSpider):
+    name = 'test'
+
+    @in_process_pool
+    def parse(self, response):
+        for i in range(200):
+            yield {'i': i}
+
+
+@pytest.mark.asyncio
+async def test_parse_in_process_pool(loop, mocker_server):
+    items = []
+
+    async def item_scraped(item, response, spider):
+        items.append(item)
+
+    crawler = Crawler(ProcessPoolSpider, settings={'DOWNLOAD_DELAY': 0, 'PROCESS_POOL_WORKERS': 2}, loop=loop)
+    crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+    try:
+        await asyncio.wait_for(crawler.crawl(server=mocker_server, start_urls=[f'{mocker_server}/list']), timeout=10)
+    finally:
+        crawler.signals.disconnect(item_scraped, signal=signals.item_scraped)
+
+    assert len(items) == 4
+    assert sorted(item['i'] for item in items if 'i' in item) == [0, 1, 2]
+    assert all(item['body'] == 'OK' for item in items)
+    assert [item['page'] for item in items if 'page' in item] == ['detail']
+    assert os.getpid() not in {item['pid'] for item in items}
+    assert crawler.stats.get_value('process_pool/response_count') == 2
+    assert crawler.engine.scraper.process_pool is None
+
+
+@pytest.mark.asyncio
+async def test_buffer(loop, mocker_server):
+    """
+    Outputs waiting for the scraper are at most PROCESS_POOL_BUFFER, the worker waits meanwhile.
+    :param loop:
+    :param mocker_server:
+    :return:
+    """
+    buffered = []
+
+    async def item_scraped(item, response, spider):
+        buffered.extend(stream.qsize() for stream in crawler.engine.scraper.process_pool.streams.values())
+        await asyncio.sleep(0.005)
+
+    settings = {'DOWNLOAD_DELAY': 0, 'CONCURRENT_ITEMS': 1, 'PROCESS_POOL_WORKERS': 1, 'PROCESS_POOL_BUFFER': 5}
+    crawler = Crawler(ManyItemsSpider, settings=settings, loop=loop)
+    crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+    try:
+        await asyncio.wait_for(crawler.crawl(start_urls=[mocker_server]), timeout=10)
+    finally:
+        crawler.signals.disconnect(item_scraped, signal=signals.item_scraped)
+
+    assert crawler.stats.get_value('item_scraped_count') == 200
+    assert 1 < max(buffered) <= 5
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer(loop):
+    """
+    A callback whose outputs are not taken blocks its own worker only, outputs of other callbacks go on.
+    :param loop:
+    :return:
+    """
+    settings = {'PROCESS_POOL_WORKERS': 2, 'PROCESS_POOL_BUFFER': 5}
+    crawler = Crawler(ManyItemsSpider, settings=settings, loop=loop)
+    spider = ManyItemsSpider()
+    pool = ProcessPool(crawler, spider)
+    response = Response('http://example.com/', 200, {}, b'OK', Request('http://example.com/'))
+    slow = pool.parse(spider.parse, response)
+    try:
+        assert await asyncio.wait_for(slow.__anext__(), timeout=10) == {'i': 0}
+
+        async def consume():
+            return [item async for item in pool.parse(spider.parse, response)]
+
+        assert len(await asyncio.wait_for(consume(), timeout=10)) == 200
+        stream, = pool.streams.values()
+        assert stream.qsize() <= 5
+    finally:
+        await slow.aclose()
+        await pool.close()
@@ -0,0 +1,129 @@
+import asyncio
+import socket
+
+import pytest
+from aiohttp.abc import AbstractResolver
+from yarl import URL
+
+from aio_scrapy.crawler import CrawlerRunner
+from aio_scrapy.resolver import CachingResolver
+from aio_scrapy.spiders import BaseSpider
+
+
+class StubResolver(AbstractResolver):
+    """
+    Resolve every host but `fail.test` to 127.0.0.1 after `latency` seconds, and count lookups.
+    """
+
+    lookups = []
+    latency = 0.01
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        self.lookups.append(host)
+        await asyncio.sleep(self.latency)
+        if host == 'fail.test':
+            raise OSError(f'Cannot resolve {host}')
+        return [{
+            'hostname': host, 'host': '127.0.0.1', 'port': port, 'family': socket.AF_INET, 'proto': 0, 'flags': 0
+        }]
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture()
+def stub_resolver():
+    StubResolver.lookups = []
+    yield StubResolver
+
+
+class TestCachingResolver:
+
+    @pytest.mark.asyncio
+    async def test_cache(self, loop, stub_resolver):
+        resolver = CachingResolver(stub_resolver(), size=2, ttl=0.2)
+        result = await resolver.resolve('a.test', 80)
+        assert result[0]['host'] == '127.0.0.1'
+        result.clear()
+        assert await resolver.resolve('a.test', 80) != []
+        assert stub_resolver.lookups == ['a.test']
+        assert (resolver.hits, resolver.misses) == (1, 1)
+
+        # Least recently used is dropped.
+        await resolver.resolve('b.test', 80)
+        await resolver.resolve('a.test', 80)
+        await resolver.resolve('c.test', 80)
+        assert resolver.cached('b.test', 80) is None
+        assert resolver.cached('a.test', 80) is not None
+
+        await asyncio.sleep(0.25)
+        assert resolver.cached('a.test', 80) is None
+        await resolver.resolve('a.test', 80)
+        assert stub_resolver.lookups == ['a.test', 'b.test', 'c.test', 'a.test']
+        await resolver.close()
+
+    @pytest.mark.asyncio
+    async def test_dedup(self, loop, stub_resolver):
+        resolver = CachingResolver(stub_resolver())
+        results = await asyncio.gather(*[resolver.resolve('a.test', 80) for _ in range(10)])
+        assert len(results) == 10
+        assert stub_resolver.lookups == ['a.test']
+
+        # A caller giving up does not cancel the lookup of others.
+        waiter = asyncio.ensure_future(resolver.resolve('b.test', 80))
+        other = asyncio.ensure_future(resolver.resolve('b.test', 80))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        assert (await other)[0]['hostname'] == 'b.test'
+
+        # Failures are not cached.
+        for _ in range(2):
+            with pytest.raises(OSError):
+                await resolver.resolve('fail.test', 80)
+        assert stub_resolver.lookups.count('fail.test') == 2
+        await resolver.close()
+
+    @pytest.mark.asyncio
+    async def test_prefetch(self, loop, stub_resolver):
+        resolver = CachingResolver(stub_resolver())
+        resolver.prefetch('a.test', 80)
+        resolver.prefetch('a.test', 80)
+        resolver.prefetch('127.0.0.1', 80)
+        resolver.prefetch('fail.test', 80)
+        await asyncio.sleep(stub_resolver.latency * 2)
+        assert sorted(stub_resolver.lookups) == ['a.test', 'fail.test']
+        assert resolver.cached('a.test', 80) is not None
+        await resolver.resolve('a.test', 80)
+        assert resolver.hits == 1
+        await resolver.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_resolver(loop, mocker_server, stub_resolver):
+    """
+    Crawlers of a runner look each host up once, though a host is requested by both.
+    :param loop:
+    :param mocker_server:
+    :param stub_resolver:
+    :return:
+    """
+    port = URL(mocker_server).port
+    parsed = []
+
+    def make_spider(name):
+        class Spider(BaseSpider):
+            start_urls = [f'http://{host}.test:{port}/?id={i}' for host in ('a', 'b') for i in range(5)]
+
+            def parse(self, response):
+                parsed.append(response.url.host)
+
+        Spider.name = name
+        return Spider
+
+    settings = {'DOWNLOAD_DELAY': 0, 'DNS_RESOLVER': 'tests.test_resolver.StubResolver'}
+    runner = CrawlerRunner(settings, loop=loop)
+    runner.crawl(make_spider('first'))
+    runner.crawl(make_spider('second'))
+    await asyncio.wait_for(runner.join(), timeout=10)
+    assert len(parsed) == 20
+    assert sorted(stub_resolver.lookups) == ['a.test', 'b.test']
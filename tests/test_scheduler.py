@@ -0,0 +1,144 @@
+import pytest
+
+from aio_scrapy.http import Request
+from aio_scrapy.scheduler import (DiskQueueScheduler, PriorityScheduler,
+                                  SimpleScheduler)
+
+
+class TestSimpleScheduler:
+    scheduler_cls = SimpleScheduler
+
+    @pytest.fixture()
+    def scheduler(self):
+        yield self.scheduler_cls()
+
+    def test_fifo(self, scheduler):
+        requests = [Request(f'http://example.com/{i}') for i in range(5)]
+        for request in requests:
+            scheduler.enqueue_request(request)
+        assert len(scheduler) == 5
+        assert scheduler.has_pending_requests()
+        assert [scheduler.next_request() for _ in range(5)] == requests
+        assert scheduler.next_request() is None
+        assert not scheduler.has_pending_requests()
+
+    def create_persistent(self, jobdir):
+        return self.scheduler_cls(jobdir=str(jobdir))
+
+    @pytest.mark.asyncio
+    async def test_persist(self, tmp_path):
+        requests = [Request(f'http://example.com/{i}', priority=i % 3) for i in range(20)]
+        reference = self.scheduler_cls()
+        for request in requests:
+            reference.enqueue_request(request)
+        expected = [str(reference.next_request().url) for _ in range(20)]
+
+        scheduler = self.create_persistent(tmp_path)
+        await scheduler.open(None)
+        for request in requests:
+            scheduler.enqueue_request(request)
+        await scheduler.checkpoint()
+        for _ in range(6):
+            scheduler.next_request()
+        await scheduler.close('shutdown')
+
+        restored = self.create_persistent(tmp_path)
+        await restored.open(None)
+        assert len(restored) == 14
+        remaining = []
+        while restored.has_pending_requests():
+            remaining.append(str(restored.next_request().url))
+        await restored.close('finished')
+        assert remaining == expected[6:]
+
+
+class TestPriorityScheduler(TestSimpleScheduler):
+    scheduler_cls = PriorityScheduler
+
+    def test_priority(self, scheduler):
+        listing = [Request(f'http://example.com/list/{i}') for i in range(3)]
+        details = [Request(f'http://example.com/detail/{i}', priority=10) for i in range(3)]
+        retry = Request('http://example.com/retry', priority=20)
+        for request in listing + details + [retry]:
+            scheduler.enqueue_request(request)
+        assert [scheduler.next_request() for _ in range(7)] == [retry] + details + listing
+
+
+class TestDiskQueueScheduler(TestSimpleScheduler):
+
+    @pytest.fixture()
+    def scheduler(self, tmp_path):
+        yield DiskQueueScheduler(path=str(tmp_path), memory_size=3, segment_bytes=64)
+
+    def create_persistent(self, jobdir):
+        return DiskQueueScheduler(path=str(jobdir / 'requests.queue'), memory_size=3, segment_bytes=64, persist=True)
+
+    @pytest.mark.asyncio
+    async def test_spill(self, scheduler, tmp_path):
+        urls = [f'http://example.com/{i}' for i in range(50)]
+        for i, url in enumerate(urls[:30]):
+            scheduler.enqueue_request(Request(url, priority=i))
+        assert len(scheduler) == 30
+        assert len(scheduler.head) <= 3 and len(scheduler.tail) <= 3
+        assert len(list(tmp_path.iterdir())) > 1
+
+        dequeued = [scheduler.next_request() for _ in range(10)]
+        # Interleave enqueue and dequeue to cross head, segments and tail.
+        for url in urls[30:]:
+            scheduler.enqueue_request(Request(url))
+        while scheduler.has_pending_requests():
+            dequeued.append(scheduler.next_request())
+
+        assert [str(request.url) for request in dequeued] == urls
+        assert dequeued[5].priority == 5
+        assert list(tmp_path.iterdir()) == []
+        await scheduler.close('finished')
+
+    @pytest.mark.asyncio
+    async def test_restore_checkpoint_after_crash(self, tmp_path):
+        scheduler = self.create_persistent(tmp_path)
+        await scheduler.open(None)
+        urls = [f'http://example.com/{i}' for i in range(20)]
+        for url in urls[:15]:
+            scheduler.enqueue_request(Request(url))
+        await scheduler.checkpoint()
+        # Changes after the checkpoint are lost by a crash, the scheduler is never closed.
+        for url in urls[15:]:
+            scheduler.enqueue_request(Request(url))
+
+        restored = self.create_persistent(tmp_path)
+        await restored.open(None)
+        remaining = []
+        while restored.has_pending_requests():
+            remaining.append(str(restored.next_request().url))
+        assert remaining == urls[:15]
+
+    @pytest.mark.asyncio
+    async def test_consumed_segment_after_checkpoint(self, tmp_path):
+        scheduler = self.create_persistent(tmp_path)
+        await scheduler.open(None)
+        urls = [f'http://example.com/{i}' for i in range(20)]
+        for url in urls:
+            scheduler.enqueue_request(Request(url))
+        await scheduler.checkpoint()
+        # Read out segments after the checkpoint, then crash.
+        for _ in range(12):
+            scheduler.next_request()
+
+        restored = self.create_persistent(tmp_path)
+        await restored.open(None)
+        remaining = []
+        while restored.has_pending_requests():
+            remaining.append(str(restored.next_request().url))
+        assert remaining == urls
+
+    def test_unserializable(self, scheduler):
+        urls = [f'http://example.com/{i}' for i in range(10)]
+        for i, url in enumerate(urls):
+            callback = (lambda response: None) if i == 5 else None
+            scheduler.enqueue_request(Request(url, callback=callback))
+        dequeued = []
+        while scheduler.has_pending_requests():
+            dequeued.append(str(scheduler.next_request().url))
+        assert sorted(dequeued) == sorted(urls)
+        assert dequeued.index(urls[4]) < dequeued.index(urls[6])
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from aio_scrapy import signals
+from aio_scrapy.crawler import Crawler
+from aio_scrapy.http import Request
+from aio_scrapy.spiders import BaseSpider
+
+
+async def crawl(loop, spider_cls, **settings):
+    crawler = Crawler(spider_cls, settings=dict(settings, DOWNLOAD_DELAY=0), loop=loop)
+    await asyncio.wait_for(crawler.crawl(), timeout=10)
+    return crawler
+
+
+@pytest.fixture()
+async def large_server(loop):
+    """
+    Server answering every request with a body of query `size` bytes, 64KB by default.
+    :param loop:
+    :return:
+    """
+    async def handler(request):
+        return web.Response(body=b'x' * int(request.query.get('size', 65536)))
+
+    runner = web.ServerRunner(web.Server(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, host='127.0.0.1', port=0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}'
+    await runner.cleanup()
+
+
+class TestScraper:
+
+    @pytest.mark.asyncio
+    async def test_generator_callbacks(self, loop, mocker_server):
+        threads = set()
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{mocker_server}/list']
+
+            async def parse(self, response):
+                for i in range(3):
+                    yield {'page': 'list', 'i': i}
+                    yield Request(f'{mocker_server}/detail?id={i}', callback=self.parse_detail)
+                yield Request(f'{mocker_server}/other', callback='parse_other')
+
+            def parse_detail(self, response):
+                threads.add(threading.current_thread())
+                yield {'page': 'detail'}
+                yield None
+                yield {'page': 'detail'}
+
+            async def parse_other(self, response):
+                return [{'page': 'other'}, 'invalid']
+
+        crawler = await crawl(loop, Spider)
+        assert crawler.stats.get_value('item_scraped_count') == 3 + 3 * 2 + 1
+        assert crawler.stats.get_value('response_received_count') == 5
+        # Sync generators do not run on the loop.
+        assert threading.main_thread() not in threads
+
+    @pytest.mark.asyncio
+    async def test_stream(self, loop, mocker_server):
+        """
+        Outputs are handled as they are yielded, and the generator waits while CONCURRENT_ITEMS items are
+        in progress.
+        :param loop:
+        :param mocker_server:
+        :return:
+        """
+        in_progress = []
+        events = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [mocker_server]
+
+            async def parse(self, response):
+                if response.request.meta.get('follow'):
+                    events.append('followed')
+                    return
+                yield Request(f'{mocker_server}/follow', meta={'follow': True})
+                for i in range(10):
+                    in_progress.append(i)
+                    events.append(('yielded', len(in_progress)))
+                    yield {'i': i}
+
+        async def item_scraped(item, response, spider):
+            await asyncio.sleep(0.01)
+            in_progress.remove(item['i'])
+
+        crawler = Crawler(Spider, settings={'DOWNLOAD_DELAY': 0, 'CONCURRENT_ITEMS': 3}, loop=loop)
+        crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+        try:
+            await asyncio.wait_for(crawler.crawl(), timeout=10)
+        finally:
+            crawler.signals.disconnect(item_scraped, signal=signals.item_scraped)
+
+        assert crawler.stats.get_value('item_scraped_count') == 10
+        # Items in pipeline, and the one waiting for a slot.
+        assert max(count for event in events if event != 'followed' for count in event[1:]) == 3 + 1
+        # The follow-up request was downloaded while items were still yielded.
+        assert events.index('followed') < len(events) - 1
+
+    @pytest.mark.asyncio
+    async def test_max_active_size(self, loop, large_server):
+        """
+        Downloading stops while bodies in scraper exceed SCRAPER_SLOT_MAX_ACTIVE_SIZE, though CONCURRENT_ITEMS
+        allows more responses.
+        :param loop:
+        :param large_server:
+        :return:
+        """
+
+        class Spider(BaseSpider):
+            name = 'test'
+            start_urls = [f'{large_server}/?id={i}' for i in range(10)]
+
+            async def parse(self, response):
+                await asyncio.sleep(0.02)
+
+        settings = {'CONCURRENT_ITEMS': 100, 'CONCURRENT_REQUESTS': 2}
+        unlimited = await crawl(loop, Spider, **settings)
+        limited = await crawl(loop, Spider, SCRAPER_SLOT_MAX_ACTIVE_SIZE=100000, **settings)
+
+        assert limited.stats.get_value('response_received_count') == 10
+        assert unlimited.stats.get_value('scraper/max_active_size') > 4 * 65536
+        # Downloads in flight when the limit is reached still go to scraper.
+        assert limited.stats.get_value('scraper/max_active_size') <= 100000 + 2 * 65536
+        assert limited.stats.get_value('scraper/backpressure_count') >= 1
+        assert limited.stats.get_value('scraper/max_queue_depth') >= 1
+        assert limited.engine.scraper.active_size == 0
+        assert limited.stats.get_value('scraper/active_size') == 0
+        assert limited.stats.get_value('scraper/queue_depth') == 0
+
+    @pytest.mark.asyncio
+    async def test_max_active_size_streamed(self, loop, large_server):
+        """
+        Bodies streamed to a file count their size against SCRAPER_SLOT_MAX_ACTIVE_SIZE, they are read in memory
+        by callbacks.
+        :param loop:
+        :param large_server:
+        :return:
+        """
+
+        bodies = []
+
+        class Spider(BaseSpider):
+            name = 'test'
+
+            def start_requests(self):
+                for i in range(10):
+                    yield Request(f'{large_server}/?id={i}&size={2 * 1024 * 1024}', meta={'download_stream': True})
+
+            async def parse(self, response):
+                bodies.append(type(response.body))
+                await asyncio.sleep(0.02)
+
+        settings = {
+            'CONCURRENT_ITEMS': 100,
+            'CONCURRENT_REQUESTS': 2,
+            'DOWNLOAD_STREAM_THRESHOLD': 1024,
+            'SCRAPER_SLOT_MAX_ACTIVE_SIZE': 100000,
+        }
+        crawler = await crawl(loop, Spider, **settings)
+        assert bodies == [memoryview] * 10
+        # Downloads in flight when the limit is reached still go to scraper.
+        assert 2 * 1024 * 1024 <= crawler.stats.get_value('scraper/max_active_size') <= 3 * 2 * 1024 * 1024
+        assert crawler.stats.get_value('scraper/backpressure_count') >= 1
@@ -74,7 +74,7 @@ class TestSignalManager:
 
     @pytest.mark.asyncio
     async def test_send_async_exception(self, mocker, signal_manager):
-        logger_mock = mocker.patch('proxypool.signal_manager.logger.error')
+        logger_mock = mocker.patch('aio_scrapy.signal_manager.logger.error')
         e = ValueError('xxx')
 
         async def demo(x):
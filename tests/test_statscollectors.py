@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from aio_scrapy.statscollectors import MemoryStatsCollector, merge_stats
+from aio_scrapy.utils.test import get_crawler
+
+
+class TestMemoryStatsCollector:
+
+    @pytest.mark.asyncio
+    async def test_values(self, loop):
+        stats = MemoryStatsCollector(get_crawler(loop=loop))
+        stats.inc_value('count')
+        stats.inc_value('count', 2)
+        stats.max_value('max', 3)
+        stats.max_value('max', 1)
+        stats.min_value('min', 3)
+        stats.min_value('min', 1)
+        assert stats.get_stats() == {'count': 3, 'max': 3, 'min': 1}
+        assert stats.get_value('missing', 'default') == 'default'
+
+
+def test_merge_stats():
+    now = datetime.now()
+    later = now + timedelta(seconds=1)
+    merged = merge_stats([
+        {'count': 1, 'start_time': later, 'finish_time': now, 'finish_reason': 'finished'},
+        {'count': 2, 'start_time': now, 'finish_time': later, 'finish_reason': 'shutdown'},
+        None,
+    ])
+    assert merged == {'count': 3, 'start_time': now, 'finish_time': later, 'finish_reason': 'finished'}
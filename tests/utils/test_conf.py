@@ -0,0 +1,7 @@
+from aio_scrapy.utils.conf import build_component_list
+
+
+def test_build_component_list():
+    base = {'a.A': 10, 'b.B': 0, 'c.C': 5}
+    assert build_component_list(base) == ['b.B', 'c.C', 'a.A']
+    assert build_component_list(base, {'c.C': None, 'd.D': 20}) == ['b.B', 'a.A', 'd.D']
@@ -0,0 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from aio_scrapy.utils.job import read_pickle, write_atomic, write_pickle
+
+
+def test_write_atomic(tmp_path):
+    path = str(tmp_path / 'state')
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda i: write_atomic(path, str(i).encode() * 100000), range(32)))
+    # Writers do not share a temporary file, the content is one whole write.
+    data = (tmp_path / 'state').read_bytes()
+    assert len(set(data)) <= 2 and len(data) in (100000, 200000)
+    assert [p.name for p in tmp_path.iterdir()] == ['state']
+
+    write_pickle(path, {'a': 1})
+    assert read_pickle(path) == {'a': 1}
@@ -0,0 +1,23 @@
+from collections import Counter
+
+from yarl import URL
+
+from aio_scrapy.utils.shard import host_shard, jump_consistent_hash
+
+
+def test_jump_consistent_hash():
+    keys = range(10000)
+    before = [jump_consistent_hash(key, 9) for key in keys]
+    after = [jump_consistent_hash(key, 10) for key in keys]
+    assert all(0 <= bucket < 10 for bucket in after)
+    moved = sum(1 for b, a in zip(before, after) if b != a)
+    # About 1/10 keys move to the new bucket, and only to the new bucket.
+    assert moved < len(keys) * 0.15
+    assert all(a == 9 for b, a in zip(before, after) if b != a)
+
+
+def test_host_shard():
+    assert host_shard(URL('http://example.com/a'), 4) == host_shard(URL('http://EXAMPLE.com/b?c=d'), 4)
+    counter = Counter(host_shard(URL(f'http://host{i}.example.com/'), 4) for i in range(1000))
+    assert set(counter) == {0, 1, 2, 3}
+    assert min(counter.values()) > 150
@@ -0,0 +1,17 @@
+import pytest
+
+from aio_scrapy.utils.url import canonicalize_url
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('http://Example.com', 'http://example.com/'),
+    ('HTTP://example.com:80/a?b=2&a=1#frag', 'http://example.com/a?a=1&b=2'),
+    ('https://example.com:8443/?', 'https://example.com:8443/'),
+    ('http://example.com/?a=&b=1', 'http://example.com/?a=&b=1'),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_canonicalize_url_keep_fragments():
+    assert canonicalize_url('http://example.com/#a', keep_fragments=True) == 'http://example.com/#a'